@@ -0,0 +1,11 @@
+import os
+
+# The benchmarks run against the database described by the standard libpq environment variables,
+# falling back to the parameters of the test suite.
+DATABASE_PARAMS = {
+    'host': os.environ.get('PGHOST', 'localhost'),
+    'user': os.environ.get('PGUSER', 'postgres'),
+    'password': os.environ.get('PGPASSWORD', '1234'),
+    'port': os.environ.get('PGPORT', '5432'),
+    'database': os.environ.get('PGDATABASE', 'test')
+}
@@ -0,0 +1,45 @@
+"""
+Rows per second of NativeQueryExecutor.execute_many_and_commit for each batching mode.
+
+Usage:
+    python -m benchmarks.bench_execute_many [rows] [page_size]
+"""
+import sys
+import time
+
+from psycopg2_wrapper.NativeQueryExecutor import NativeQueryExecutor
+
+from . import DATABASE_PARAMS
+
+
+def bench(executor: NativeQueryExecutor, mode: str, rows: int, page_size: int) -> float:
+    """
+    Insert `rows` rows with the given mode and return the number of rows per second.
+    """
+    sql = "INSERT INTO bench_execute_many (id, name, score) VALUES " + ("%s" if mode == "values" else "(%s, %s, %s)")
+    params = [(i, 'name %d' % i, i * 0.5) for i in range(rows)]
+
+    executor.execute_and_commit("TRUNCATE bench_execute_many")
+    start = time.perf_counter()
+    executor.execute_many_and_commit(sql, params, mode=mode, page_size=page_size)
+    return rows / (time.perf_counter() - start)
+
+
+def main() -> None:
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    page_size = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+
+    executor = NativeQueryExecutor(DATABASE_PARAMS)
+    executor.execute_and_commit("DROP TABLE IF EXISTS bench_execute_many")
+    executor.execute_and_commit("CREATE TABLE bench_execute_many (id INT, name TEXT, score FLOAT8)")
+
+    try:
+        print("mode\t\trows/s\t(rows=%d, page_size=%d)" % (rows, page_size))
+        for mode in ("executemany", "batch", "values"):
+            print("%-12s\t%.0f" % (mode, bench(executor, mode, rows, page_size)))
+    finally:
+        executor.execute_and_commit("DROP TABLE IF EXISTS bench_execute_many")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Per-row memory and construction time of each RowFactory kind.
+The rows of a query are fetched once as tuples, then converted by each factory;
+the memory is the size of the converted rows (values shared with the tuples are not counted twice).
+
+Usage:
+    python -m benchmarks.bench_row_factory [rows]
+"""
+import gc
+import sys
+import time
+import tracemalloc
+
+from psycopg2_wrapper.NativeQueryExecutor import NativeQueryExecutor
+from psycopg2_wrapper.RowFactory import RowFactory
+
+from . import DATABASE_PARAMS
+
+
+def main() -> None:
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    executor = NativeQueryExecutor(DATABASE_PARAMS)
+    conn = executor.conn.acquire()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT i AS id, 'name ' || i AS name, i * 0.5 AS score, i %% 2 = 0 AS active "
+                       "FROM generate_series(1, %s) i", (rows,))
+        description, tuples = cursor.description, cursor.fetchall()
+    finally:
+        executor.conn.close(cursor, conn)
+
+    print("factory\t\tbytes/row\tns/row\t(rows=%d)" % rows)
+    for kind in RowFactory.KINDS:
+        factory = RowFactory(kind)
+        factory.rows(description, tuples[:1])  # build and cache the row class
+
+        gc.collect()
+        tracemalloc.start()
+        converted = factory.rows(description, tuples)
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        # a tuple row is the fetched row itself: count its own size
+        if kind == "tuple":
+            size = sum(sys.getsizeof(row) for row in converted)
+        del converted
+
+        gc.collect()
+        start = time.perf_counter()
+        converted = factory.rows(description, tuples)
+        elapsed = time.perf_counter() - start
+        del converted
+
+        print("%-12s\t%.1f\t\t%.0f" % (kind, size / rows, elapsed / rows * 1e9))
+
+
+if __name__ == "__main__":
+    main()
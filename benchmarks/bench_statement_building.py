@@ -0,0 +1,43 @@
+"""
+Per-call overhead of building the SQL text of SimpleQueryExecutor statements.
+Compares the former f-string building, composing with psycopg2.sql on every call,
+and the memoized statement cache.
+
+Usage:
+    python -m benchmarks.bench_statement_building [calls]
+"""
+import sys
+import timeit
+
+from psycopg2_wrapper.SimpleQueryExecutor import SimpleQueryExecutor
+
+from . import DATABASE_PARAMS
+
+
+def main() -> None:
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    executor = SimpleQueryExecutor(DATABASE_PARAMS)
+    conn = executor.conn.acquire()
+    table, columns, where = "users", ("id", "name", "age", "email"), "age >= 18"
+
+    def fstring():
+        return f"SELECT {','.join(columns)} FROM {table} WHERE {where}"
+
+    def composed():
+        return executor._select(table, columns, where).as_string(conn)
+
+    def cached():
+        return executor._sql(("select", table, columns, where), lambda: executor._select(table, columns, where))
+
+    try:
+        print("method\t\tus/call\t(calls=%d)" % calls)
+        for name, function in (("f-string", fstring), ("composed", composed), ("cached", cached)):
+            seconds = timeit.timeit(function, number=calls)
+            print("%-12s\t%.2f" % (name, seconds / calls * 1e6))
+    finally:
+        executor.conn.close(None, conn)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+"""
+Throughput and latency of the executor methods, for several table sizes and concurrency levels.
+
+Each case runs one workload for a fixed duration from `concurrency` threads sharing one executor,
+and reports the operations per second and the p50/p95/p99 latencies. The results are written as JSON
+and can be compared against a previous run: a case whose throughput drops or whose p95 latency rises
+by more than the threshold is reported as a regression (exit status 1).
+
+Usage:
+    python -m benchmarks.suite [--dsn DSN | --temp-cluster [--pg-bin DIR]] [--rows 100,10000]
+                               [--concurrency 1,4] [--duration 2] [--output results.json]
+                               [--baseline baseline.json] [--threshold 0.1]
+
+Without --dsn or --temp-cluster the database of the PG* environment variables is used (see benchmarks/__init__.py).
+--temp-cluster runs initdb and pg_ctl (from --pg-bin or the PATH) in a temporary directory, and removes it at the end.
+"""
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import psycopg2
+
+from psycopg2_wrapper.SimpleQueryExecutor import SimpleQueryExecutor
+
+from . import DATABASE_PARAMS
+
+
+TABLE = "bench_suite"
+WRITE_TABLE = "bench_suite_writes"
+BATCH_SIZE = 100
+
+
+def fetchone(executor: SimpleQueryExecutor, rows: int, rng: random.Random) -> None:
+    executor.execute_and_fetchone("SELECT id, name, score FROM bench_suite WHERE id = %s", (rng.randrange(rows),))
+
+
+def fetchall(executor: SimpleQueryExecutor, rows: int, rng: random.Random) -> None:
+    executor.execute_and_fetchall("SELECT id, name, score FROM bench_suite")
+
+
+def fetchmany(executor: SimpleQueryExecutor, rows: int, rng: random.Random) -> None:
+    executor.execute_and_fetchmany("SELECT id, name, score FROM bench_suite", size=BATCH_SIZE)
+
+
+def insert(executor: SimpleQueryExecutor, rows: int, rng: random.Random) -> None:
+    executor.execute_and_commit("INSERT INTO bench_suite_writes (id, name, score) VALUES (%s, %s, %s)",
+                                (rng.randrange(rows), "name", 0.5))
+
+
+def execute_many(executor: SimpleQueryExecutor, rows: int, rng: random.Random) -> None:
+    start = rng.randrange(rows)
+    executor.execute_many_and_commit("INSERT INTO bench_suite_writes (id, name, score) VALUES (%s, %s, %s)",
+                                     [(start + i, "name", 0.5) for i in range(BATCH_SIZE)])
+
+
+def select_data(executor: SimpleQueryExecutor, rows: int, rng: random.Random) -> None:
+    executor.select_data(TABLE, ["id", "name", "score"])
+
+
+WORKLOADS = {
+    "fetchone": fetchone,
+    "fetchall": fetchall,
+    "fetchmany": fetchmany,
+    "insert": insert,
+    "execute_many": execute_many,
+    "select_data": select_data,
+}
+
+
+def percentile(latencies: list, q: float) -> float:
+    """
+    Return the `q` percentile of a sorted list (nearest rank), NaN for an empty list.
+    """
+    if not latencies:
+        return float("nan")
+    return latencies[min(len(latencies) - 1, max(0, int(round(q * len(latencies))) - 1))]
+
+
+def run_case(executor: SimpleQueryExecutor, workload: str, rows: int, concurrency: int, duration: float) -> dict:
+    """
+    Run a workload from `concurrency` threads for `duration` seconds and return its measurements.
+    """
+    operation = WORKLOADS[workload]
+    latencies = [[] for _ in range(concurrency)]
+    errors = []
+    start = threading.Barrier(concurrency + 1)
+
+    def worker(index: int) -> None:
+        # a fixed seed per thread, so that every run draws the same parameters
+        rng = random.Random(index)
+        measured = latencies[index]
+        try:
+            for _ in range(3):
+                operation(executor, rows, rng)
+            start.wait()
+            deadline = time.perf_counter() + duration
+            while True:
+                began = time.perf_counter()
+                if began >= deadline:
+                    break
+                operation(executor, rows, rng)
+                measured.append(time.perf_counter() - began)
+        except threading.BrokenBarrierError:
+            # another worker failed during the warmup
+            pass
+        except Exception as error:
+            errors.append(error)
+            # release the threads waiting for this one at the barrier
+            start.abort()
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    try:
+        start.wait()
+    except threading.BrokenBarrierError:
+        pass
+    began = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - began
+    if errors:
+        raise errors[0]
+
+    # no operation may complete within a very short duration: the latencies are then NaN
+    merged = sorted(latency for measured in latencies for latency in measured)
+    return {
+        "workload": workload,
+        "rows": rows,
+        "concurrency": concurrency,
+        "ops": len(merged),
+        "ops_per_sec": len(merged) / elapsed,
+        "p50_ms": percentile(merged, 0.50) * 1000,
+        "p95_ms": percentile(merged, 0.95) * 1000,
+        "p99_ms": percentile(merged, 0.99) * 1000,
+        "max_ms": percentile(merged, 1.0) * 1000,
+    }
+
+
+def prepare(executor: SimpleQueryExecutor, rows: int) -> None:
+    """
+    (Re)create the benchmark tables, the read table holding `rows` rows.
+    """
+    executor.drop_table(TABLE)
+    executor.drop_table(WRITE_TABLE)
+    columns = {"id": "INT PRIMARY KEY", "name": "TEXT", "score": "FLOAT8"}
+    executor.create_table(TABLE, columns)
+    executor.create_table(WRITE_TABLE, {**columns, "id": "INT"})
+    executor.insert_rows(TABLE, ["id", "name", "score"], ((i, "name %d" % i, i * 0.5) for i in range(rows)))
+    executor.execute_and_commit("ANALYZE bench_suite")
+
+
+def run_suite(params: dict, workloads: list, row_counts: list, concurrencies: list, duration: float) -> dict:
+    """
+    Run every (workload, rows, concurrency) case and return the results with the run metadata.
+    """
+    executor = SimpleQueryExecutor({**params, "pool": {"min_size": 1, "max_size": max(concurrencies)}})
+    server_version = executor.execute_and_fetchone("SHOW server_version")[0]
+    results = []
+
+    try:
+        for rows in row_counts:
+            prepare(executor, rows)
+            for workload in workloads:
+                for concurrency in concurrencies:
+                    executor.execute_and_commit("TRUNCATE bench_suite_writes")
+                    result = run_case(executor, workload, rows, concurrency, duration)
+                    results.append(result)
+                    print("%-13s rows=%-7d concurrency=%-3d %10.0f ops/s  p50 %.3f ms  p95 %.3f ms  p99 %.3f ms" % (
+                        workload, rows, concurrency, result["ops_per_sec"],
+                        result["p50_ms"], result["p95_ms"], result["p99_ms"]), file=sys.stderr)
+    finally:
+        executor.drop_table(TABLE)
+        executor.drop_table(WRITE_TABLE)
+        executor.conn.close_pool()
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "psycopg2": psycopg2.__version__.split()[0],
+            "server_version": server_version,
+            "platform": platform.platform(),
+            "duration": duration,
+        },
+        "results": results,
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """
+    Compare two runs case by case.
+
+    Returns:
+    -------
+    returns the list of the regressions, as human readable strings.
+    """
+    previous = {(case["workload"], case["rows"], case["concurrency"]): case for case in baseline["results"]}
+    regressions = []
+    for case in results["results"]:
+        old = previous.get((case["workload"], case["rows"], case["concurrency"]))
+        if old is None:
+            continue
+        name = "%s rows=%d concurrency=%d" % (case["workload"], case["rows"], case["concurrency"])
+        if case["ops_per_sec"] < old["ops_per_sec"] * (1 - threshold):
+            regressions.append("%s: %.0f ops/s, baseline %.0f ops/s (%+.1f%%)" % (
+                name, case["ops_per_sec"], old["ops_per_sec"], 100 * (case["ops_per_sec"] / old["ops_per_sec"] - 1)))
+        if case["p95_ms"] > old["p95_ms"] * (1 + threshold):
+            regressions.append("%s: p95 %.3f ms, baseline %.3f ms (%+.1f%%)" % (
+                name, case["p95_ms"], old["p95_ms"], 100 * (case["p95_ms"] / old["p95_ms"] - 1)))
+    return regressions
+
+
+@contextlib.contextmanager
+def temp_cluster(bin_dir: str = None):
+    """
+    Start a throwaway PostgreSQL cluster and yield its connection parameters.
+    The cluster only listens on a Unix socket inside its data directory, which is removed on exit.
+    """
+    def binary(name: str) -> str:
+        path = os.path.join(bin_dir, name) if bin_dir else shutil.which(name)
+        if not path or not os.path.exists(path):
+            raise RuntimeError("%s not found, pass --pg-bin or add the PostgreSQL binaries to the PATH" % name)
+        return path
+
+    directory = tempfile.mkdtemp(prefix="psycopg2_wrapper_bench_")
+    data = os.path.join(directory, "data")
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    try:
+        subprocess.run([binary("initdb"), "-D", data, "-U", "postgres", "--auth=trust", "-E", "UTF8", "--locale=C"],
+                       check=True, stdout=subprocess.DEVNULL)
+        subprocess.run([binary("pg_ctl"), "-D", data, "-l", os.path.join(directory, "log"), "-w",
+                        "-o", "-p %d -k %s -c listen_addresses='' -c max_connections=200" % (port, directory), "start"],
+                       check=True, stdout=subprocess.DEVNULL)
+        try:
+            yield {"host": directory, "port": str(port), "user": "postgres", "password": None, "database": "postgres"}
+        finally:
+            subprocess.run([binary("pg_ctl"), "-D", data, "-m", "fast", "-w", "stop"], stdout=subprocess.DEVNULL)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def integers(text: str) -> list:
+    return [int(value) for value in text.split(",")]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--dsn", help="libpq connection string of the database to use")
+    target.add_argument("--temp-cluster", action="store_true", help="run against a temporary cluster (initdb/pg_ctl)")
+    parser.add_argument("--pg-bin", help="directory of initdb and pg_ctl, for --temp-cluster")
+    parser.add_argument("--workloads", default=",".join(WORKLOADS), help="comma separated workloads")
+    parser.add_argument("--rows", type=integers, default=[100, 10000], help="comma separated table sizes")
+    parser.add_argument("--concurrency", type=integers, default=[1, 4], help="comma separated thread counts")
+    parser.add_argument("--duration", type=float, default=2.0, help="seconds per case")
+    parser.add_argument("--output", help="write the JSON results to this file instead of stdout")
+    parser.add_argument("--baseline", help="JSON results of a previous run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative change reported as a regression")
+    args = parser.parse_args()
+
+    workloads = args.workloads.split(",")
+    unknown = set(workloads) - set(WORKLOADS)
+    if unknown:
+        parser.error("unknown workloads: %s" % ", ".join(sorted(unknown)))
+
+    with contextlib.ExitStack() as stack:
+        if args.temp_cluster:
+            params = stack.enter_context(temp_cluster(args.pg_bin))
+        elif args.dsn:
+            dsn = psycopg2.extensions.parse_dsn(args.dsn)
+            params = {key: dsn.get("dbname" if key == "database" else key) for key in DATABASE_PARAMS}
+        else:
+            params = DATABASE_PARAMS
+        results = run_suite(params, workloads, args.rows, args.concurrency, args.duration)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.threshold)
+        for regression in regressions:
+            print("REGRESSION " + regression, file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
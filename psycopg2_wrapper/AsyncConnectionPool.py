@@ -0,0 +1,248 @@
+import asyncio
+import time
+from collections import deque
+
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import PoolError
+
+from psycopg2_wrapper.ConnectionPool import PoolTimeout
+
+
+async def wait_ready(conn: extensions.connection) -> None:
+    """
+    Drive an asynchronous connection until its current operation is complete.
+    The connection file descriptor is watched through the running event loop, so no thread is blocked.
+
+    Parameters:
+    ----------
+    - conn: A connection opened with `async_=True`.
+    """
+    loop = asyncio.get_running_loop()
+    fd = conn.fileno()
+
+    while True:
+        state = conn.poll()
+        if state == extensions.POLL_OK:
+            return
+
+        future = loop.create_future()
+        callback = lambda: future.done() or future.set_result(None)
+
+        if state == extensions.POLL_READ:
+            loop.add_reader(fd, callback)
+            try:
+                await future
+            finally:
+                loop.remove_reader(fd)
+        elif state == extensions.POLL_WRITE:
+            loop.add_writer(fd, callback)
+            try:
+                await future
+            finally:
+                loop.remove_writer(fd)
+        else:
+            raise psycopg2.OperationalError("unexpected poll state: %s" % state)
+
+
+class _AsyncPoolEntry:
+    """
+    Book-keeping attached to every connection opened by the pool.
+    """
+    __slots__ = ("conn", "created_at", "last_used")
+
+    def __init__(self, conn: extensions.connection) -> None:
+        self.conn = conn
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+
+class AsyncConnectionPool:
+    """
+    This class is an asyncio pool of psycopg2 asynchronous connections.
+    It is the asyncio counterpart of ConnectionPool: it must be used from a single event loop.
+    """
+
+    def __init__(self, connect, min_size: int = 1, max_size: int = 10, timeout: float = 30.0,
+                 max_idle: float = 600.0, max_lifetime: float = 3600.0) -> None:
+        """
+        Constructor that stores the pool settings. Call `open` to pre-warm the pool.
+
+        Parameters:
+        ----------
+        - connect: A coroutine function without arguments returning a new, ready, asynchronous connection.
+        - min_size: The number of connections opened by `open` and kept open when idle.
+        - max_size: The maximum number of connections opened at the same time.
+        - timeout: The maximum number of seconds to wait for a connection when the pool is exhausted.
+        - max_idle: The number of seconds after which an idle connection above `min_size` is closed.
+        - max_lifetime: The number of seconds after which a connection is closed and replaced.
+        """
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("invalid pool size: min_size=%s, max_size=%s" % (min_size, max_size))
+
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+
+        self._idle = deque()
+        self._used = {}
+        self._size = 0
+        self._closed = False
+        self._cond = asyncio.Condition()
+
+
+    async def open(self) -> None:
+        """
+        Open the first `min_size` connections concurrently.
+        """
+        missing = self.min_size - self._size
+        if missing <= 0:
+            return
+
+        self._size += missing
+        results = await asyncio.gather(*(self._connect() for _ in range(missing)), return_exceptions=True)
+        errors = [result for result in results if isinstance(result, BaseException)]
+
+        async with self._cond:
+            for result in results:
+                if not isinstance(result, BaseException):
+                    self._idle.append(_AsyncPoolEntry(result))
+            self._size -= len(errors)
+            self._cond.notify_all()
+
+        if errors:
+            raise errors[0]
+
+
+    async def getconn(self, timeout: float = None) -> extensions.connection:
+        """
+        Check a connection out of the pool.
+
+        Parameters:
+        ----------
+        - timeout: The maximum number of seconds to wait when the pool is exhausted.
+            Defaults to the pool timeout.
+
+        Returns:
+        -------
+        returns an asynchronous connection object.
+        """
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+        entry = None
+
+        async with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolError("connection pool is closed")
+
+                now = time.monotonic()
+                while self._idle:
+                    candidate = self._idle.pop()
+                    if self._expired(candidate, now) or candidate.conn.closed:
+                        self._close_entries([candidate])
+                        self._size -= 1
+                    else:
+                        entry = candidate
+                        break
+
+                if entry is not None or self._size < self.max_size:
+                    break
+
+                remaining = deadline - now
+                if remaining <= 0:
+                    raise PoolTimeout("connection pool exhausted (max_size=%s)" % self.max_size)
+                try:
+                    await asyncio.wait_for(self._cond.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+
+            if entry is None:
+                self._size += 1
+
+        if entry is None:
+            try:
+                entry = _AsyncPoolEntry(await self._connect())
+            except BaseException:
+                async with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+
+        self._used[entry.conn] = entry
+        return entry.conn
+
+
+    async def putconn(self, conn: extensions.connection, discard: bool = False) -> None:
+        """
+        Return a connection to the pool.
+        Connections that are broken, expired, or still busy with a query are closed instead.
+
+        Parameters:
+        ----------
+        - conn: The connection object to return.
+        - discard: Close the connection instead of keeping it in the pool.
+        """
+        entry = self._used.pop(conn, None)
+        if entry is None:
+            raise PoolError("trying to put a connection that is not checked out from this pool")
+
+        now = time.monotonic()
+        keep = not (discard or self._closed or conn.closed or conn.isexecuting() or self._expired(entry, now)
+                    or conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE)
+
+        async with self._cond:
+            if keep:
+                entry.last_used = now
+                self._idle.append(entry)
+            else:
+                self._close_entries([entry])
+                self._size -= 1
+
+            while self._idle and self._size > self.min_size and self.max_idle is not None \
+                    and now - self._idle[0].last_used >= self.max_idle:
+                self._close_entries([self._idle.popleft()])
+                self._size -= 1
+
+            self._cond.notify()
+
+
+    async def closeall(self) -> None:
+        """
+        Close the idle connections and refuse further checkouts.
+        Checked out connections are closed when they are returned.
+        """
+        async with self._cond:
+            self._closed = True
+            self._close_entries(self._idle)
+            self._size -= len(self._idle)
+            self._idle.clear()
+            self._cond.notify_all()
+
+
+    def stats(self) -> dict:
+        """
+        Return a snapshot of the pool usage.
+        """
+        return {
+            "size": self._size,
+            "idle": len(self._idle),
+            "in_use": len(self._used),
+            "min_size": self.min_size,
+            "max_size": self.max_size,
+        }
+
+
+    def _expired(self, entry: _AsyncPoolEntry, now: float) -> bool:
+        return self.max_lifetime is not None and now - entry.created_at >= self.max_lifetime
+
+
+    @staticmethod
+    def _close_entries(entries) -> None:
+        for entry in entries:
+            try:
+                entry.conn.close()
+            except psycopg2.Error:
+                pass
@@ -0,0 +1,316 @@
+import asyncio
+import itertools
+
+import psycopg2
+
+from psycopg2_wrapper.AsyncConnectionPool import AsyncConnectionPool, wait_ready
+from psycopg2_wrapper.DatabaseConnector import DatabaseConnector
+from psycopg2_wrapper.Listener import AsyncListener
+
+
+class AsyncNativeQueryExecutor:
+    """
+    This class is the asyncio counterpart of NativeQueryExecutor.
+    It runs the queries on psycopg2 asynchronous connections (`async_=True`) whose sockets are polled
+    by the event loop, so many queries can be in flight at the same time without a thread per query.
+
+    Asynchronous connections are always in autocommit mode: every statement is committed on its own,
+    except for `execute_many_and_commit` which wraps its statements in an explicit transaction.
+    """
+
+    _cursor_ids = itertools.count(1)
+
+    def __init__(self, config: dict) -> None:
+        """
+        Constructor that stores the database parameters.
+        The connection pool is created and pre-warmed on the first query.
+
+        Parameters:
+        ----------
+        - config: The configuration dictionary, see DatabaseConnector.
+            The optional `pool` entry accepts `min_size`, `max_size`, `timeout`, `max_idle` and `max_lifetime`.
+        """
+        self.conn = DatabaseConnector(db_params=config)
+        self._pool = None
+        self._pool_lock = None
+
+
+    async def connect(self) -> psycopg2.extensions.connection:
+        """
+        Create an asynchronous connection to the database.
+
+        Returns:
+        -------
+        returns a ready asynchronous connection object.
+        """
+        # the same arguments (timeouts included) and circuit breaker as the connections of the synchronous executors
+        args = self.conn.connect_args()
+        timeout = args.get("connect_timeout")
+
+        async def connect():
+            conn = psycopg2.connect(async_=True, **args)
+            try:
+                # libpq only applies connect_timeout to blocking connections
+                await asyncio.wait_for(wait_ready(conn), timeout)
+            except asyncio.TimeoutError:
+                conn.close()
+                raise psycopg2.OperationalError("timeout expired")
+            except BaseException:
+                conn.close()
+                raise
+            return conn
+
+        breaker = self.conn.breaker
+        return await (connect() if breaker is None else breaker.call_async(connect))
+
+
+    async def pool(self) -> AsyncConnectionPool:
+        """
+        Return the connection pool, creating and pre-warming it on first call.
+
+        Returns:
+        -------
+        returns an AsyncConnectionPool instance.
+        """
+        if self._pool is None:
+            if self._pool_lock is None:
+                self._pool_lock = asyncio.Lock()
+            async with self._pool_lock:
+                if self._pool is None:
+                    options = {key: value for key, value in self.conn.pool_params.items() if key != "ping_interval"}
+                    pool = AsyncConnectionPool(self.connect, **options)
+                    await pool.open()
+                    self._pool = pool
+        return self._pool
+
+
+    async def close(self) -> None:
+        """
+        Close every pooled connection.
+        """
+        if self._pool is not None:
+            pool, self._pool = self._pool, None
+            await pool.closeall()
+
+
+    async def execute_and_commit(self, sql: str, params: tuple = None) -> None:
+        """
+        Execute a SQL query and commit the changes to the database.
+
+        Parameters:
+        ----------
+        - sql: The SQL query to execute.
+        - params: The parameters to pass to the query.
+        """
+        await self._run(sql, params, lambda cursor: None)
+
+
+    async def execute_and_fetchone(self, sql: str, params: tuple = None) -> tuple:
+        """
+        Execute a SQL query and fetch the first result.
+
+        Parameters:
+        ----------
+        - sql: The SQL query to execute.
+        - params: The parameters to pass to the query.
+
+        Returns:
+        -------
+        returns a tuple with the result.
+        """
+        return await self._run(sql, params, lambda cursor: cursor.fetchone())
+
+
+    async def execute_and_fetchall(self, sql: str, params: tuple = None) -> list:
+        """
+        Execute a SQL query and fetch all the results.
+
+        Parameters:
+        ----------
+        - sql: The SQL query to execute.
+        - params: The parameters to pass to the query.
+
+        Returns:
+        -------
+        returns a list with the results.
+        """
+        return await self._run(sql, params, lambda cursor: cursor.fetchall())
+
+
+    async def execute_and_fetchmany(self, sql: str, params: tuple = None, size: int = 2) -> list:
+        """
+        Execute a SQL query and fetch a number of results.
+
+        Parameters:
+        ----------
+        - sql: The SQL query to execute.
+        - params: The parameters to pass to the query.
+        - size: The number of results to fetch.
+
+        Returns:
+        -------
+        returns a list with the results.
+        """
+        return await self._run(sql, params, lambda cursor: cursor.fetchmany(size))
+
+
+    async def execute_many_and_commit(self, sql: str, params: list, page_size: int = 100) -> None:
+        """
+        Execute a SQL query with multiple parameters.
+        The statements are sent `page_size` at a time inside one transaction,
+        so that only one page of statements is held in memory.
+
+        Parameters:
+        ----------
+        - sql: The SQL query to execute.
+        - params: A list (or any iterable) of parameters to pass to the query.
+        - page_size: The number of statements sent per round trip.
+        """
+        if page_size < 1:
+            raise ValueError("page_size must be at least 1")
+        params = iter(params)
+        page = list(itertools.islice(params, page_size))
+        if not page:
+            return
+
+        pool = await self.pool()
+        conn = await pool.getconn()
+        discard = True
+        try:
+            cursor = conn.cursor()
+            prefix = b"BEGIN;"
+            while page:
+                statements = b";".join(cursor.mogrify(sql, param) for param in page)
+                page = list(itertools.islice(params, page_size))
+                await self._execute(cursor, prefix + statements + (b"" if page else b";COMMIT"))
+                prefix = b""
+            cursor.close()
+            discard = False
+        finally:
+            await pool.putconn(conn, discard=discard)
+
+
+    async def execute_and_stream(self, sql: str, params: tuple = None, itersize: int = 2000):
+        """
+        Execute a SQL query and yield the results one by one.
+        The rows are read through a server-side cursor, `itersize` rows per round trip,
+        so memory stays constant whatever the size of the result.
+        The connection is returned to the pool when the iteration ends or when the generator is closed.
+
+        Example:
+        -------
+        async for row in executor.execute_and_stream("SELECT * FROM big_table"):
+            ...
+
+        Parameters:
+        ----------
+        - sql: The SQL query to execute.
+        - params: The parameters to pass to the query.
+        - itersize: The number of rows fetched per round trip.
+
+        Returns:
+        -------
+        returns an asynchronous generator of tuples.
+        """
+        pool = await self.pool()
+        conn = await pool.getconn()
+        discard = True
+        name = "psycopg2_wrapper_async_%d" % next(self._cursor_ids)
+        try:
+            cursor = conn.cursor()
+            query = cursor.mogrify(sql, params)
+            await self._execute(cursor, b"BEGIN;DECLARE " + name.encode() + b" NO SCROLL CURSOR FOR " + query)
+
+            fetch = "FETCH FORWARD %d FROM %s" % (itersize, name)
+            while True:
+                await self._execute(cursor, fetch)
+                rows = cursor.fetchall()
+                for row in rows:
+                    yield row
+                if len(rows) < itersize:
+                    break
+
+            await self._execute(cursor, "CLOSE %s;COMMIT" % name)
+            cursor.close()
+            discard = False
+        finally:
+            if discard and not conn.closed and not conn.isexecuting():
+                # the generator was closed early: end the transaction so the connection can be reused
+                try:
+                    await self._execute(conn.cursor(), "ROLLBACK")
+                    discard = False
+                except (psycopg2.Error, asyncio.CancelledError):
+                    pass
+            await pool.putconn(conn, discard=discard)
+
+
+    def listen(self, channels, batch_delay: float = 0.0) -> AsyncListener:
+        """
+        Subscribe to notification channels, see NativeQueryExecutor.listen.
+        The dedicated connection is opened on first use.
+
+        Example:
+        -------
+        async with executor.listen(["jobs"]) as listener:
+            async for batch in listener:
+                for notification in batch:
+                    ...
+
+        Parameters:
+        ----------
+        - channels: A channel name or a list of channel names.
+        - batch_delay: After a notification arrives, the number of seconds to wait for more.
+
+        Returns:
+        -------
+        returns an AsyncListener.
+        """
+        channels = [channels] if isinstance(channels, str) else channels
+        return AsyncListener(self.connect, channels, batch_delay)
+
+
+    async def notify(self, channel: str, payload: str = None) -> None:
+        """
+        Send a notification on a channel (`pg_notify`).
+
+        Parameters:
+        ----------
+        - channel: The name of the channel.
+        - payload: An optional string delivered with the notification.
+        """
+        await self._run("SELECT pg_notify(%s, %s)", (channel, payload or ""), lambda cursor: None)
+
+
+    async def _run(self, sql: str, params: tuple, fetch):
+        pool = await self.pool()
+        conn = await pool.getconn()
+        discard = True
+        try:
+            cursor = conn.cursor()
+            await self._execute(cursor, sql, params)
+            result = fetch(cursor)
+            cursor.close()
+            discard = False
+            return result
+        except psycopg2.Error:
+            # a failed statement leaves the connection usable
+            discard = conn.closed or conn.isexecuting()
+            raise
+        finally:
+            await pool.putconn(conn, discard=discard)
+
+
+    @staticmethod
+    async def _execute(cursor: psycopg2.extensions.cursor, sql, params: tuple = None) -> None:
+        if params is None: cursor.execute(sql)
+        else: cursor.execute(sql, params)
+
+        try:
+            await wait_ready(cursor.connection)
+        except asyncio.CancelledError:
+            # the task was cancelled while the query runs: stop it on the server, the caller discards the connection
+            try:
+                cursor.connection.cancel()
+            except psycopg2.Error:
+                pass
+            raise
@@ -0,0 +1,212 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+
+from psycopg2 import sql
+
+
+_STOP = object()
+
+
+def _deadline(timeout: float) -> float:
+    return None if timeout is None else time.monotonic() + timeout
+
+
+def _remaining(deadline: float) -> float:
+    return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+
+class _Flush:
+    """
+    A marker asking the writer thread to flush the rows queued before it.
+    """
+    __slots__ = ("done",)
+
+    def __init__(self) -> None:
+        self.done = threading.Event()
+
+
+class BufferedWriter:
+    """
+    This class coalesces single-row inserts coming from any number of threads into bulk inserts.
+    `write` puts a row in a bounded queue and returns at once; a background thread inserts the queued rows
+    in one transaction per batch as soon as `max_rows` rows are waiting or the oldest one has waited
+    `max_delay_ms` milliseconds. When the queue is full, `write` blocks until the writer catches up.
+
+    A batch that fails is not retried: it is passed to the `on_error` callback (logged by default),
+    and the writer carries on with the next one. The queued rows are flushed by `close`, which also runs
+    when the interpreter exits.
+    """
+
+    def __init__(self, executor, table_name: str, columns: list, max_rows: int = 1000, max_delay_ms: float = 100,
+                 max_queue: int = 100000, method: str = "copy", on_error=None) -> None:
+        """
+        Constructor that starts the writer thread.
+
+        Parameters:
+        ----------
+        - executor: The SimpleQueryExecutor used to insert the rows.
+        - table_name: The name of the table to insert into.
+        - columns: The column names, in the order of the values of tuple rows.
+        - max_rows: The maximum number of rows per batch.
+        - max_delay_ms: The maximum number of milliseconds a row waits before its batch is inserted.
+        - max_queue: The maximum number of queued rows; `write` blocks past it.
+        - method: "copy" (COPY FROM STDIN, see `insert_rows`) or "values" (a multi-row INSERT).
+        - on_error: A callable called with the exception and the rows of a failed batch.
+        """
+        if method not in ("copy", "values"):
+            raise ValueError("method must be 'copy' or 'values', not %r" % method)
+
+        self.executor = executor
+        self.table_name = table_name
+        self.columns = tuple(columns)
+        self.max_rows = max_rows
+        self.max_delay = max_delay_ms / 1000
+        self.method = method
+        self.on_error = on_error
+
+        self.rows_written = 0
+        self.batches = 0
+        self.failed_batches = 0
+        self.closed = False
+
+        self._queue = queue.Queue(max_queue)
+        self._close_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="psycopg2_wrapper_writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+
+    def write(self, row, timeout: float = None) -> None:
+        """
+        Queue a row for insertion.
+
+        Parameters:
+        ----------
+        - row: A tuple of values in the order of `columns`, or a dictionary (column name to value).
+        - timeout: The maximum number of seconds to wait when the queue is full. None waits as long as needed.
+            `queue.Full` is raised when it expires.
+        """
+        if isinstance(row, dict):
+            row = tuple(row[column] for column in self.columns)
+        self._put(row, _deadline(timeout))
+
+
+    def flush(self, timeout: float = None) -> bool:
+        """
+        Wait until the rows written before the call are inserted (or reported as failed).
+        RuntimeError is raised once the writer is closed: `close` itself inserts the queued rows.
+
+        Parameters:
+        ----------
+        - timeout: The maximum number of seconds the whole call waits, queueing the flush request included.
+            None waits as long as needed. `queue.Full` is raised when it expires before the request is queued.
+
+        Returns:
+        -------
+        returns False if the timeout expired first.
+        """
+        deadline = _deadline(timeout)
+        marker = _Flush()
+        self._put(marker, deadline)
+        return marker.done.wait(_remaining(deadline))
+
+
+    def close(self, timeout: float = None) -> None:
+        """
+        Insert the queued rows and stop the writer thread. Later writes raise RuntimeError.
+        """
+        with self._close_lock:
+            if self.closed:
+                return
+            self.closed = True
+            atexit.unregister(self.close)
+            self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+
+    def stats(self) -> dict:
+        """
+        Return the writer counters.
+        """
+        return {
+            "queued": self._queue.qsize(),
+            "rows_written": self.rows_written,
+            "batches": self.batches,
+            "failed_batches": self.failed_batches,
+        }
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+    def _put(self, item, deadline: float) -> None:
+        # checked and queued under the close lock, so that nothing is queued after _STOP, where it would never be read
+        if not self._close_lock.acquire(timeout=-1 if deadline is None else _remaining(deadline)):
+            raise queue.Full
+        try:
+            if self.closed:
+                raise RuntimeError("the writer is closed")
+            self._queue.put(item, timeout=_remaining(deadline))
+        finally:
+            self._close_lock.release()
+
+
+    def _run(self) -> None:
+        stop = False
+        while not stop:
+            batch = []
+            markers = []
+            item = self._queue.get()
+            deadline = time.monotonic() + self.max_delay
+
+            while True:
+                if item is _STOP:
+                    stop = True
+                elif isinstance(item, _Flush):
+                    markers.append(item)
+                else:
+                    batch.append(item)
+
+                if stop or markers or len(batch) >= self.max_rows:
+                    break
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+
+            if batch:
+                self._insert(batch)
+            for marker in markers:
+                marker.done.set()
+
+
+    def _insert(self, rows: list) -> None:
+        try:
+            if self.method == "copy":
+                self.executor.insert_rows(self.table_name, self.columns, rows)
+            else:
+                statement = self.executor._sql(("buffered", self.table_name, self.columns), lambda: sql.SQL(
+                    "INSERT INTO {} ({}) VALUES %s").format(self.executor._identifier(self.table_name),
+                                                            sql.SQL(",").join(map(sql.Identifier, self.columns))))
+                self.executor.execute_many_and_commit(statement, rows, mode="values", page_size=len(rows))
+            self.rows_written += len(rows)
+            self.batches += 1
+        except Exception as error:
+            self.failed_batches += 1
+            try:
+                if self.on_error is None:
+                    raise
+                self.on_error(error, rows)
+            except Exception:
+                # the writer thread must survive both the failed batch and a failing callback
+                logging.getLogger("psycopg2_wrapper").exception("BufferedWriter: %d rows could not be inserted into %s",
+                                                               len(rows), self.table_name)
@@ -0,0 +1,69 @@
+import asyncio
+import threading
+
+import psycopg2
+import psycopg2.errors
+
+
+class CancelToken:
+    """
+    This class cancels the statements of the calls it is passed to (`cancel=token`), from another thread
+    or an asyncio task. `cancel` sends a cancel request (`connection.cancel()`) for every statement running
+    with the token, and the calls started afterwards fail at once; the cancelled calls raise
+    `psycopg2.errors.QueryCanceled` and their connections are rolled back and returned to the pool.
+
+    A token can be shared by several calls, e.g. all the queries of one request, and cannot be reset.
+    """
+
+    def __init__(self) -> None:
+        self.cancelled = False
+        self._conns = set()
+        self._lock = threading.Lock()
+
+
+    def cancel(self) -> None:
+        """
+        Cancel the statements running with the token, and the calls started later.
+        """
+        # the requests are sent under the lock: `detach` waits for them, so a connection cannot go back to the pool
+        # and run another caller's statement before its cancel request is out
+        with self._lock:
+            self.cancelled = True
+            for conn in self._conns:
+                try:
+                    conn.cancel()
+                except psycopg2.Error:
+                    # the connection was closed in between: nothing left to cancel
+                    pass
+
+
+    async def cancel_async(self) -> None:
+        """
+        Cancel from an asyncio task: the cancel requests are sent from a thread so that the event loop is not blocked.
+        """
+        await asyncio.get_running_loop().run_in_executor(None, self.cancel)
+
+
+    def check(self) -> None:
+        """
+        Raise QueryCanceled if the token was cancelled.
+        """
+        if self.cancelled:
+            raise psycopg2.errors.QueryCanceled("canceling statement due to user request (CancelToken)")
+
+
+    def attach(self, conn: psycopg2.extensions.connection) -> None:
+        """
+        Register a connection whose statements `cancel` must interrupt, raising QueryCanceled if it is too late.
+        """
+        with self._lock:
+            self.check()
+            self._conns.add(conn)
+
+
+    def detach(self, conn: psycopg2.extensions.connection) -> None:
+        """
+        Unregister a connection once its statement is done.
+        """
+        with self._lock:
+            self._conns.discard(conn)
@@ -0,0 +1,176 @@
+import threading
+import time
+
+import psycopg2
+
+from psycopg2_wrapper.Instrumentation import Histogram
+
+
+class CircuitOpen(psycopg2.OperationalError):
+    """
+    Raised instead of connecting while the circuit breaker of a server is open.
+    """
+
+
+class CircuitBreaker:
+    """
+    This class stops connection attempts to a server that keeps failing.
+    The breaker is closed while connections succeed. After `failure_threshold` consecutive failures it opens,
+    and every attempt fails at once with CircuitOpen instead of waiting for the connect timeout.
+    Once `reset_timeout` seconds have passed it is half-open: a single attempt (the probe) goes through,
+    closing the breaker if it succeeds and opening it again for another `reset_timeout` if it fails;
+    the other attempts keep failing fast until the probe is done.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 10.0) -> None:
+        """
+        Constructor that stores the breaker settings.
+
+        Parameters:
+        ----------
+        - failure_threshold: The number of consecutive failures that opens the breaker.
+        - reset_timeout: The number of seconds the breaker stays open before letting a probe through.
+        """
+        if failure_threshold < 1:
+            raise ValueError("failure_threshold must be at least 1")
+
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened = 0
+        self.rejected = 0
+        self.opened_at = None
+        self._probing = False
+        self._latency = Histogram()
+        self._lock = threading.Lock()
+
+
+    def call(self, connect):
+        """
+        Run a connection attempt through the breaker.
+
+        Parameters:
+        ----------
+        - connect: A callable opening the connection. psycopg2.OperationalError counts as a failure.
+
+        Returns:
+        -------
+        returns the result of `connect`.
+        """
+        self.before()
+        started = time.monotonic()
+        try:
+            result = connect()
+        except psycopg2.OperationalError:
+            self._record(False, time.monotonic() - started)
+            raise
+        except BaseException:
+            # not a sign of an unreachable server: release the probe slot without judging the server
+            with self._lock:
+                self._probing = False
+            raise
+        self._record(True, time.monotonic() - started)
+        return result
+
+
+    async def call_async(self, connect):
+        """
+        Run an asynchronous connection attempt through the breaker, see `call`.
+
+        Parameters:
+        ----------
+        - connect: A coroutine function opening the connection.
+
+        Returns:
+        -------
+        returns the result of `connect`.
+        """
+        self.before()
+        started = time.monotonic()
+        try:
+            result = await connect()
+        except psycopg2.OperationalError:
+            self._record(False, time.monotonic() - started)
+            raise
+        except BaseException:
+            with self._lock:
+                self._probing = False
+            raise
+        self._record(True, time.monotonic() - started)
+        return result
+
+
+    def before(self) -> None:
+        """
+        Raise CircuitOpen unless an attempt may go through now.
+        In the half-open state, the first caller becomes the probe.
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+            self.rejected += 1
+            retry = max(0.0, self.opened_at + self.reset_timeout - time.monotonic())
+        raise CircuitOpen("circuit breaker open after %d consecutive connection failures, next probe in %.1fs"
+                          % (self.failures, retry))
+
+
+    def check(self) -> None:
+        """
+        Raise CircuitOpen while the breaker is open, before its reset timeout: a cheap test that does not take
+        the probe slot, for callers that may not need a new connection.
+        """
+        with self._lock:
+            if self.state != self.OPEN or time.monotonic() - self.opened_at >= self.reset_timeout:
+                return
+            self.rejected += 1
+            retry = self.opened_at + self.reset_timeout - time.monotonic()
+        raise CircuitOpen("circuit breaker open after %d consecutive connection failures, next probe in %.1fs"
+                          % (self.failures, retry))
+
+
+    def stats(self) -> dict:
+        """
+        Return the breaker state and counters, and the connect latency summary (in seconds) of the attempts
+        that went through, failed ones included.
+        """
+        with self._lock:
+            latency = self._latency
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "opened": self.opened,
+                "rejected": self.rejected,
+                "open_for": 0.0 if self.state == self.CLOSED else time.monotonic() - self.opened_at,
+                "connect_count": latency.count,
+                "connect_max": latency.max,
+                "connect_p50": latency.percentile(0.5),
+                "connect_p99": latency.percentile(0.99),
+            }
+
+
+    def _record(self, success: bool, duration: float) -> None:
+        with self._lock:
+            self._latency.add(duration)
+            self._probing = False
+            if success:
+                self.state = self.CLOSED
+                self.failures = 0
+                self.opened_at = None
+                return
+
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.opened += 1
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
@@ -0,0 +1,96 @@
+import array
+
+try:
+    import numpy
+except ImportError:  # NumPy is optional: the columns are then array.array (numbers) and lists (anything else)
+    numpy = None
+
+
+# type OID -> (array.array typecode, NumPy dtype) of the fixed-size PostgreSQL types
+_TYPES = {
+    16: ("b", "bool"),      # bool
+    21: ("h", "int16"),     # int2
+    23: ("i", "int32"),     # int4
+    20: ("q", "int64"),     # int8
+    26: ("I", "uint32"),    # oid
+    700: ("f", "float32"),  # float4
+    701: ("d", "float64"),  # float8
+}
+
+_NAN = float("nan")
+
+
+class ColumnBuilder:
+    """
+    This class accumulates result rows column by column.
+    Columns of a fixed-size numeric type (chosen from the type OIDs of the cursor description) are stored
+    in compact `array.array` buffers that grow in place, and are handed over to NumPy without a copy,
+    so the memory used stays close to the size of the final arrays.
+
+    A NULL in a float column is stored as NaN; a NULL in an integer or bool column turns the column into
+    an object column. Columns of other types are object arrays (lists without NumPy).
+    """
+
+    def __init__(self, description, use_numpy: bool = None) -> None:
+        """
+        Constructor that prepares one buffer per column.
+
+        Parameters:
+        ----------
+        - description: The `cursor.description` of the result.
+        - use_numpy: Return NumPy arrays. Defaults to True when NumPy is installed.
+        """
+        if use_numpy is None:
+            use_numpy = numpy is not None
+        elif use_numpy and numpy is None:
+            raise ImportError("NumPy is not installed")
+
+        self.use_numpy = use_numpy
+        self.names = [column.name for column in description]
+        self.types = [_TYPES.get(column.type_code) for column in description]
+        self.buffers = [list() if kind is None else array.array(kind[0]) for kind in self.types]
+        self.rows = 0
+
+
+    def append(self, rows: list) -> None:
+        """
+        Add a chunk of rows.
+        """
+        if not rows:
+            return
+
+        for index, values in enumerate(zip(*rows)):
+            buffer = self.buffers[index]
+            try:
+                buffer.extend(values)
+            except (TypeError, OverflowError):
+                # a NULL (or a value not fitting the typecode) in a numeric column:
+                # drop the values appended before the failure and fall back
+                del buffer[self.rows:]
+                if buffer.typecode in "fd":
+                    buffer.extend([_NAN if value is None else value for value in values])
+                else:
+                    self.buffers[index] = buffer.tolist() + list(values)
+                    self.types[index] = None
+        self.rows += len(rows)
+
+
+    def columns(self) -> dict:
+        """
+        Return the accumulated columns.
+
+        Returns:
+        -------
+        returns a dict mapping each column name to a NumPy array,
+        or to an `array.array` (numeric columns) or a list (other columns) without NumPy.
+        """
+        if not self.use_numpy:
+            return dict(zip(self.names, self.buffers))
+
+        columns = {}
+        for name, kind, buffer in zip(self.names, self.types, self.buffers):
+            if kind is not None:
+                columns[name] = numpy.frombuffer(buffer, dtype=kind[1]) if len(buffer) else numpy.empty(0, kind[1])
+            else:
+                columns[name] = numpy.fromiter(buffer, dtype=object, count=len(buffer))
+        return columns
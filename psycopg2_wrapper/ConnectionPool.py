@@ -0,0 +1,309 @@
+import threading
+import time
+import weakref
+from collections import deque
+
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import PoolError
+
+
+DEFAULT_MAX_SIZE = 10
+# how often a waiting checkout looks for connections closed or dropped by their borrower, which notify nobody
+_RECLAIM_INTERVAL = 1.0
+
+
+class PoolTimeout(PoolError):
+    """
+    Raised when no connection could be checked out of the pool before the wait timeout expired.
+    """
+
+
+class _PoolEntry:
+    """
+    Book-keeping attached to every connection opened by the pool.
+    `conn` is None while the connection is checked out, so that a borrower dropping it lets it be garbage collected.
+    """
+    __slots__ = ("conn", "created_at", "last_used", "state")
+
+    def __init__(self, conn: extensions.connection) -> None:
+        self.conn = conn
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        # per-connection storage for features that live as long as the connection (caches, ...)
+        self.state = {}
+
+
+class ConnectionPool:
+    """
+    This class is a thread-safe pool of psycopg2 connections.
+    Connections are opened up-front (pre-warming), handed out on checkout and put back on return,
+    so that the TCP and authentication handshake is paid once per connection instead of once per query.
+
+    The pool only holds weak references to the checked out connections: the slot of a connection closed by its
+    borrower, or dropped without being returned, is reclaimed by a later checkout.
+    """
+
+    def __init__(self, connect, min_size: int = 1, max_size: int = DEFAULT_MAX_SIZE, timeout: float = 30.0,
+                 max_idle: float = 600.0, max_lifetime: float = 3600.0, ping_interval: float = 30.0) -> None:
+        """
+        Constructor that opens the first `min_size` connections.
+
+        Parameters:
+        ----------
+        - connect: A callable without arguments returning a new psycopg2 connection.
+        - min_size: The number of connections opened at construction and kept open when idle.
+        - max_size: The maximum number of connections opened at the same time.
+        - timeout: The maximum number of seconds to wait for a connection when the pool is exhausted.
+        - max_idle: The number of seconds after which an idle connection above `min_size` is closed.
+        - max_lifetime: The number of seconds after which a connection is closed and replaced.
+        - ping_interval: A connection idle for longer than this is checked with `SELECT 1` on checkout.
+            None disables the check.
+        """
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("invalid pool size: min_size=%s, max_size=%s" % (min_size, max_size))
+
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.ping_interval = ping_interval
+
+        self._idle = deque()
+        # weak reference to a checked out connection -> entry
+        self._used = {}
+        # the weak references of dropped connections, appended by the garbage collector without taking the lock
+        self._dropped = []
+        self._size = 0
+        self._waiting = 0
+        self._closed = False
+        self._cond = threading.Condition(threading.Lock())
+
+        try:
+            for _ in range(min_size):
+                self._idle.append(_PoolEntry(self._connect()))
+                self._size += 1
+        except BaseException:
+            self._close_entries(self._idle)
+            raise
+
+
+    def getconn(self, timeout: float = None) -> extensions.connection:
+        """
+        Check a connection out of the pool.
+
+        Parameters:
+        ----------
+        - timeout: The maximum number of seconds to wait when the pool is exhausted.
+            Defaults to the pool timeout.
+
+        Returns:
+        -------
+        returns a connection object.
+        """
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+
+        while True:
+            entry, stale = None, []
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolError("connection pool is closed")
+
+                    self._reclaim(full=False)
+                    now = time.monotonic()
+                    while self._idle:
+                        candidate = self._idle.pop()
+                        if self._expired(candidate, now):
+                            stale.append(candidate)
+                            self._size -= 1
+                        else:
+                            entry = candidate
+                            break
+
+                    if entry is None and self._size >= self.max_size:
+                        self._reclaim(full=True)
+                    if entry is not None or self._size < self.max_size:
+                        break
+
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        raise PoolTimeout("connection pool exhausted (max_size=%s)" % self.max_size)
+
+                    self._waiting += 1
+                    try:
+                        self._cond.wait(min(remaining, _RECLAIM_INTERVAL))
+                    finally:
+                        self._waiting -= 1
+
+                if entry is None:
+                    # reserve the slot before connecting outside of the lock
+                    self._size += 1
+
+            self._close_entries(stale)
+
+            if entry is None:
+                try:
+                    entry = _PoolEntry(self._connect())
+                except BaseException:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            elif not self._healthy(entry):
+                self._close_entries([entry])
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                continue
+
+            conn, entry.conn = entry.conn, None
+            with self._cond:
+                self._used[weakref.ref(conn, self._dropped.append)] = entry
+            return conn
+
+
+    def putconn(self, conn: extensions.connection, discard: bool = False) -> None:
+        """
+        Return a connection to the pool.
+        Any open transaction is rolled back; broken or expired connections are closed instead.
+
+        Parameters:
+        ----------
+        - conn: The connection object to return.
+        - discard: Close the connection instead of keeping it in the pool.
+        """
+        with self._cond:
+            entry = self._used.pop(weakref.ref(conn), None)
+        if entry is None:
+            if conn.closed:
+                # closed by its borrower: the slot was already reclaimed by a checkout
+                return
+            raise PoolError("trying to put a connection that is not checked out from this pool")
+        entry.conn = conn
+
+        keep = not (discard or self._closed or conn.closed or self._expired(entry, time.monotonic()))
+        if keep and conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                keep = False
+
+        stale = [] if keep else [entry]
+        with self._cond:
+            if keep:
+                entry.last_used = time.monotonic()
+                self._idle.append(entry)
+            else:
+                self._size -= 1
+            stale.extend(self._evict_idle(time.monotonic()))
+            self._cond.notify()
+
+        self._close_entries(stale)
+
+
+    def owns(self, conn: extensions.connection) -> bool:
+        """
+        Tell whether a connection is currently checked out from this pool.
+        """
+        with self._cond:
+            return weakref.ref(conn) in self._used
+
+
+    def state(self, conn: extensions.connection) -> dict:
+        """
+        Return the storage dictionary attached to a checked out connection.
+        The dictionary is dropped together with the connection when it is closed by the pool.
+        """
+        with self._cond:
+            return self._used[weakref.ref(conn)].state
+
+
+    def closeall(self) -> None:
+        """
+        Close the idle connections and refuse further checkouts.
+        Checked out connections are closed when they are returned.
+        """
+        with self._cond:
+            self._closed = True
+            stale = list(self._idle)
+            self._size -= len(stale)
+            self._idle.clear()
+            self._cond.notify_all()
+
+        self._close_entries(stale)
+
+
+    def stats(self) -> dict:
+        """
+        Return a snapshot of the pool usage.
+        """
+        with self._cond:
+            self._reclaim(full=True)
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": len(self._used),
+                "waiting": self._waiting,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+            }
+
+
+    def _expired(self, entry: _PoolEntry, now: float) -> bool:
+        return self.max_lifetime is not None and now - entry.created_at >= self.max_lifetime
+
+
+    def _reclaim(self, full: bool) -> None:
+        # free the slots of the connections dropped by their borrower, and with `full` of the closed ones
+        while self._dropped:
+            if self._used.pop(self._dropped.pop(), None) is not None:
+                self._size -= 1
+        if full:
+            for ref in list(self._used):
+                conn = ref()
+                if conn is None or conn.closed:
+                    del self._used[ref]
+                    self._size -= 1
+
+
+    def _evict_idle(self, now: float) -> list:
+        # idle connections are reused LIFO, so the least recently used ones sit on the left
+        evicted = []
+        while self._idle and self._size > self.min_size:
+            entry = self._idle[0]
+            if self.max_idle is None or now - entry.last_used < self.max_idle:
+                break
+            evicted.append(self._idle.popleft())
+            self._size -= 1
+        return evicted
+
+
+    def _healthy(self, entry: _PoolEntry) -> bool:
+        conn = entry.conn
+        if conn.closed or conn.info.transaction_status == extensions.TRANSACTION_STATUS_UNKNOWN:
+            return False
+
+        if self.ping_interval is None or time.monotonic() - entry.last_used < self.ping_interval:
+            return True
+
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.close()
+            if not conn.autocommit:
+                conn.rollback()
+        except psycopg2.Error:
+            return False
+        return True
+
+
+    @staticmethod
+    def _close_entries(entries: list) -> None:
+        for entry in entries:
+            try:
+                entry.conn.close()
+            except psycopg2.Error:
+                pass
@@ -0,0 +1,243 @@
+import datetime
+import json
+import struct
+import uuid
+from decimal import Decimal
+
+
+_TEXT_ESCAPES = str.maketrans({"\\": "\\\\", "\n": "\\n", "\r": "\\r", "\t": "\\t"})
+
+_BINARY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack("!ii", 0, 0)
+_BINARY_TRAILER = struct.pack("!h", -1)
+_BINARY_NULL = struct.pack("!i", -1)
+
+_PG_EPOCH_DATE = datetime.date(2000, 1, 1)
+_PG_EPOCH = datetime.datetime(2000, 1, 1)
+_PG_EPOCH_UTC = datetime.datetime(2000, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def _array_literal(values: list) -> str:
+    items = []
+    for value in values:
+        if value is None:
+            items.append("NULL")
+        elif isinstance(value, (list, tuple)):
+            items.append(_array_literal(value))
+        else:
+            text = _text_value(value)
+            items.append('"' + text.replace("\\", "\\\\").replace('"', '\\"') + '"')
+    return "{" + ",".join(items) + "}"
+
+
+def _text_value(value) -> str:
+    if value is True:
+        return "t"
+    if value is False:
+        return "f"
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return "\\x" + bytes(value).hex()
+    if isinstance(value, dict):
+        return json.dumps(value)
+    if isinstance(value, (list, tuple)):
+        return _array_literal(value)
+    return str(value)
+
+
+def _text_field(value) -> str:
+    if value is None:
+        return "\\N"
+    return _text_value(value).translate(_TEXT_ESCAPES)
+
+
+def _encode_text(value, encoding: str) -> bytes:
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value)
+    return str(value).encode(encoding)
+
+
+def _encode_timestamp(value: datetime.datetime) -> bytes:
+    delta = value - _PG_EPOCH
+    return struct.pack("!q", (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds)
+
+
+def _encode_timestamptz(value: datetime.datetime) -> bytes:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    delta = value - _PG_EPOCH_UTC
+    return struct.pack("!q", (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds)
+
+
+def _encode_numeric(value) -> bytes:
+    value = value if isinstance(value, Decimal) else Decimal(str(value))
+    if value.is_nan():
+        return struct.pack("!hhHH", 0, 0, 0xC000, 0)
+    if value.is_infinite():
+        raise ValueError("infinite numeric values are not supported by binary COPY")
+
+    sign, digits, exponent = value.as_tuple()
+    digits = list(digits)
+    if exponent > 0:
+        digits += [0] * exponent
+        exponent = 0
+    scale = -exponent
+
+    # align the decimal point on base 10000 groups of 4 digits
+    int_len = len(digits) - scale
+    pad_left = -int_len % 4
+    digits = [0] * pad_left + digits
+    int_len += pad_left
+    digits += [0] * (-(len(digits) - int_len) % 4)
+
+    groups = [digits[i] * 1000 + digits[i + 1] * 100 + digits[i + 2] * 10 + digits[i + 3]
+              for i in range(0, len(digits), 4)]
+    weight = int_len // 4 - 1
+    while groups and groups[0] == 0:
+        groups.pop(0)
+        weight -= 1
+    while groups and groups[-1] == 0:
+        groups.pop()
+    if not groups:
+        weight = 0
+
+    return struct.pack("!hhHH%dH" % len(groups), len(groups), weight, 0x4000 if sign else 0, scale, *groups)
+
+
+def _binary_encoder(type_name: str, encoding: str):
+    if type_name == "bool":
+        return lambda value: b"\x01" if value else b"\x00"
+    if type_name in ("int2", "int4", "int8", "float4", "float8", "oid"):
+        pack = struct.Struct({"int2": "!h", "int4": "!i", "int8": "!q", "oid": "!I",
+                              "float4": "!f", "float8": "!d"}[type_name]).pack
+        return pack
+    if type_name in ("text", "varchar", "bpchar", "name", "citext", "json", "xml"):
+        return lambda value: _encode_text(value, encoding)
+    if type_name == "jsonb":
+        return lambda value: b"\x01" + _encode_text(value, encoding)
+    if type_name == "bytea":
+        return bytes
+    if type_name == "uuid":
+        return lambda value: (value if isinstance(value, uuid.UUID) else uuid.UUID(str(value))).bytes
+    if type_name == "date":
+        return lambda value: struct.pack("!i", (value - _PG_EPOCH_DATE).days)
+    if type_name == "timestamp":
+        return _encode_timestamp
+    if type_name == "timestamptz":
+        return _encode_timestamptz
+    if type_name == "numeric":
+        return _encode_numeric
+    raise ValueError("binary COPY is not supported for columns of type %s" % type_name)
+
+
+class CopyStream:
+    """
+    This class is a read-only file object producing `COPY ... FROM STDIN` data from an iterable of rows.
+    Rows are encoded incrementally as `read` is called, so the input can be a generator
+    and is never materialized in memory.
+    """
+
+    def __init__(self, rows, encode_row, header: bytes = b"", trailer: bytes = b"") -> None:
+        """
+        Constructor that stores the rows and the row encoder.
+        Use the `text` and `binary` constructors rather than calling it directly.
+
+        Parameters:
+        ----------
+        - rows: An iterable of sequences of values.
+        - encode_row: A callable encoding one row to bytes.
+        - header: The bytes sent before the first row.
+        - trailer: The bytes sent after the last row.
+        """
+        self._rows = iter(rows)
+        self._encode_row = encode_row
+        self._buffer = bytearray(header)
+        self._trailer = trailer
+        self._exhausted = False
+        self.rows = 0
+
+
+    @classmethod
+    def text(cls, rows, encoding: str = "utf-8") -> "CopyStream":
+        """
+        Create a stream in the COPY text format.
+        NULLs are sent as \\N and backslashes, tabs and newlines are escaped.
+
+        Parameters:
+        ----------
+        - rows: An iterable of sequences of values.
+        - encoding: The Python codec matching the connection client encoding.
+        """
+        def encode_row(row):
+            return ("\t".join([_text_field(value) for value in row]) + "\n").encode(encoding)
+        return cls(rows, encode_row)
+
+
+    @classmethod
+    def binary(cls, rows, types: list, encoding: str = "utf-8") -> "CopyStream":
+        """
+        Create a stream in the COPY binary format.
+        The binary format avoids parsing numbers and timestamps from text on the server,
+        but every value must match the type of its column exactly.
+
+        Parameters:
+        ----------
+        - rows: An iterable of sequences of values.
+        - types: The PostgreSQL type names (`pg_type.typname`) of the columns, in order.
+        - encoding: The Python codec matching the connection client encoding.
+        """
+        encoders = [_binary_encoder(type_name, encoding) for type_name in types]
+        field_count = struct.pack("!h", len(encoders))
+        pack_length = struct.Struct("!i").pack
+
+        def encode_row(row):
+            parts = [field_count]
+            for encode, value in zip(encoders, row):
+                if value is None:
+                    parts.append(_BINARY_NULL)
+                else:
+                    data = encode(value)
+                    parts.append(pack_length(len(data)))
+                    parts.append(data)
+            return b"".join(parts)
+        return cls(rows, encode_row, _BINARY_HEADER, _BINARY_TRAILER)
+
+
+    @staticmethod
+    def binary_supported(types: list) -> bool:
+        """
+        Return whether columns of the given type names can be sent in the COPY binary format.
+        """
+        try:
+            for type_name in types:
+                _binary_encoder(type_name, "utf-8")
+        except ValueError:
+            return False
+        return True
+
+
+    def read(self, size: int = -1) -> bytes:
+        """
+        Read at most `size` bytes of COPY data, encoding as many rows as needed.
+
+        Parameters:
+        ----------
+        - size: The maximum number of bytes to return. A negative size reads everything.
+
+        Returns:
+        -------
+        returns the COPY data, or an empty bytes object at the end of the stream.
+        """
+        while (size < 0 or len(self._buffer) < size) and not self._exhausted:
+            try:
+                row = next(self._rows)
+            except StopIteration:
+                self._exhausted = True
+                self._buffer += self._trailer
+                break
+            self._buffer += self._encode_row(row)
+            self.rows += 1
+
+        if size < 0:
+            size = len(self._buffer)
+        chunk = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return chunk
@@ -1,4 +1,29 @@
+import random
+import threading
+import time
+import weakref
+
 import psycopg2
+import psycopg2.errors
+from psycopg2.pool import PoolError
+
+from psycopg2_wrapper.CircuitBreaker import CircuitBreaker
+from psycopg2_wrapper.ConnectionPool import ConnectionPool
+
+
+class _Replica:
+    """
+    A read replica: its connection parameters, its pool and its routing statistics.
+    """
+
+    def __init__(self, db_params: dict, weight: float, breaker: CircuitBreaker) -> None:
+        self.db_params = db_params
+        self.weight = weight
+        self.breaker = breaker
+        self.pool = None
+        # exponentially weighted moving average of the statement round trip, in seconds
+        self.latency = 0.001
+        self.ejected_until = 0.0
 
 
 class DatabaseConnector:
@@ -23,12 +48,57 @@ class DatabaseConnector:
             "user": "username",
             "password": "password",
             "host": "host",
-            "port": "port"
+            "port": "port",
+            "pool": {               # optional, see ConnectionPool for the defaults
+                "min_size": 1,
+                "max_size": 10,
+                "timeout": 30.0,
+                "max_idle": 600.0,
+                "max_lifetime": 3600.0,
+                "ping_interval": 30.0
+            },
+            "replicas": [           # optional read replicas, each with its own pool
+                {"host": "replica1", "port": "5432", "weight": 1},
+                {"host": "replica2", "weight": 2}   # missing keys are taken from the primary
+            ],
+            "replica_ejection": 30.0,   # seconds an unreachable replica is left out
+            "read_your_writes": 0.0,    # seconds the reads of a thread stay on the primary after its last write
+            "connect_timeout": None,    # seconds a connection attempt may take (libpq rounds it to an integer)
+            "statement_timeout": None,  # seconds a statement may run before the server cancels it
+            "circuit_breaker": {        # optional, one breaker per server, see CircuitBreaker
+                "failure_threshold": 5,
+                "reset_timeout": 10.0
+            },
+            "read_retries": 2,          # retries of a read whose pooled connection turned out to be dead
+            "retry_backoff": 0.05       # seconds, doubled after each retry, with full jitter
         }
         """
         # check if a key is missing and set it to None
-        keys = ["database", "user", "password", "host", "port"]                
+        keys = ["database", "user", "password", "host", "port"]
         self.db_params = {key: db_params.get(key, None) for key in keys}
+        self.pool_params = dict(db_params.get("pool") or {})
+        self.connect_timeout = db_params.get("connect_timeout")
+        self.statement_timeout = db_params.get("statement_timeout")
+        breaker = self.breaker_params = db_params.get("circuit_breaker")
+        make_breaker = (lambda: None) if breaker is None else (lambda: CircuitBreaker(**breaker))
+        self.breaker = make_breaker()
+
+        self.replicas = [
+            _Replica({key: replica.get(key, self.db_params[key]) for key in keys}, replica.get("weight", 1), make_breaker())
+            for replica in db_params.get("replicas") or []
+        ]
+        self.replica_ejection = db_params.get("replica_ejection", 30.0)
+        self.read_your_writes = db_params.get("read_your_writes", 0.0)
+        self.read_retries = db_params.get("read_retries", 2)
+        self.retry_backoff = db_params.get("retry_backoff", 0.05)
+        self.retried_reads = 0
+
+        # the pools are created on first use so that building a connector never touches the network
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        # replica checkouts, weakly keyed so that a connection dropped by its borrower is not kept alive
+        self._checkouts = weakref.WeakKeyDictionary()
+        self._local = threading.local()
 
     def connect(self) -> psycopg2.extensions.connection:
         """
@@ -38,24 +108,213 @@ class DatabaseConnector:
         -------
         returns a connection object.
         """
-        conn = psycopg2.connect(
-            host=self.db_params["host"],
-            database=self.db_params['database'],
-            user=self.db_params["user"],
-            password=self.db_params["password"],
-            port=self.db_params["port"]
-        )
+        return self._connect(self.db_params, self.breaker)
+
+    def primary_params(self) -> dict:
+        """
+        Return the parameters of a connector to the primary with the same settings as this one
+        (timeouts, circuit breaker, retries), without the replicas and the pool settings.
+
+        Returns:
+        -------
+        returns a dictionary in the constructor format.
+        """
+        params = dict(self.db_params)
+        params.update(connect_timeout=self.connect_timeout, statement_timeout=self.statement_timeout,
+                      read_retries=self.read_retries, retry_backoff=self.retry_backoff)
+        if self.breaker_params is not None:
+            params["circuit_breaker"] = dict(self.breaker_params)
+        return params
+
+    @property
+    def pool(self) -> ConnectionPool:
+        """
+        The connection pool of the primary, created and pre-warmed on first access.
+        """
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ConnectionPool(self.connect, **self.pool_params)
+        return self._pool
+
+    def acquire(self, timeout: float = None, readonly: bool = False) -> psycopg2.extensions.connection:
+        """
+        Check a connection out of the connection pool.
+        The connection must be handed back with `close`.
+
+        Parameters:
+        ----------
+        - timeout: The maximum number of seconds to wait when the pool is exhausted.
+        - readonly: Route to a read replica when some are configured. Replicas are chosen at random,
+            weighted by `weight / latency`; unreachable replicas are ejected for `replica_ejection` seconds
+            and the primary is used when no replica is available.
+
+        CircuitOpen (a psycopg2.OperationalError) is raised at once while the circuit breaker of the primary is open.
+
+        Returns:
+        -------
+        returns a connection object.
+        """
+        if readonly and self.replicas and not self._pinned():
+            tried = set()
+            while True:
+                replica = self._choose_replica(tried)
+                if replica is None:
+                    break
+                tried.add(replica)
+                try:
+                    if replica.breaker is not None:
+                        replica.breaker.check()
+                    pool = self._replica_pool(replica)
+                    conn = pool.getconn(timeout)
+                except psycopg2.OperationalError:
+                    replica.ejected_until = time.monotonic() + self.replica_ejection
+                    continue
+                except PoolError:
+                    continue
+                self._checkouts[conn] = (replica, pool)
+                return conn
 
-        return conn
+        if self.breaker is not None:
+            self.breaker.check()
+        return self.pool.getconn(timeout)
 
     def close(self, cursor: psycopg2.extensions.cursor, conn: psycopg2.extensions.connection) -> None:
         """
         Close the cursor and connection objects.
+        A connection checked out with `acquire` is returned to its pool instead of being closed.
 
         Parameters:
         ----------
         - cursor: The cursor object to close.
         - conn: The connection object to close.
         """
-        cursor.close()
-        conn.close()
+        if cursor is not None and not cursor.closed:
+            cursor.close()
+
+        checkout = self._checkouts.pop(conn, None)
+        if checkout is not None:
+            checkout[1].putconn(conn)
+        elif self._pool is not None and self._pool.owns(conn):
+            self._pool.putconn(conn)
+        else:
+            conn.close()
+
+    def state(self, conn: psycopg2.extensions.connection) -> dict:
+        """
+        Return the pool storage dictionary of a checked out connection (see ConnectionPool.state).
+        """
+        checkout = self._checkouts.get(conn)
+        if checkout is not None:
+            return checkout[1].state(conn)
+        return self.pool.state(conn)
+
+    def record(self, conn: psycopg2.extensions.connection, duration: float = None, error: BaseException = None) -> None:
+        """
+        Record the outcome of a statement run on a checked out connection, for the routing of the reads:
+        the round trip time of a statement run on a replica feeds the latency average of the replica,
+        and an OperationalError raised by it (other than a cancelled statement) ejects the replica.
+
+        Parameters:
+        ----------
+        - conn: The connection the statement ran on.
+        - duration: The number of seconds between sending the statement and receiving its result.
+        - error: The exception raised by the statement, if any.
+        """
+        checkout = self._checkouts.get(conn)
+        if checkout is None:
+            return
+        replica = checkout[0]
+        if error is None:
+            replica.latency = 0.8 * replica.latency + 0.2 * duration
+        elif isinstance(error, psycopg2.OperationalError) and not isinstance(error, psycopg2.errors.QueryCanceled):
+            replica.ejected_until = time.monotonic() + self.replica_ejection
+
+    def mark_write(self) -> None:
+        """
+        Record that the current thread wrote to the primary.
+        With `read_your_writes`, the reads of the thread are routed to the primary for that many seconds.
+        """
+        if self.read_your_writes:
+            self._local.pinned_until = time.monotonic() + self.read_your_writes
+
+    def breaker_stats(self) -> dict:
+        """
+        Return the circuit breaker metrics of the primary and of every replica (see CircuitBreaker.stats),
+        None for a server without breaker, and the number of reads retried on a new connection.
+        """
+        return {
+            "primary": None if self.breaker is None else self.breaker.stats(),
+            "replicas": {
+                "%s:%s" % (replica.db_params["host"], replica.db_params["port"]):
+                    None if replica.breaker is None else replica.breaker.stats()
+                for replica in self.replicas
+            },
+            "retried_reads": self.retried_reads,
+        }
+
+    def close_pool(self) -> None:
+        """
+        Close every pooled connection.
+        The next `acquire` call creates new pools.
+        """
+        with self._pool_lock:
+            pools = [self._pool] + [replica.pool for replica in self.replicas]
+            self._pool = None
+            for replica in self.replicas:
+                replica.pool = None
+
+        for pool in pools:
+            if pool is not None:
+                pool.closeall()
+
+    def connect_args(self, db_params: dict = None) -> dict:
+        """
+        Return the keyword arguments of `psycopg2.connect` for a server: its connection parameters
+        and the connect and statement timeouts of the connector.
+
+        Parameters:
+        ----------
+        - db_params: The connection parameters of the server. Defaults to the primary.
+
+        Returns:
+        -------
+        returns a dictionary of keyword arguments.
+        """
+        db_params = self.db_params if db_params is None else db_params
+        args = {
+            "host": db_params["host"],
+            "database": db_params["database"],
+            "user": db_params["user"],
+            "password": db_params["password"],
+            "port": db_params["port"],
+        }
+        if self.connect_timeout is not None:
+            args["connect_timeout"] = max(1, round(self.connect_timeout))
+        if self.statement_timeout is not None:
+            args["options"] = "-c statement_timeout=%d" % (self.statement_timeout * 1000)
+        return args
+
+    def _connect(self, db_params: dict, breaker: CircuitBreaker = None) -> psycopg2.extensions.connection:
+        args = self.connect_args(db_params)
+        connect = lambda: psycopg2.connect(**args)
+        return connect() if breaker is None else breaker.call(connect)
+
+    def _pinned(self) -> bool:
+        return self.read_your_writes and getattr(self._local, "pinned_until", 0.0) > time.monotonic()
+
+    def _choose_replica(self, excluded: set) -> _Replica:
+        now = time.monotonic()
+        candidates = [replica for replica in self.replicas
+                      if replica not in excluded and replica.weight > 0 and replica.ejected_until <= now]
+        if not candidates:
+            return None
+        scores = [replica.weight / max(replica.latency, 1e-4) for replica in candidates]
+        return random.choices(candidates, scores)[0]
+
+    def _replica_pool(self, replica: _Replica) -> ConnectionPool:
+        if replica.pool is None:
+            with self._pool_lock:
+                if replica.pool is None:
+                    replica.pool = ConnectionPool(lambda: self._connect(replica.db_params, replica.breaker), **self.pool_params)
+        return replica.pool
@@ -0,0 +1,101 @@
+import gzip
+import io
+import os
+
+try:
+    import zstandard
+except ImportError:  # zstd compression is optional
+    zstandard = None
+
+
+class ExportWriter:
+    """
+    This class is the file object `cursor.copy_expert` writes the output of a `COPY ... TO STDOUT` to.
+    The data goes straight to the destination (optionally through a gzip or zstd compressor), so an export
+    runs in constant memory, and the bytes and rows written so far are reported to a progress callback.
+    """
+
+    def __init__(self, dest, compression: str = None, progress=None, progress_bytes: int = 1024 * 1024,
+                 count_rows: bool = True) -> None:
+        """
+        Constructor that opens the destination.
+
+        Parameters:
+        ----------
+        - dest: A path (opened and closed by the writer), or a binary or text file object such as an open file,
+            a pipe or `subprocess.Popen(...).stdin` (left open).
+        - compression: None, "gzip" or "zstd" (needs the `zstandard` package).
+        - progress: A callable called with the number of (uncompressed) bytes and of rows written so far,
+            every `progress_bytes` bytes and once at the end.
+        - progress_bytes: The number of bytes between two progress calls.
+        - count_rows: Count the rows as the lines of the output (text and csv formats).
+        """
+        if compression not in (None, "gzip", "zstd"):
+            raise ValueError("compression must be None, 'gzip' or 'zstd', not %r" % compression)
+        if compression == "zstd" and zstandard is None:
+            raise ImportError("zstd compression needs the zstandard package")
+
+        self.owned = isinstance(dest, (str, bytes, os.PathLike))
+        if self.owned:
+            raw = open(dest, "wb")
+        elif isinstance(dest, io.TextIOBase):
+            # COPY produces bytes: write them under the text layer
+            dest.flush()
+            raw = dest.buffer
+        elif hasattr(dest, "write"):
+            raw = dest
+        else:
+            raise TypeError("dest must be a path or a file object, not %r" % type(dest).__name__)
+
+        self.raw = raw
+        if compression == "gzip":
+            self.file = gzip.GzipFile(fileobj=raw, mode="wb")
+        elif compression == "zstd":
+            self.file = zstandard.ZstdCompressor().stream_writer(raw, closefd=False)
+        else:
+            self.file = raw
+
+        self.progress = progress
+        self.progress_bytes = progress_bytes
+        self.count_rows = count_rows
+        self.bytes = 0
+        self.rows = 0
+        self._next_progress = progress_bytes
+
+
+    def write(self, data: bytes) -> int:
+        """
+        Write a chunk of the COPY output.
+        """
+        self.file.write(data)
+        self.bytes += len(data)
+        if self.count_rows:
+            self.rows += data.count(b"\n")
+        if self.progress is not None and self.bytes >= self._next_progress:
+            self._next_progress = self.bytes + self.progress_bytes
+            self.progress(self.bytes, self.rows)
+        return len(data)
+
+
+    def close(self, rows: int = None) -> None:
+        """
+        Flush the compressor and close the destination if it was opened from a path.
+
+        Parameters:
+        ----------
+        - rows: The exact number of exported rows once the export succeeded, reported to the progress callback.
+            None when the export failed.
+        """
+        try:
+            if self.file is not self.raw:
+                self.file.close()
+        finally:
+            if self.owned:
+                self.raw.close()
+            else:
+                self.raw.flush()
+
+        if rows is not None:
+            self.rows = rows
+            if self.progress is not None:
+                self.progress(self.bytes, self.rows)
@@ -0,0 +1,319 @@
+import logging
+import math
+import re
+import threading
+import time
+from collections import OrderedDict
+
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w$])-?\d+(?:\.\d+)?(?:e[+-]?\d+)?\b", re.IGNORECASE)
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s|\$\d+")
+_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACES = re.compile(r"\s+")
+
+_METRICS = ("acquire", "execute", "fetch", "total", "rows", "bytes")
+
+
+class Histogram:
+    """
+    This class is a streaming histogram with logarithmic buckets.
+    Each bucket is about 9% wide, so percentiles are accurate to ~9% whatever the range of the values,
+    in constant memory.
+    """
+    __slots__ = ("buckets", "count", "sum", "max")
+
+    _BASE = 2 ** 0.125
+
+    def __init__(self) -> None:
+        self.buckets = {}
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+
+    def add(self, value: float) -> None:
+        """
+        Record a value. Values lower than or equal to 0 go to a dedicated bucket.
+        """
+        index = math.floor(math.log(value, self._BASE)) if value > 0 else None
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+
+    def percentile(self, q: float) -> float:
+        """
+        Return the (approximate) value below which a fraction `q` of the recorded values fall.
+        """
+        if not self.count:
+            return 0.0
+
+        rank = q * self.count
+        seen = self.buckets.get(None, 0)
+        if seen >= rank:
+            return 0.0
+        for index in sorted(key for key in self.buckets if key is not None):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return min(self._BASE ** (index + 1), self.max)
+        return self.max
+
+
+class QueryEvent:
+    """
+    The measurements of one statement, passed to the before/after hooks.
+    Hooks can keep their own data (e.g. a tracing span) in `context`.
+    """
+    __slots__ = ("sql", "params", "fingerprint", "started", "timings", "rows", "bytes", "error", "context", "_last")
+
+    def __init__(self, sql: str, params, fingerprint: str) -> None:
+        self.sql = sql
+        self.params = params
+        self.fingerprint = fingerprint
+        self.started = time.perf_counter()
+        self.timings = {"acquire": 0.0, "execute": 0.0, "fetch": 0.0}
+        self.rows = -1
+        self.bytes = 0
+        self.error = None
+        self.context = {}
+        self._last = self.started
+
+
+    def lap(self, stage: str) -> None:
+        """
+        Record the time spent since the previous lap as the duration of `stage`.
+        """
+        now = time.perf_counter()
+        self.timings[stage] += now - self._last
+        self._last = now
+
+
+    def skip(self) -> None:
+        """
+        Leave the time since the previous lap out of the measurements, e.g. while the caller consumes
+        a chunk of a streamed result.
+        """
+        now = time.perf_counter()
+        self.started += now - self._last
+        self._last = now
+
+
+    def count(self, rows: list) -> None:
+        """
+        Add a chunk of rows to the row and byte counts of a result fetched in several chunks.
+        """
+        self.rows = max(self.rows, 0) + len(rows)
+        self.bytes += sum(_row_size(row) for row in rows)
+
+
+    @property
+    def duration(self) -> float:
+        """
+        The total time of the statement, in seconds.
+        """
+        return self._last - self.started
+
+
+class Instrumentation:
+    """
+    This class collects per-statement metrics from an executor.
+    Statements are grouped by fingerprint (the SQL text with literals and placeholders replaced by `?`),
+    and for each fingerprint the connection acquire time, execute time, fetch time, total time, row count
+    and (approximate) result size are aggregated into histograms.
+
+    It also logs the statements slower than a threshold, and calls user hooks before and after every
+    statement so that tracing spans can be attached.
+    """
+
+    def __init__(self, slow_query_threshold: float = None, logger: logging.Logger = None,
+                 log_parameters: bool = True, fingerprint_cache_size: int = 1024) -> None:
+        """
+        Constructor that stores the instrumentation settings.
+
+        Parameters:
+        ----------
+        - slow_query_threshold: The duration in seconds above which a statement is logged. None disables the log.
+        - logger: The logger of the slow query log. Defaults to the "psycopg2_wrapper" logger.
+        - log_parameters: Include the parameters of the statement in the slow query log.
+        - fingerprint_cache_size: The number of SQL texts whose fingerprint is memoized.
+        """
+        self.slow_query_threshold = slow_query_threshold
+        self.logger = logger or logging.getLogger("psycopg2_wrapper")
+        self.log_parameters = log_parameters
+        self.fingerprint_cache_size = fingerprint_cache_size
+
+        self._before = []
+        self._after = []
+        self._fingerprints = OrderedDict()
+        self._stats = {}
+        self._lock = threading.Lock()
+
+
+    def add_hook(self, before=None, after=None) -> None:
+        """
+        Register hooks called with the QueryEvent of every statement.
+
+        Parameters:
+        ----------
+        - before: A callable called before the connection is acquired.
+        - after: A callable called once the statement is done (or failed, see `event.error`).
+        """
+        if before is not None:
+            self._before.append(before)
+        if after is not None:
+            self._after.append(after)
+
+
+    def fingerprint(self, sql: str) -> str:
+        """
+        Return the fingerprint of a SQL text: literals, placeholders and IN lists are replaced by `?`
+        and the whitespace is collapsed, so that statements differing only by their values are grouped.
+        """
+        with self._lock:
+            fingerprint = self._fingerprints.get(sql)
+            if fingerprint is not None:
+                self._fingerprints.move_to_end(sql)
+                return fingerprint
+
+        fingerprint = _STRING.sub("?", sql)
+        fingerprint = _PLACEHOLDER.sub("?", fingerprint)
+        fingerprint = _NUMBER.sub("?", fingerprint)
+        fingerprint = _LIST.sub("(?)", fingerprint)
+        fingerprint = _SPACES.sub(" ", fingerprint).strip()
+
+        with self._lock:
+            self._fingerprints[sql] = fingerprint
+            while len(self._fingerprints) > self.fingerprint_cache_size:
+                self._fingerprints.popitem(last=False)
+        return fingerprint
+
+
+    def begin(self, sql: str, params) -> QueryEvent:
+        """
+        Start measuring a statement and call the before hooks.
+        """
+        event = QueryEvent(sql, params, self.fingerprint(sql if isinstance(sql, str) else str(sql)))
+        for hook in self._before:
+            hook(event)
+        event.started = event._last = time.perf_counter()
+        return event
+
+
+    def end(self, event: QueryEvent, result=None, error: BaseException = None) -> None:
+        """
+        Record the measurements of a statement, log it if it is slow, and call the after hooks.
+
+        Parameters:
+        ----------
+        - event: The event returned by `begin`.
+        - result: The fetched result, used to count the rows and estimate their size.
+        - error: The exception raised by the statement, if any.
+        """
+        event.error = error
+        if isinstance(result, list):
+            event.rows = len(result)
+            event.bytes = sum(_row_size(row) for row in result)
+        elif isinstance(result, (tuple, dict)) or hasattr(result, "_fields"):
+            # a single row: a tuple, or a dict, namedtuple or record built by the row factory
+            event.rows = 1
+            event.bytes = _row_size(result)
+
+        with self._lock:
+            stats = self._stats.get(event.fingerprint)
+            if stats is None:
+                stats = self._stats[event.fingerprint] = {"calls": 0, "errors": 0}
+                stats.update((metric, Histogram()) for metric in _METRICS)
+            stats["calls"] += 1
+            if error is not None:
+                stats["errors"] += 1
+            for stage, duration in event.timings.items():
+                stats[stage].add(duration)
+            stats["total"].add(event.duration)
+            if event.rows >= 0:
+                stats["rows"].add(event.rows)
+            stats["bytes"].add(event.bytes)
+
+        if self.slow_query_threshold is not None and event.duration >= self.slow_query_threshold:
+            if self.log_parameters:
+                self.logger.warning("slow query (%.3f s): %s parameters: %r", event.duration, event.sql, event.params)
+            else:
+                self.logger.warning("slow query (%.3f s): %s", event.duration, event.sql)
+
+        for hook in self._after:
+            hook(event)
+
+
+    def snapshot(self) -> dict:
+        """
+        Return the aggregated metrics.
+
+        Returns:
+        -------
+        returns a dict mapping each fingerprint to its call and error counts, and for each metric
+        (acquire, execute, fetch, total in seconds; rows; bytes) its count, sum, max, p50, p95 and p99.
+        """
+        with self._lock:
+            return {
+                fingerprint: {
+                    "calls": stats["calls"],
+                    "errors": stats["errors"],
+                    **{metric: _summary(stats[metric]) for metric in _METRICS}
+                }
+                for fingerprint, stats in self._stats.items()
+            }
+
+
+    def prometheus(self, prefix: str = "psycopg2_wrapper") -> str:
+        """
+        Return the aggregated metrics in the Prometheus text exposition format, as summaries
+        labelled by fingerprint.
+        """
+        lines = []
+        snapshot = self.snapshot()
+        for metric in _METRICS:
+            unit = "_seconds" if metric in ("acquire", "execute", "fetch", "total") else ""
+            name = "%s_query_%s%s" % (prefix, metric, unit)
+            lines.append("# TYPE %s summary" % name)
+            for fingerprint, stats in snapshot.items():
+                label = 'fingerprint="%s"' % fingerprint.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+                summary = stats[metric]
+                for quantile in ("0.5", "0.95", "0.99"):
+                    value = summary["p" + quantile[2:].ljust(2, "0")]
+                    lines.append('%s{%s,quantile="%s"} %r' % (name, label, quantile, value))
+                lines.append("%s_sum{%s} %r" % (name, label, summary["sum"]))
+                lines.append("%s_count{%s} %d" % (name, label, summary["count"]))
+        return "\n".join(lines) + "\n"
+
+
+    def reset(self) -> None:
+        """
+        Drop the aggregated metrics.
+        """
+        with self._lock:
+            self._stats.clear()
+
+
+def _summary(histogram: Histogram) -> dict:
+    return {
+        "count": histogram.count,
+        "sum": histogram.sum,
+        "max": histogram.max,
+        "p50": histogram.percentile(0.5),
+        "p95": histogram.percentile(0.95),
+        "p99": histogram.percentile(0.99),
+    }
+
+
+def _row_size(row) -> int:
+    # the rows of the dict row factory are sized by their values, not their keys
+    values = row.values() if isinstance(row, dict) else row
+    size = 0
+    for value in values:
+        if isinstance(value, (str, bytes, bytearray, memoryview)):
+            size += len(value)
+        elif value is not None:
+            size += 8
+    return size
@@ -0,0 +1,334 @@
+import asyncio
+import select
+import time
+
+import psycopg2
+from psycopg2 import extensions, sql
+
+from psycopg2_wrapper.AsyncConnectionPool import wait_ready
+
+
+_DISCONNECTED = (psycopg2.OperationalError, psycopg2.InterfaceError, OSError, ValueError)
+
+
+def _statement(conn: extensions.connection, command: str, channel: str) -> str:
+    # channels are quoted identifiers: case-sensitive, like the channel names given to pg_notify
+    return sql.SQL(command + " {}").format(sql.Identifier(channel)).as_string(conn)
+
+
+def _drain(conn: extensions.connection) -> list:
+    notifies = list(conn.notifies)
+    del conn.notifies[:]
+    return notifies
+
+
+class Listener:
+    """
+    This class receives the notifications sent with NOTIFY (or `pg_notify`) on a set of channels.
+    It holds one dedicated connection in autocommit mode, outside of the pool, and waits for notifications
+    with `select()` on the connection socket, so an idle listener uses no CPU.
+
+    When the connection is lost the listener reconnects with an exponential backoff and LISTENs again on
+    every channel; notifications sent while it was disconnected are lost.
+    """
+
+    def __init__(self, connect, channels: list = (), batch_delay: float = 0.0,
+                 reconnect_delay: float = 0.5, max_reconnect_delay: float = 30.0) -> None:
+        """
+        Constructor that opens the connection and LISTENs on the channels.
+
+        Parameters:
+        ----------
+        - connect: A callable returning a new connection.
+        - channels: The names of the channels to listen on.
+        - batch_delay: After a notification arrives, the number of seconds to wait for more before
+            returning them all as one batch.
+        - reconnect_delay: The delay before the first reconnection attempt, doubled after every failure.
+        - max_reconnect_delay: The maximum delay between two reconnection attempts.
+        """
+        self._connect = connect
+        self.channels = []
+        self.batch_delay = batch_delay
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.reconnects = 0
+        self.closed = False
+
+        self.conn = self._open()
+        for channel in channels:
+            self.listen(channel)
+
+
+    def listen(self, channel: str) -> None:
+        """
+        Start listening on a channel.
+        """
+        if channel not in self.channels:
+            with self.conn.cursor() as cursor:
+                cursor.execute(_statement(self.conn, "LISTEN", channel))
+            self.channels.append(channel)
+
+
+    def unlisten(self, channel: str) -> None:
+        """
+        Stop listening on a channel.
+        """
+        if channel in self.channels:
+            self.channels.remove(channel)
+            with self.conn.cursor() as cursor:
+                cursor.execute(_statement(self.conn, "UNLISTEN", channel))
+
+
+    def wait(self, timeout: float = None) -> list:
+        """
+        Wait for notifications.
+
+        Parameters:
+        ----------
+        - timeout: The maximum number of seconds to wait. None waits until a notification arrives.
+
+        Returns:
+        -------
+        returns the list of the notifications received together (`psycopg2.extensions.Notify` objects with
+        `channel`, `payload` and `pid` attributes), empty if the timeout expired.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.closed:
+            try:
+                self.conn.poll()
+                if self.conn.notifies:
+                    if self.batch_delay:
+                        end = time.monotonic() + self.batch_delay
+                        while self._select(end):
+                            self.conn.poll()
+                    return _drain(self.conn)
+                if not self._select(deadline):
+                    return []
+            except _DISCONNECTED:
+                if self.closed:
+                    break
+                self._reconnect()
+        return []
+
+
+    def __iter__(self):
+        """
+        Yield the batches of notifications until the listener is closed.
+        """
+        while not self.closed:
+            batch = self.wait()
+            if batch:
+                yield batch
+
+
+    def close(self) -> None:
+        """
+        Close the connection. An iteration in progress stops.
+        """
+        self.closed = True
+        if self.conn is not None:
+            self.conn.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+    def _select(self, deadline: float) -> bool:
+        remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+        return bool(select.select([self.conn], [], [], remaining)[0])
+
+
+    def _open(self) -> extensions.connection:
+        conn = self._connect()
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                for channel in self.channels:
+                    cursor.execute(_statement(conn, "LISTEN", channel))
+        except BaseException:
+            conn.close()
+            raise
+        return conn
+
+
+    def _reconnect(self) -> None:
+        try:
+            self.conn.close()
+        except psycopg2.Error:
+            pass
+
+        delay = self.reconnect_delay
+        while not self.closed:
+            try:
+                self.conn = self._open()
+                self.reconnects += 1
+                return
+            except psycopg2.OperationalError:
+                time.sleep(delay)
+                delay = min(delay * 2, self.max_reconnect_delay)
+
+
+class AsyncListener:
+    """
+    This class is the asyncio counterpart of Listener: the connection socket is watched by the event loop.
+    The connection is opened on first use (`open`, `async with` or `async for`).
+    """
+
+    def __init__(self, connect, channels: list = (), batch_delay: float = 0.0,
+                 reconnect_delay: float = 0.5, max_reconnect_delay: float = 30.0) -> None:
+        """
+        Constructor that stores the listener settings.
+
+        Parameters:
+        ----------
+        - connect: A coroutine function returning a new asynchronous connection.
+        - channels: The names of the channels to listen on.
+        - batch_delay: See Listener.
+        - reconnect_delay: See Listener.
+        - max_reconnect_delay: See Listener.
+        """
+        self._connect = connect
+        self.channels = list(dict.fromkeys(channels))
+        self.batch_delay = batch_delay
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.reconnects = 0
+        self.closed = False
+        self.conn = None
+
+
+    async def open(self) -> None:
+        """
+        Open the connection and LISTEN on the channels.
+        """
+        if self.conn is None:
+            self.conn = await self._open()
+
+
+    async def listen(self, channel: str) -> None:
+        """
+        Start listening on a channel.
+        """
+        if channel not in self.channels:
+            self.channels.append(channel)
+            if self.conn is not None:
+                await self._execute(self.conn, "LISTEN", channel)
+
+
+    async def unlisten(self, channel: str) -> None:
+        """
+        Stop listening on a channel.
+        """
+        if channel in self.channels:
+            self.channels.remove(channel)
+            if self.conn is not None:
+                await self._execute(self.conn, "UNLISTEN", channel)
+
+
+    async def wait(self, timeout: float = None) -> list:
+        """
+        Wait for notifications, see Listener.wait.
+        """
+        await self.open()
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        while not self.closed:
+            try:
+                self.conn.poll()
+                if self.conn.notifies:
+                    if self.batch_delay:
+                        end = loop.time() + self.batch_delay
+                        while await self._readable(end):
+                            self.conn.poll()
+                    return _drain(self.conn)
+                if not await self._readable(deadline):
+                    return []
+            except _DISCONNECTED:
+                if self.closed:
+                    break
+                await self._reconnect()
+        return []
+
+
+    async def __aiter__(self):
+        """
+        Yield the batches of notifications until the listener is closed.
+        """
+        while not self.closed:
+            batch = await self.wait()
+            if batch:
+                yield batch
+
+
+    async def close(self) -> None:
+        """
+        Close the connection. An iteration in progress stops.
+        """
+        self.closed = True
+        if self.conn is not None:
+            self.conn.close()
+
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+
+    async def _readable(self, deadline: float) -> bool:
+        loop = asyncio.get_running_loop()
+        fd = self.conn.fileno()
+        future = loop.create_future()
+        loop.add_reader(fd, lambda: future.done() or future.set_result(None))
+        try:
+            timeout = None if deadline is None else max(0.0, deadline - loop.time())
+            await asyncio.wait_for(future, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            loop.remove_reader(fd)
+
+
+    async def _open(self) -> extensions.connection:
+        conn = await self._connect()
+        try:
+            for channel in self.channels:
+                await self._execute(conn, "LISTEN", channel)
+        except BaseException:
+            conn.close()
+            raise
+        return conn
+
+
+    @staticmethod
+    async def _execute(conn: extensions.connection, command: str, channel: str) -> None:
+        cursor = conn.cursor()
+        cursor.execute(_statement(conn, command, channel))
+        await wait_ready(conn)
+        cursor.close()
+
+
+    async def _reconnect(self) -> None:
+        try:
+            self.conn.close()
+        except psycopg2.Error:
+            pass
+
+        delay = self.reconnect_delay
+        while not self.closed:
+            try:
+                self.conn = await self._open()
+                self.reconnects += 1
+                return
+            except psycopg2.OperationalError:
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.max_reconnect_delay)
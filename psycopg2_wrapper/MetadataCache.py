@@ -0,0 +1,162 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from psycopg2 import extensions
+
+
+# the key columns of an expression index leave the expressions out
+Index = namedtuple("Index", ["name", "columns", "unique", "primary"])
+
+_COLUMNS = (
+    "SELECT a.attname, t.typname, a.atttypid, c.reltuples, format_type(a.atttypid, NULL) FROM pg_class c "
+    "JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped "
+    "JOIN pg_type t ON t.oid = a.atttypid "
+    "WHERE c.oid = %s::regclass ORDER BY a.attnum"
+)
+_INDEXES = (
+    "SELECT i.relname, x.indisunique, x.indisprimary, ARRAY("
+    "SELECT a.attname FROM unnest(x.indkey) WITH ORDINALITY k (attnum, position) "
+    "JOIN pg_attribute a ON a.attrelid = x.indrelid AND a.attnum = k.attnum ORDER BY k.position) "
+    "FROM pg_index x JOIN pg_class i ON i.oid = x.indexrelid WHERE x.indrelid = %s::regclass ORDER BY i.relname"
+)
+
+
+class TableMetadata:
+    """
+    This class describes a table as read from `pg_catalog`: its columns in order with their type names and OIDs,
+    its primary key, its indexes and the row count estimated by the planner.
+    """
+
+    def __init__(self, name: str, columns: tuple, types: tuple, oids: tuple, indexes: tuple, estimated_rows: int,
+                 type_sql: tuple = None) -> None:
+        self.name = name
+        self.columns = columns
+        self.types = types
+        self.oids = oids
+        # the types as written in SQL (`format_type`, without modifier): schema-qualified outside
+        # the search_path, with [] for arrays; defaults to the type names
+        self.type_sql = types if type_sql is None else type_sql
+        self.indexes = indexes
+        primary = [index.columns for index in indexes if index.primary]
+        self.primary_key = primary[0] if primary else ()
+        # None when the table was never vacuumed or analyzed
+        self.estimated_rows = estimated_rows
+        self.loaded_at = time.monotonic()
+
+
+    @classmethod
+    def load(cls, cursor: extensions.cursor, name: str, identifier: str) -> "TableMetadata":
+        """
+        Read the metadata of a table.
+
+        Parameters:
+        ----------
+        - cursor: The cursor used to query the catalog.
+        - name: The name of the table, as given to the executor.
+        - identifier: The quoted name of the table.
+
+        Returns:
+        -------
+        returns a TableMetadata instance.
+        """
+        cursor.execute(_COLUMNS, (identifier,))
+        rows = cursor.fetchall()
+        cursor.execute(_INDEXES, (identifier,))
+        indexes = tuple(Index(index, tuple(columns), unique, primary) for index, unique, primary, columns in cursor.fetchall())
+
+        reltuples = rows[0][3] if rows else -1
+        return cls(name, tuple(row[0] for row in rows), tuple(row[1] for row in rows), tuple(row[2] for row in rows),
+                   indexes, None if reltuples < 0 else int(reltuples), tuple(row[4] for row in rows))
+
+
+    def column_types(self, columns: tuple = None, sql: bool = False) -> list:
+        """
+        Return the type names (`pg_type.typname`) of some columns, or of every column in order if None.
+        With `sql`, return the types as they are written in a cast instead (see `type_sql`).
+        """
+        all_types = self.type_sql if sql else self.types
+        if columns is None:
+            return list(all_types)
+        types = dict(zip(self.columns, all_types))
+        try:
+            return [types[column] for column in columns]
+        except KeyError as error:
+            raise ValueError("table %s has no column %s" % (self.name, error.args[0]))
+
+
+    def __repr__(self) -> str:
+        return "TableMetadata(%s, columns=%r, primary_key=%r)" % (self.name, self.columns, self.primary_key)
+
+
+class MetadataCache:
+    """
+    This class caches the TableMetadata of the tables an executor touches, keyed on the database and the table name.
+    An entry is read again from the catalog once it is older than the TTL, or after `invalidate`;
+    SimpleQueryExecutor invalidates it itself when it creates or drops the table.
+
+    One instance is shared by default by all the executors, so that every table is introspected once per process.
+    """
+
+    def __init__(self, ttl: float = 300.0, size: int = 1024) -> None:
+        """
+        Constructor that stores the cache settings.
+
+        Parameters:
+        ----------
+        - ttl: The number of seconds the metadata of a table is used before it is read again.
+        - size: The maximum number of tables kept, the least recently used being evicted.
+        """
+        self.ttl = ttl
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+
+    def get(self, key: tuple, load) -> TableMetadata:
+        """
+        Return the metadata of a table, loading it if it is missing or expired.
+
+        Parameters:
+        ----------
+        - key: The (database, table name) key of the table.
+        - load: A callable returning the TableMetadata of the table.
+        """
+        with self._lock:
+            metadata = self._entries.get(key)
+            if metadata is not None and time.monotonic() - metadata.loaded_at < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return metadata
+            self.misses += 1
+
+        # the catalog is read outside of the lock: two threads may load the same table, the last one wins
+        metadata = load()
+        with self._lock:
+            self._entries[key] = metadata
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+        return metadata
+
+
+    def invalidate(self, table_name: str = None) -> None:
+        """
+        Forget the metadata of a table in every database, or of every table if None.
+        """
+        with self._lock:
+            if table_name is None:
+                self._entries.clear()
+            else:
+                for key in [key for key in self._entries if key[-1] == table_name]:
+                    del self._entries[key]
+
+
+    def stats(self) -> dict:
+        """
+        Return the cache counters.
+        """
+        with self._lock:
+            return {"tables": len(self._entries), "hits": self.hits, "misses": self.misses}
@@ -1,22 +1,102 @@
+import copy
+import itertools
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager, nullcontext
+
+import psycopg2
+import psycopg2.extras
+
+from psycopg2_wrapper.CancelToken import CancelToken
+from psycopg2_wrapper.ColumnBuilder import ColumnBuilder
+from psycopg2_wrapper.ConnectionPool import DEFAULT_MAX_SIZE
 from psycopg2_wrapper.DatabaseConnector import DatabaseConnector
+from psycopg2_wrapper.ExportWriter import ExportWriter
+from psycopg2_wrapper.Instrumentation import Instrumentation
+from psycopg2_wrapper.Listener import Listener
+from psycopg2_wrapper.PreparedStatementCache import PreparedStatementCache
+from psycopg2_wrapper.ResultCache import ResultCache
+from psycopg2_wrapper.RowFactory import RowFactory
+from psycopg2_wrapper.SpilledRows import SpilledRows, rows_size
+
+
+_UNGUARDED = nullcontext()
+# the statements a server-side cursor can run (DECLARE ... CURSOR FOR), after leading comments and parentheses
+_DECLARABLE = re.compile(r"(?:\s+|--[^\n]*|/\*.*?\*/|\()*(SELECT|VALUES|TABLE|WITH)\b", re.IGNORECASE | re.DOTALL)
+# a WITH query whose CTEs write cannot be declared as a cursor
+_WRITING = re.compile(r"\b(?:INSERT|UPDATE|DELETE|MERGE)\b", re.IGNORECASE)
+
+
+def _declarable(sql) -> bool:
+    if not isinstance(sql, str):
+        return True
+    match = _DECLARABLE.match(sql)
+    return match is not None and (match.group(1).upper() != "WITH" or not _WRITING.search(sql))
+
+
+class _Session:
+    """
+    The connection and cursor shared by every statement run through a bound executor.
+    """
+    __slots__ = ("conn", "cursor", "savepoints", "closed", "written")
+
+    def __init__(self, conn: psycopg2.extensions.connection) -> None:
+        self.conn = conn
+        self.cursor = conn.cursor()
+        self.savepoints = 0
+        self.closed = False
+        # tables written in the session, invalidated in the result cache on commit
+        self.written = []
+
 
 class NativeQueryExecutor:
     """
     This class is responsible for executing SQL queries. 
     It takes an instance of DatabaseConnector to establish a database connection.
+
+    An executor can be shared by several threads: every call checks its own connection out of the
+    thread-safe pool, and the caches are protected by locks. Executors bound to a session are the exception.
+
+    The execute and fetch methods take a `timeout` (in seconds), applied to their statements with
+    `SET LOCAL statement_timeout`, and a `cancel` CancelToken that another thread or task can trigger.
+    A statement that times out or is cancelled raises `psycopg2.errors.QueryCanceled`; its connection is rolled
+    back and returned to the pool. Inside a session the previous timeout is restored after the statement,
+    but the error aborts the session transaction like any other.
     """
 
-    def __init__(self, config: dict) -> None:
+    _cursor_ids = itertools.count(1)
+
+    def __init__(self, config: dict, prepared_statements: int = 0, result_cache: ResultCache = None,
+                 instrumentation: Instrumentation = None, row_factory="tuple") -> None:
         """
         Constructor that takes an instance of DatabaseConnector to establish a database connection.
 
         Parameters:
         db_conn (DatabaseConnector): An instance of DatabaseConnector.
+        prepared_statements (int): The number of server-side prepared statements cached per pooled connection.
+            0 (the default) disables the cache, see PreparedStatementCache.
+        result_cache (ResultCache): A cache of the `execute_and_fetchone` / `execute_and_fetchall` results,
+            invalidated by the writes going through the executor. None (the default) disables it.
+        instrumentation (Instrumentation): Collects the timings of the statements run by the executor
+            and logs the slow ones. None (the default) disables it.
+        row_factory (str | RowFactory): The shape of the fetched rows: "tuple" (the default), "dict", "namedtuple",
+            "record" (a generated class with `__slots__`), or a RowFactory. Rows served from the result cache
+            are shared between callers and must not be modified.
         """
         self.conn = DatabaseConnector(db_params=config)
+        self.prepared_statements = PreparedStatementCache(prepared_statements) if prepared_statements else None
+        self.result_cache = result_cache
+        self.instrumentation = instrumentation
+        self.row_factory = self._row_factory(row_factory)
+        self._session = None
+        self._timeout = None
+        self._cancel = None
 
 
-    def execute(self, sql: str, params: tuple = None) -> tuple:
+    def execute(self, sql: str, params: tuple = None, timeout: float = None, cancel: CancelToken = None) -> tuple:
         """
         Execute a SQL query.
         
@@ -24,35 +104,36 @@ class NativeQueryExecutor:
         ----------
         - sql: The SQL query to execute.
         - params: The parameters to pass to the query.
+        - timeout: The statement timeout of the call, in seconds.
+        - cancel: A CancelToken able to cancel the call.
         
         Returns:
         -------
         returns a cursor object and a connection object.
+        The connection is checked out from the pool and should be handed back with `self.conn.close(cursor, conn)`,
+        unless the executor is bound to a session. A connection closed with `conn.close()` or dropped frees its
+        pool slot without being reused.
         """
-        conn = self.conn.connect()
-        cursor = conn.cursor()
-
-        if params is None: cursor.execute(sql)
-        else: cursor.execute(sql, params)
-
-        return cursor, conn
+        return self._limited(timeout, cancel)._start(sql, params)
 
 
-    def execute_and_commit(self, sql: str, params: tuple = None) -> None:
+    def execute_and_commit(self, sql: str, params: tuple = None, timeout: float = None, cancel: CancelToken = None) -> None:
         """
         Execute a SQL query and commit the changes to the database.
+        Inside a session the commit is deferred to the end of the session.
         
         Parameters:
         ----------
         - sql: The SQL query to execute.
         - params: The parameters to pass to the query.
+        - timeout: The statement timeout of the call, in seconds.
+        - cancel: A CancelToken able to cancel the call.
         """
-        cursor, conn = self.execute(sql, params)
-        conn.commit()  
-        self.conn.close(cursor, conn)
+        self._limited(timeout, cancel)._run(sql, params, commit=True)
+        self._written(sql)
         
         
-    def execute_and_fetchone(self, sql: str, params: tuple = None) -> tuple:
+    def execute_and_fetchone(self, sql: str, params: tuple = None, timeout: float = None, cancel: CancelToken = None) -> tuple:
         """
         Execute a SQL query and fetch the first result.
         
@@ -60,19 +141,18 @@ class NativeQueryExecutor:
         ----------
         - sql: The SQL query to execute.
         - params: The parameters to pass to the query.
+        - timeout: The statement timeout of the call, in seconds.
+        - cancel: A CancelToken able to cancel the call.
         
         Returns:
         -------
         returns a tuple with the result.
         """
-        cursor, conn = self.execute(sql, params)
-        result = cursor.fetchone()
-
-        self.conn.close(cursor, conn)        
-        return result
+        return self._limited(timeout, cancel)._fetch("one", sql, params, lambda cursor: cursor.fetchone())
     
     
-    def execute_and_fetchall(self, sql: str, params: tuple = None) -> list:
+    def execute_and_fetchall(self, sql: str, params: tuple = None, max_memory: int = None, timeout: float = None,
+                             cancel: CancelToken = None) -> list:
         """
         Execute a SQL query and fetch all the results.
         
@@ -80,19 +160,22 @@ class NativeQueryExecutor:
         ----------
         - sql: The SQL query to execute.
         - params: The parameters to pass to the query.
+        - max_memory: The approximate number of bytes the rows may take in memory. The rows are then read in chunks
+            through a server-side cursor, and once they exceed the cap they are moved to a temporary file and returned
+            as a SpilledRows sequence, which is never cached. Statements a cursor cannot run (SHOW, INSERT/UPDATE/DELETE
+            with RETURNING, ...) are fetched as usual, without the cap.
+        - timeout: The statement timeout of the call, in seconds.
+        - cancel: A CancelToken able to cancel the call.
         
         Returns:
         -------
-        returns a list with the results.
+        returns a list with the results, or a SpilledRows sequence when they did not fit in `max_memory`.
         """
-        cursor, conn = self.execute(sql, params)
-        result = cursor.fetchall()
-        
-        self.conn.close(cursor, conn)
-        return result
+        return self._limited(timeout, cancel)._fetch("all", sql, params, lambda cursor: cursor.fetchall(), max_memory)
     
     
-    def execute_and_fetchmany(self, sql: str, params: tuple = None, size: int = 2) -> list:
+    def execute_and_fetchmany(self, sql: str, params: tuple = None, size: int = 2, timeout: float = None,
+                              cancel: CancelToken = None) -> list:
         """
         Execute a SQL query and fetch a number of results.
         
@@ -101,31 +184,791 @@ class NativeQueryExecutor:
         - sql: The SQL query to execute.
         - params: The parameters to pass to the query.
         - size: The number of results to fetch.
+        - timeout: The statement timeout of the call, in seconds.
+        - cancel: A CancelToken able to cancel the call.
         
         Returns:
         -------
         returns a list with the results.
         """
-        cursor, conn = self.execute(sql, params)
-        result = cursor.fetchmany(size)
-
-        self.conn.close(cursor, conn)
-        return result
+        return self._limited(timeout, cancel)._fetch(None, sql, params, lambda cursor: cursor.fetchmany(size))
     
     
-    def execute_many_and_commit(self, sql: str, params: list) -> None:
+    def execute_many_and_commit(self, sql: str, params: list, mode: str = "batch", page_size: int = 100,
+                                template: str = None, fetch: bool = False, timeout: float = None,
+                                cancel: CancelToken = None) -> list:
         """
         Execute a SQL query with multiple parameters.
+        Inside a session the commit is deferred to the end of the session.
+        
+        Modes:
+        -------
+        - "executemany": one server round trip per parameter tuple (`cursor.executemany`).
+        - "batch": the statements are sent `page_size` at a time (`psycopg2.extras.execute_batch`).
+        - "values": the parameters are merged into multi-row VALUES lists of `page_size` rows
+            (`psycopg2.extras.execute_values`). The query must contain a single `VALUES %s` placeholder,
+            e.g. "INSERT INTO users (id, name) VALUES %s".
         
         Parameters:
         ----------
         - sql: The SQL query to execute.
-        - params: A list of parameters to pass to the query.
-        """
-        conn = self.conn.connect()
-        cursor = conn.cursor()
+        - params: A list (or any iterable) of parameters to pass to the query.
+        - mode: "executemany", "batch" or "values".
+        - page_size: The number of parameter tuples sent per round trip.
+        - template: The row template of the "values" mode, e.g. "(%s, %s, now())".
+        - fetch: Return the rows produced by a RETURNING clause across all pages ("values" mode only).
+        - timeout: The statement timeout of the call, in seconds.
+        - cancel: A CancelToken able to cancel the call.
         
-        cursor.executemany(sql, params)
-        conn.commit()
-        
-        self.conn.close(cursor, conn)
\ No newline at end of file
+        Returns:
+        -------
+        returns a list with the RETURNING rows if `fetch` is True, None otherwise.
+        """
+        if mode not in ("executemany", "batch", "values"):
+            raise ValueError("mode must be 'executemany', 'batch' or 'values', not %r" % mode)
+        if fetch and mode != "values":
+            raise ValueError("fetch is only supported in 'values' mode")
+
+        def execute(cursor):
+            if mode == "values":
+                return psycopg2.extras.execute_values(cursor, sql, params, template=template,
+                                                      page_size=page_size, fetch=fetch)
+            if mode == "batch":
+                psycopg2.extras.execute_batch(cursor, sql, params, page_size=page_size)
+            else:
+                cursor.executemany(sql, params)
+
+        result = self._limited(timeout, cancel)._run(sql, None, commit=True, execute=execute)
+        self._written(sql)
+        return result
+
+
+    def execute_and_stream(self, sql: str, params: tuple = None, itersize: int = 2000, timeout: float = None,
+                           cancel: CancelToken = None):
+        """
+        Execute a SQL query and yield the results one by one.
+        The rows are read through a server-side (named) cursor, `itersize` rows per round trip,
+        so memory stays constant whatever the size of the result.
+        The connection is checked out when the iteration starts and returned to the pool
+        when the generator is exhausted or closed.
+
+        Example:
+        -------
+        for row in executor.execute_and_stream("SELECT * FROM big_table", itersize=5000):
+            ...
+
+        Parameters:
+        ----------
+        - sql: The SQL query to execute.
+        - params: The parameters to pass to the query.
+        - itersize: The number of rows fetched per round trip.
+        - timeout: The statement timeout of every round trip, in seconds.
+        - cancel: A CancelToken able to cancel the iteration.
+
+        Returns:
+        -------
+        returns a generator of tuples.
+        """
+        factory = self.row_factory
+        for description, rows in self._limited(timeout, cancel)._fetch_chunks(sql, params, itersize):
+            yield from (rows if factory is None else factory.rows(description, rows))
+
+
+    def execute_and_fetch_columns(self, sql: str, params: tuple = None, chunk_size: int = 10000,
+                                  use_numpy: bool = None, timeout: float = None, cancel: CancelToken = None) -> dict:
+        """
+        Execute a SQL query and fetch the results column by column.
+        The rows are read through a server-side cursor `chunk_size` rows at a time and appended to one buffer
+        per column, so the result is never held as row tuples. The type of each array is chosen from the
+        type OID of its column (see ColumnBuilder): int2/int4/int8/oid/float4/float8/bool columns are stored
+        as packed numbers, other columns as objects.
+
+        Example:
+        -------
+        columns = executor.execute_and_fetch_columns("SELECT id, price FROM sales")
+        columns["price"].mean()
+
+        Parameters:
+        ----------
+        - sql: The SQL query to execute.
+        - params: The parameters to pass to the query.
+        - chunk_size: The number of rows fetched per round trip.
+        - use_numpy: Return NumPy arrays. Defaults to True when NumPy is installed;
+            otherwise the columns are `array.array` (numeric columns) and lists.
+        - timeout: The statement timeout of every round trip, in seconds.
+        - cancel: A CancelToken able to cancel the call.
+
+        Returns:
+        -------
+        returns a dict mapping each column name to its values.
+        """
+        builder = None
+        for description, rows in self._limited(timeout, cancel)._fetch_chunks(sql, params, chunk_size):
+            if builder is None:
+                builder = ColumnBuilder(description, use_numpy)
+            builder.append(rows)
+        return builder.columns()
+
+
+    def execute_and_stream_columns(self, sql: str, params: tuple = None, chunk_size: int = 10000,
+                                   use_numpy: bool = None, timeout: float = None, cancel: CancelToken = None):
+        """
+        Execute a SQL query and yield the results as column batches of up to `chunk_size` rows.
+        This is the streaming variant of `execute_and_fetch_columns`: memory stays constant whatever the size
+        of the result. The connection is returned to the pool when the generator is exhausted or closed.
+
+        Parameters:
+        ----------
+        - sql: The SQL query to execute.
+        - params: The parameters to pass to the query.
+        - chunk_size: The number of rows per batch.
+        - use_numpy: Return NumPy arrays, see `execute_and_fetch_columns`.
+        - timeout: The statement timeout of every round trip, in seconds.
+        - cancel: A CancelToken able to cancel the iteration.
+
+        Returns:
+        -------
+        returns a generator of dicts mapping each column name to the values of the batch.
+        """
+        for description, rows in self._limited(timeout, cancel)._fetch_chunks(sql, params, chunk_size):
+            if rows:
+                builder = ColumnBuilder(description, use_numpy)
+                builder.append(rows)
+                yield builder.columns()
+
+
+    def export_query(self, sql: str, params: tuple, dest, format: str = "csv", header: bool = True,
+                     compression: str = None, progress=None, timeout: float = None, cancel: CancelToken = None) -> int:
+        """
+        Export the result of a SQL query with `COPY (...) TO STDOUT`.
+        The server output is streamed straight into the destination, so memory stays constant whatever
+        the size of the result.
+
+        Example:
+        -------
+        executor.export_query("SELECT * FROM orders WHERE day = %s", (day,), "orders.csv.gz", compression="gzip")
+
+        Parameters:
+        ----------
+        - sql: The SQL query to export.
+        - params: The parameters of the query (merged into the statement on the client, COPY takes none).
+        - dest: A path, or a file object such as an open file or a pipe (see ExportWriter).
+        - format: "csv", "text" or "binary".
+        - header: Write the column names on the first line (csv format only).
+        - compression: None, "gzip" or "zstd".
+        - progress: A callable called with the number of bytes and rows written so far (see ExportWriter).
+            Until the last call the row count is read from the line breaks, so it is approximate for csv values
+            containing line breaks, and 0 for the binary format.
+        - timeout: The statement timeout of the call, in seconds.
+        - cancel: A CancelToken able to cancel the call.
+
+        Returns:
+        -------
+        returns the number of exported rows.
+        """
+        return self._limited(timeout, cancel)._export("COPY (%s) TO STDOUT" % sql, params, dest, format, header, compression, progress)
+
+
+    def execute_parallel(self, queries: list, max_workers: int = None, timeout: float = None,
+                         return_exceptions: bool = False) -> list:
+        """
+        Execute independent SQL queries at the same time and fetch all their results.
+        Each query runs on its own pooled connection in a thread pool.
+
+        Example:
+        -------
+        results = executor.execute_parallel([
+            ("SELECT * FROM orders WHERE tenant = %s", (1,)),
+            ("SELECT * FROM orders WHERE tenant = %s", (2,)),
+        ], timeout=5)
+
+        Parameters:
+        ----------
+        - queries: A list of (sql, params) tuples.
+        - max_workers: The number of queries run at the same time. Defaults to the pool max_size.
+        - timeout: The number of seconds allowed for all the queries. When it expires, the queries still
+            running are cancelled on the server (`connection.cancel()`) and those not started are skipped;
+            they fail with `psycopg2.extensions.QueryCanceledError` or `TimeoutError`.
+        - return_exceptions: Return the exception of a failed query in its result slot instead of raising
+            the first one.
+
+        Returns:
+        -------
+        returns a list with the results of each query (lists of tuples), in input order.
+        """
+        queries = list(queries)
+        if not queries:
+            return []
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        expired = threading.Event()
+        running = {}
+        running_lock = threading.Lock()
+
+        def run(index: int, sql: str, params: tuple) -> list:
+            if expired.is_set():
+                raise TimeoutError("execute_parallel deadline expired before the query started")
+
+            event = self._begin(sql, params)
+            conn = cursor = None
+            try:
+                conn = self.conn.acquire(None if deadline is None else max(0.0, deadline - time.monotonic()), readonly=True)
+                cursor = conn.cursor()
+                if event is not None:
+                    event.lap("acquire")
+                with running_lock:
+                    running[index] = conn
+                if expired.is_set():
+                    raise TimeoutError("execute_parallel deadline expired before the query started")
+                self._execute(cursor, sql, params)
+                if event is not None:
+                    event.lap("execute")
+                rows = cursor.fetchall()
+                if self.row_factory is not None:
+                    rows = self.row_factory.rows(cursor.description, rows)
+            except BaseException as error:
+                self._end(event, error=error)
+                raise
+            finally:
+                with running_lock:
+                    running.pop(index, None)
+                if conn is not None:
+                    self.conn.close(cursor, conn)
+            self._end(event, rows)
+            return rows
+
+        if max_workers is None:
+            # read from the settings: the primary pool is not built when every query goes to a replica
+            max_workers = self.conn.pool_params.get("max_size", DEFAULT_MAX_SIZE)
+
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(queries))) as executor:
+            futures = [executor.submit(run, index, sql, params) for index, (sql, params) in enumerate(queries)]
+            _, not_done = wait(futures, timeout=timeout)
+
+            if not_done:
+                expired.set()
+                for future in not_done:
+                    future.cancel()
+                with running_lock:
+                    for conn in running.values():
+                        conn.cancel()
+
+        results = []
+        for future in futures:
+            if future.cancelled():
+                error = TimeoutError("execute_parallel deadline expired before the query started")
+            else:
+                error = future.exception()
+
+            if error is None:
+                results.append(future.result())
+            elif return_exceptions:
+                results.append(error)
+            else:
+                raise error
+        return results
+
+
+    def listen(self, channels, batch_delay: float = 0.0) -> Listener:
+        """
+        Subscribe to notification channels instead of polling a table.
+        The listener holds a dedicated autocommit connection to the primary (outside of the pool), blocks on
+        the connection socket until notifications arrive, and LISTENs again after a reconnection.
+
+        Example:
+        -------
+        with executor.listen(["jobs"]) as listener:
+            for batch in listener:
+                for notification in batch:
+                    print(notification.channel, notification.payload)
+
+        Parameters:
+        ----------
+        - channels: A channel name or a list of channel names.
+        - batch_delay: After a notification arrives, the number of seconds to wait for more before
+            yielding them together.
+
+        Returns:
+        -------
+        returns a Listener, iterating over lists of the notifications received together.
+        """
+        channels = [channels] if isinstance(channels, str) else channels
+        return Listener(self.conn.connect, channels, batch_delay)
+
+
+    def notify(self, channel: str, payload: str = None) -> None:
+        """
+        Send a notification on a channel (`pg_notify`).
+        Inside a session the notification is delivered when the session commits.
+
+        Parameters:
+        ----------
+        - channel: The name of the channel.
+        - payload: An optional string delivered with the notification.
+        """
+        self._run("SELECT pg_notify(%s, %s)", (channel, payload or ""), commit=True)
+
+
+    @contextmanager
+    def session(self, readonly: bool = False):
+        """
+        Run several statements on one connection and in one transaction.
+        The context yields an executor of the same class bound to a single pooled connection and cursor:
+        every method (`execute_and_fetch*`, `execute_and_commit`, `insert_data`, ...) runs on that connection,
+        commits are deferred, and the transaction is committed once on exit or rolled back on error.
+        A bound executor must not be shared between threads.
+        With `readonly`, the session runs on a read replica when some are configured.
+
+        Example:
+        -------
+        with executor.session() as s:
+            s.execute_and_commit("INSERT INTO users (name) VALUES (%s)", ("John",))
+            s.execute_and_commit("INSERT INTO users (name) VALUES (%s)", ("Mary",))
+
+        Returns:
+        -------
+        returns a context manager yielding the bound executor.
+        """
+        if self._session is not None:
+            # already bound: join the enclosing session
+            self._check_session()
+            yield self
+            return
+
+        conn = self.conn.acquire(readonly=readonly)
+        bound = copy.copy(self)
+        bound._session = _Session(conn)
+
+        try:
+            yield bound
+            conn.commit()
+            if self.result_cache is not None:
+                for tables in bound._session.written:
+                    self.result_cache.invalidate(tables)
+        except BaseException:
+            if not conn.closed:
+                conn.rollback()
+            raise
+        finally:
+            bound._session.closed = True
+            self.conn.close(bound._session.cursor, conn)
+
+
+    @contextmanager
+    def transaction(self):
+        """
+        Run a block atomically.
+        On an unbound executor this is the same as `session()`.
+        On an executor bound to a session the block runs inside a savepoint: an error inside the block
+        rolls back the statements of the block only, and the error is propagated.
+
+        Example:
+        -------
+        with executor.transaction() as tx:
+            tx.insert_data("users", {"name": "John"})
+            try:
+                with tx.transaction():
+                    tx.insert_data("users", {"name": None})
+            except psycopg2.IntegrityError:
+                pass  # John is still inserted on exit
+
+        Returns:
+        -------
+        returns a context manager yielding the bound executor.
+        """
+        if self._session is None:
+            with self.session() as bound:
+                yield bound
+            return
+
+        self._check_session()
+        session = self._session
+        session.savepoints += 1
+        name = "psycopg2_wrapper_sp_%d" % session.savepoints
+
+        try:
+            session.cursor.execute("SAVEPOINT " + name)
+            try:
+                yield self
+            except BaseException:
+                if not session.conn.closed:
+                    session.cursor.execute("ROLLBACK TO SAVEPOINT " + name)
+                    session.cursor.execute("RELEASE SAVEPOINT " + name)
+                raise
+            session.cursor.execute("RELEASE SAVEPOINT " + name)
+        finally:
+            session.savepoints -= 1
+
+
+    def _fetch(self, kind: str, sql: str, params: tuple, fetch, max_memory: int = None):
+        # reads inside a session may see uncommitted writes: they neither use nor fill the cache
+        cache = self.result_cache if kind is not None and self._session is None else None
+        tables = None if cache is None else ResultCache.read_tables(sql)
+        if tables is None:
+            cache = None
+        factory = self.row_factory
+        if factory is not None:
+            raw = fetch
+            if kind == "one":
+                fetch = lambda cursor: factory.row(cursor.description, raw(cursor))
+            else:
+                fetch = lambda cursor: factory.rows(cursor.description, raw(cursor))
+
+        if cache is not None:
+            key = ResultCache.key(kind if factory is None else (kind, factory.kind), sql, params)
+            found, result = cache.get(key)
+            if found:
+                return result
+            generation = cache.generation
+
+        if max_memory is not None and _declarable(sql):
+            retries = self.conn.read_retries if self._session is None else 0
+            result = self._retried(lambda: self._fetch_capped(sql, params, max_memory), retries)
+        else:
+            result = self._run(sql, params, fetch, readonly=True)
+
+        if cache is not None and not isinstance(result, SpilledRows):
+            cache.put(key, result, tables, generation)
+        return result
+
+
+    def _export(self, statement: str, params: tuple, dest, format: str, header: bool, compression: str, progress) -> int:
+        if format not in ("csv", "text", "binary"):
+            raise ValueError("format must be 'csv', 'text' or 'binary', not %r" % format)
+
+        options = "FORMAT %s%s" % (format, ", HEADER" if header and format == "csv" else "")
+        writer = ExportWriter(dest, compression, progress, count_rows=format != "binary")
+
+        def copy(cursor):
+            text = statement
+            if params is not None:
+                # the connection encoding is a PostgreSQL name (e.g. WIN1252): map it to the Python codec
+                text = cursor.mogrify(statement, params).decode(psycopg2.extensions.encodings[cursor.connection.encoding])
+            cursor.copy_expert("%s WITH (%s)" % (text, options), writer)
+            return cursor.rowcount
+
+        try:
+            rows = self._run(statement, params, readonly=True, execute=copy)
+        except BaseException:
+            writer.close()
+            raise
+        writer.close(rows)
+        return rows
+
+
+    def _fetch_capped(self, sql: str, params: tuple, max_memory: int, chunk_size: int = 2000):
+        """
+        Fetch all the rows of a query, spilling them to a SpilledRows file past `max_memory` bytes.
+        """
+        rows = []
+        size = 0
+        spilled = None
+        description = None
+        try:
+            for description, chunk in self._fetch_chunks(sql, params, chunk_size):
+                if spilled is not None:
+                    spilled.extend(chunk)
+                    continue
+                rows.extend(chunk)
+                size += rows_size(chunk)
+                if size > max_memory:
+                    spilled = SpilledRows(description, self.row_factory)
+                    spilled.extend(rows)
+                    rows = None
+        except BaseException:
+            if spilled is not None:
+                spilled.close()
+            raise
+
+        if spilled is not None:
+            return spilled.seal()
+        if self.row_factory is not None:
+            return self.row_factory.rows(description, rows)
+        return rows
+
+
+    def _fetch_chunks(self, sql: str, params: tuple, chunk_size: int):
+        """
+        Yield (description, rows) for every chunk of a query read through a server-side cursor.
+        An empty result yields one empty chunk, so that its description is still seen.
+        """
+        event = self._begin(sql, params)
+        try:
+            conn = self._acquire(readonly=True)
+        except BaseException as error:
+            self._end(event, error=error)
+            raise
+        cursor = conn.cursor(name="psycopg2_wrapper_stream_%d" % next(self._cursor_ids))
+        if event is not None:
+            event.lap("acquire")
+
+        try:
+            with self._guard(conn):
+                if self._cancel is not None:
+                    self._cancel.check()
+                if params is None: cursor.execute(sql)
+                else: cursor.execute(sql, params)
+
+                first = True
+                while True:
+                    if self._cancel is not None:
+                        # a cancel request sent while the consumer held the generator found no statement to stop
+                        self._cancel.check()
+                    rows = cursor.fetchmany(chunk_size)
+                    if event is not None:
+                        # the first round trip runs the query, the following ones fetch its rows
+                        event.lap("execute" if first else "fetch")
+                        event.count(rows)
+                    if rows or first:
+                        yield cursor.description, rows
+                        if event is not None:
+                            # the time the consumer held the chunk is not the statement's
+                            event.skip()
+                    if len(rows) < chunk_size:
+                        break
+                    first = False
+        except GeneratorExit:
+            self._end(event)
+            raise
+        except BaseException as error:
+            if isinstance(error, psycopg2.Error):
+                self.conn.record(conn, error=error)
+                if conn.closed:
+                    # the server went away: a fetch that yielded nothing to its caller yet may be retried
+                    error.dead_connection = True
+            self._end(event, error=error)
+            raise
+        else:
+            self._end(event)
+        finally:
+            try:
+                cursor.close()
+            except psycopg2.Error:
+                pass
+            self._release(None, conn)
+
+
+    def _limited(self, timeout: float, cancel: CancelToken):
+        """
+        Return the executor itself, or a copy running its statements with a timeout and a cancel token.
+        """
+        if timeout is None and cancel is None:
+            return self
+        if timeout is not None and timeout <= 0:
+            raise ValueError("timeout must be positive, not %r" % timeout)
+        executor = copy.copy(self)
+        executor._timeout = timeout
+        executor._cancel = cancel
+        return executor
+
+
+    def _guard(self, conn: psycopg2.extensions.connection):
+        if self._timeout is None and self._cancel is None:
+            return _UNGUARDED
+        return self._guarded(conn)
+
+
+    @contextmanager
+    def _guarded(self, conn: psycopg2.extensions.connection):
+        """
+        Apply the timeout and the cancel token of the executor to the statements run in the context.
+        """
+        previous = None
+        if self._timeout is not None:
+            value = "%dms" % max(1, round(self._timeout * 1000))
+            with conn.cursor() as cursor:
+                if self._session is None:
+                    # the transaction ends with the call (commit, or rollback by the pool)
+                    cursor.execute("SET LOCAL statement_timeout = %s", (value,))
+                else:
+                    cursor.execute("SELECT current_setting('statement_timeout'), set_config('statement_timeout', %s, true)",
+                                   (value,))
+                    previous = cursor.fetchone()[0]
+
+        if self._cancel is not None:
+            self._cancel.attach(conn)
+        try:
+            yield
+        finally:
+            if self._cancel is not None:
+                self._cancel.detach(conn)
+            if previous is not None and conn.info.transaction_status == psycopg2.extensions.TRANSACTION_STATUS_INTRANS:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT set_config('statement_timeout', %s, true)", (previous,))
+
+
+    @staticmethod
+    def _row_factory(row_factory) -> RowFactory:
+        # plain tuples need no conversion at all
+        if row_factory is None or isinstance(row_factory, str) and row_factory == "tuple":
+            return None
+        if isinstance(row_factory, RowFactory):
+            return row_factory
+        return RowFactory(row_factory)
+
+
+    def _written(self, sql: str) -> None:
+        self.conn.mark_write()
+        if self.result_cache is None:
+            return
+        tables = ResultCache.write_tables(sql)
+        self.result_cache.invalidate(tables)
+        if self._session is not None:
+            self._session.written.append(tables)
+
+
+    def _run(self, sql: str, params: tuple, fetch=None, readonly: bool = False, commit: bool = False, execute=None):
+        """
+        Run a statement on a checked out connection: execute it (with `execute(cursor)` if given),
+        fetch its result with `fetch(cursor)`, commit if asked, and hand the connection back.
+        The acquire, execute and fetch stages are timed when the executor has an instrumentation.
+
+        A plain read outside of a session is idempotent: when its pooled connection turns out to be dead,
+        it is retried on a new connection up to `read_retries` times, after a jittered exponential backoff.
+        """
+        retries = self.conn.read_retries if readonly and execute is None and self._session is None else 0
+        return self._retried(lambda: self._attempt(sql, params, fetch, readonly, commit, execute), retries)
+
+
+    def _retried(self, call, retries: int):
+        """
+        Call `call()`, calling it again up to `retries` times while it fails because its connection died.
+        """
+        attempt = 0
+        while True:
+            try:
+                return call()
+            except (psycopg2.OperationalError, psycopg2.InterfaceError) as error:
+                if attempt >= retries or not getattr(error, "dead_connection", False):
+                    raise
+            self.conn.retried_reads += 1
+            time.sleep(random.uniform(0, self.conn.retry_backoff * 2 ** attempt))
+            attempt += 1
+
+
+    def _attempt(self, sql: str, params: tuple, fetch, readonly: bool, commit: bool, execute):
+        event = self._begin(sql, params)
+
+        conn = cursor = result = None
+        try:
+            conn = self._acquire(readonly)
+            cursor = self._cursor(conn)
+            if event is not None:
+                event.lap("acquire")
+
+            with self._guard(conn):
+                if execute is None:
+                    started = time.monotonic()
+                    self._execute(cursor, sql, params)
+                    self.conn.record(conn, time.monotonic() - started)
+                else:
+                    if self._cancel is not None:
+                        self._cancel.check()
+                    result = execute(cursor)
+                if event is not None:
+                    event.rows = cursor.rowcount
+                    event.lap("execute")
+
+                if fetch is not None:
+                    result = fetch(cursor)
+            if commit:
+                self._commit(conn)
+        except BaseException as error:
+            if isinstance(error, psycopg2.Error) and conn is not None:
+                self.conn.record(conn, error=error)
+                if conn.closed:
+                    # the server went away: the pool discards the connection, and the statement may be retried
+                    error.dead_connection = True
+            self._end(event, error=error)
+            raise
+        finally:
+            if conn is not None:
+                self._release(cursor, conn)
+
+        self._end(event, result)
+        return result
+
+
+    def _start(self, sql: str, params: tuple, readonly: bool = False) -> tuple:
+        event = self._begin(sql, params)
+        try:
+            conn = self._acquire(readonly)
+        except BaseException as error:
+            self._end(event, error=error)
+            raise
+        cursor = self._cursor(conn)
+        if event is not None:
+            event.lap("acquire")
+
+        try:
+            with self._guard(conn):
+                started = time.monotonic()
+                self._execute(cursor, sql, params)
+                self.conn.record(conn, time.monotonic() - started)
+        except BaseException as error:
+            if isinstance(error, psycopg2.Error):
+                self.conn.record(conn, error=error)
+            self._end(event, error=error)
+            self._release(cursor, conn)
+            raise
+
+        if event is not None:
+            # the rows are fetched by the caller: only the execution is measured
+            event.lap("execute")
+            event.rows = cursor.rowcount
+            self._end(event)
+        return cursor, conn
+
+
+    def _begin(self, sql: str, params: tuple):
+        """
+        Start measuring a statement when the executor has an instrumentation.
+        """
+        return None if self.instrumentation is None else self.instrumentation.begin(sql, params)
+
+
+    def _end(self, event, result=None, error: BaseException = None) -> None:
+        """
+        Record a statement measured with `_begin`, the time since the last lap counting as its fetch stage.
+        """
+        if event is not None:
+            event.lap("fetch")
+            self.instrumentation.end(event, result, error=error)
+
+
+    def _execute(self, cursor: psycopg2.extensions.cursor, sql: str, params: tuple) -> None:
+        if self._cancel is not None:
+            # a cancel sent before the statement reaches the server is ignored by the server
+            self._cancel.check()
+        if self.prepared_statements is not None:
+            self.prepared_statements.execute(cursor, sql, params, self.conn.state(cursor.connection))
+        elif params is None: cursor.execute(sql)
+        else: cursor.execute(sql, params)
+
+
+    def _acquire(self, readonly: bool = False) -> psycopg2.extensions.connection:
+        if self._session is None:
+            return self.conn.acquire(readonly=readonly)
+        self._check_session()
+        return self._session.conn
+
+
+    def _cursor(self, conn: psycopg2.extensions.connection) -> psycopg2.extensions.cursor:
+        if self._session is None:
+            return conn.cursor()
+        return self._session.cursor
+
+
+    def _commit(self, conn: psycopg2.extensions.connection) -> None:
+        if self._session is None:
+            conn.commit()
+
+
+    def _release(self, cursor: psycopg2.extensions.cursor, conn: psycopg2.extensions.connection) -> None:
+        if self._session is None:
+            self.conn.close(cursor, conn)
+
+
+    def _check_session(self) -> None:
+        if self._session.closed:
+            raise psycopg2.InterfaceError("the session is closed")
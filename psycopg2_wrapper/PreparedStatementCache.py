@@ -0,0 +1,255 @@
+import datetime
+import decimal
+import itertools
+import math
+import re
+import threading
+from collections import OrderedDict
+
+import psycopg2
+import psycopg2.errors
+from psycopg2 import extensions
+
+
+_PLACEHOLDER = re.compile(r"%%|%s|%\((\w+)\)s")
+_PREPARABLE = ("select", "insert", "update", "delete", "with", "values")
+
+# the type PostgreSQL gives to the literal psycopg2 renders for a value, checked in order
+# (bool before int, datetime before date); strings and NULL are untyped literals, left to the server to infer
+_PARAMETER_TYPES = (
+    (type(None), lambda value: "unknown"),
+    (str, lambda value: "unknown"),
+    (bool, lambda value: "bool"),
+    (int, lambda value: "int4" if -2**31 <= value < 2**31 else "int8" if -2**63 <= value < 2**63 else "numeric"),
+    (float, lambda value: "numeric" if math.isfinite(value) else "float8"),
+    (decimal.Decimal, lambda value: "numeric"),
+    (datetime.datetime, lambda value: "timestamp" if value.tzinfo is None else "timestamptz"),
+    (datetime.date, lambda value: "date"),
+    (datetime.time, lambda value: "time"),
+    (datetime.timedelta, lambda value: "interval"),
+    ((bytes, bytearray, memoryview), lambda value: "bytea"),
+)
+
+
+class PreparedStatementCache:
+    """
+    This class runs statements through server-side prepared statements.
+    The first time a SQL text is seen on a connection it is PREPAREd under a generated name,
+    and every later execution on that connection goes through EXECUTE, so PostgreSQL skips parsing and planning.
+
+    The parameters are declared with the types their values would have as literals (int4 for 1, bool for True,
+    left unknown for strings and None), so a prepared statement returns what a plain execution would;
+    a SQL text is prepared once per combination of parameter types, and statements with parameters of other
+    Python types (lists, dicts, adapted objects) are executed without preparing.
+
+    Prepared statements live as long as their connection: every pooled connection keeps its own bounded
+    LRU of statements (stored in the pool state, so it is dropped when the connection is recycled),
+    the least recently used statement being DEALLOCATEd when the cache is full.
+    One instance is shared by all the connections of an executor and keeps the hit/miss counters.
+    """
+
+    _statement_ids = itertools.count(1)
+
+    def __init__(self, size: int = 100) -> None:
+        """
+        Constructor that stores the cache size.
+
+        Parameters:
+        ----------
+        - size: The maximum number of prepared statements kept per connection.
+        """
+        if size < 1:
+            raise ValueError("size must be at least 1")
+
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        # (SQL text, parameter types) the server refused to prepare (e.g. a parameter of undeterminable type)
+        self._unpreparable = set()
+
+
+    def execute(self, cursor: extensions.cursor, sql: str, params, state: dict) -> None:
+        """
+        Execute a statement, preparing it on the cursor connection if needed.
+
+        Parameters:
+        ----------
+        - cursor: The cursor used to execute the statement.
+        - sql: The SQL query to execute.
+        - params: The parameters to pass to the query (a sequence, a mapping or None).
+        - state: The pool state of the cursor connection.
+        """
+        if not isinstance(sql, str) or not sql.lstrip()[:6].lower().startswith(_PREPARABLE):
+            self._execute(cursor, sql, params)
+            return
+        types = self._types(params)
+        key = (sql, types)
+        if types is False or key in self._unpreparable:
+            self._execute(cursor, sql, params)
+            return
+
+        statements = state.get("prepared_statements")
+        if statements is None:
+            statements = state["prepared_statements"] = OrderedDict()
+
+        entry = statements.get(key)
+        if entry is not None:
+            statements.move_to_end(key)
+            self._count(hits=1)
+        else:
+            self._count(misses=1)
+            entry = self._prepare(cursor, key, params, state)
+            if entry is None:
+                self._execute(cursor, sql, params)
+                return
+
+        conn = cursor.connection
+        idle = conn.info.transaction_status == extensions.TRANSACTION_STATUS_IDLE
+        try:
+            self._execute_prepared(cursor, entry, params)
+        except psycopg2.errors.FeatureNotSupported:
+            # "cached plan must not change result type": a DDL changed the columns of a table the statement
+            # reads with SELECT * since it was prepared. The statement has to be prepared again; this can be
+            # done at once when the failed EXECUTE was alone in its transaction, otherwise the transaction is
+            # aborted and the error goes to the caller, the next execution preparing the statement again.
+            del statements[key]
+            if not idle:
+                state.setdefault("prepared_stale", []).append(entry[0])
+                raise
+            if not conn.autocommit:
+                conn.rollback()
+            cursor.execute("DEALLOCATE " + entry[0])
+            entry = self._prepare(cursor, key, params, state)
+            if entry is None:
+                self._execute(cursor, sql, params)
+                return
+            self._execute_prepared(cursor, entry, params)
+
+
+    def stats(self) -> dict:
+        """
+        Return the cache counters.
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "size": self.size}
+
+
+    def _prepare(self, cursor: extensions.cursor, key: tuple, params, state: dict):
+        sql, types = key
+        text, names = self._convert(sql, params)
+        statements = state["prepared_statements"]
+        name = "psycopg2_wrapper_ps_%d" % next(self._statement_ids)
+        conn = cursor.connection
+
+        while len(statements) >= self.size:
+            _, (old_name, _) = statements.popitem(last=False)
+            cursor.execute("DEALLOCATE " + old_name)
+            self._count(evictions=1)
+        stale = state.get("prepared_stale")
+        while stale:
+            cursor.execute("DEALLOCATE " + stale.pop())
+
+        if names is not None:
+            types = [self._type(params[name]) for name in names]
+        declared = "(%s)" % ", ".join(types) if types else ""
+
+        # a failed PREPARE aborts the transaction: protect the statements already run in it
+        savepoint = conn.info.transaction_status == extensions.TRANSACTION_STATUS_INTRANS
+        try:
+            if savepoint:
+                cursor.execute("SAVEPOINT psycopg2_wrapper_prepare")
+            cursor.execute("PREPARE %s%s AS %s" % (name, declared, text))
+            if savepoint:
+                cursor.execute("RELEASE SAVEPOINT psycopg2_wrapper_prepare")
+        except psycopg2.ProgrammingError:
+            if savepoint:
+                cursor.execute("ROLLBACK TO SAVEPOINT psycopg2_wrapper_prepare")
+                cursor.execute("RELEASE SAVEPOINT psycopg2_wrapper_prepare")
+            elif not conn.autocommit:
+                conn.rollback()
+            self._unpreparable.add(key)
+            return None
+
+        statements[key] = (name, names)
+        return statements[key]
+
+
+    @staticmethod
+    def _convert(sql: str, params):
+        """
+        Turn the psycopg2 placeholders (%s, %(name)s) into positional $n parameters.
+        Returns the converted text and, for named parameters, the names in parameter order.
+        """
+        if params is None:
+            return sql, None
+
+        names = []
+        positions = {}
+        counter = itertools.count(1)
+
+        def replace(match):
+            if match.group(0) == "%%":
+                return "%"
+            key = match.group(1)
+            if key is None:
+                return "$%d" % next(counter)
+            if key not in positions:
+                names.append(key)
+                positions[key] = len(names)
+            return "$%d" % positions[key]
+
+        text = _PLACEHOLDER.sub(replace, sql)
+        return text, (names if isinstance(params, dict) else None)
+
+
+    @staticmethod
+    def _type(value):
+        for python_type, name in _PARAMETER_TYPES:
+            if isinstance(value, python_type):
+                return name(value)
+        return None
+
+
+    @classmethod
+    def _types(cls, params):
+        """
+        Return the parameter types of a call, the part of the cache key that comes with the SQL text:
+        a tuple of type names, keyed by parameter name for a mapping, or False if a value has no known type.
+        """
+        if params is None:
+            return ()
+        if isinstance(params, dict):
+            types = tuple(sorted((key, cls._type(value)) for key, value in params.items()))
+            return False if any(name is None for _, name in types) else types
+        types = tuple(cls._type(value) for value in params)
+        return False if None in types else types
+
+
+    def _execute_prepared(self, cursor: extensions.cursor, entry: tuple, params) -> None:
+        name, names = entry
+        if names is None:
+            values = params
+            count = 0 if params is None else len(params)
+        else:
+            values = [params[key] for key in names]
+            count = len(names)
+
+        if count:
+            cursor.execute("EXECUTE %s (%s)" % (name, ", ".join(["%s"] * count)), values)
+        else:
+            cursor.execute("EXECUTE " + name)
+
+
+    def _count(self, hits: int = 0, misses: int = 0, evictions: int = 0) -> None:
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+            self.evictions += evictions
+
+
+    @staticmethod
+    def _execute(cursor: extensions.cursor, sql, params) -> None:
+        if params is None: cursor.execute(sql)
+        else: cursor.execute(sql, params)
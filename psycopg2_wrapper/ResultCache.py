@@ -0,0 +1,286 @@
+import functools
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+
+_IDENTIFIER = r'((?:"[^"]+"|\w+)(?:\s*\.\s*(?:"[^"]+"|\w+))?)'
+# comments, string literals, (qualified) names and single characters
+_TOKEN = re.compile(r"--[^\n]*|/\*.*?\*/|'(?:[^']|'')*'|" + _IDENTIFIER[1:-1] + r"|\S", re.DOTALL)
+_NAME = re.compile(_IDENTIFIER + "$")
+# the keywords ending the FROM clause
+_FROM_END = frozenset(("WHERE", "GROUP", "HAVING", "WINDOW", "ORDER", "LIMIT", "OFFSET", "FETCH", "FOR",
+                       "UNION", "INTERSECT", "EXCEPT", "RETURNING"))
+# the second word of a locking clause (FOR UPDATE, FOR NO KEY UPDATE, FOR SHARE, FOR KEY SHARE)
+_LOCKING = frozenset(("UPDATE", "NO", "SHARE", "KEY"))
+# functions and special values returning something else on every call, even when no table changes
+_VOLATILE = frozenset(("NEXTVAL", "SETVAL", "CURRVAL", "LASTVAL", "RANDOM", "GEN_RANDOM_UUID", "UUID_GENERATE_V4",
+                       "CLOCK_TIMESTAMP", "STATEMENT_TIMESTAMP", "TIMEOFDAY", "NOW", "CURRENT_TIMESTAMP",
+                       "CURRENT_TIME", "CURRENT_DATE", "LOCALTIMESTAMP", "LOCALTIME", "TXID_CURRENT"))
+_WRITE_TABLES = re.compile(
+    r"\b(?:INSERT\s+INTO|UPDATE(?:\s+ONLY)?|DELETE\s+FROM(?:\s+ONLY)?|TRUNCATE(?:\s+TABLE)?(?:\s+ONLY)?|COPY"
+    r"|(?:CREATE|ALTER|DROP)(?:\s+UNLOGGED|\s+TEMP(?:ORARY)?)?\s+TABLE(?:\s+IF(?:\s+NOT)?\s+EXISTS)?(?:\s+ONLY)?)\s+"
+    + _IDENTIFIER,
+    re.IGNORECASE
+)
+
+
+def _table_name(identifier: str) -> str:
+    # "public"."Users" -> Users, public.users -> users: the schema is ignored, so invalidation errs on the safe side
+    name = identifier.split(".")[-1].strip()
+    if name.startswith('"'):
+        return name[1:-1]
+    return name.lower()
+
+
+@functools.lru_cache(maxsize=1024)
+def _read_tables(sql: str) -> frozenset:
+    tokens = [token for token in _TOKEN.findall(sql) if not token.startswith(("--", "/*"))]
+    if tokens and tokens[0].upper() == "WITH":
+        # the CTE names hide the tables, and a CTE may write
+        return None
+
+    tables = set()
+    queries = set()     # the parenthesis depths holding a SELECT, where FROM is not a function argument (extract(...))
+    lists = []          # the parenthesis depths of the FROM lists being read
+    depth = 0
+    expect = False      # the next token starts a FROM item
+    pending = None      # a FROM item name, which is a function if an opening parenthesis follows
+    previous = None
+    for token in tokens:
+        upper = token.upper()
+        if upper in _VOLATILE or previous == "FOR" and upper in _LOCKING:
+            # a volatile result, or a locking read whose rows must come from the server
+            return None
+        if expect:
+            expect = False
+            if upper == "ONLY":
+                expect = True
+                continue
+            if upper == "LATERAL" or not _NAME.match(token):
+                # subquery, VALUES list, ...: its FROM items are not enough to know what it reads
+                return None
+            pending = token
+            continue
+        if pending is not None:
+            if token == "(":
+                return None
+            tables.add(_table_name(pending))
+            pending = None
+
+        if token == "(":
+            depth += 1
+        elif token == ")":
+            while lists and lists[-1] == depth:
+                lists.pop()
+            queries.discard(depth)
+            depth -= 1
+        elif upper == "SELECT":
+            queries.add(depth)
+        elif upper in ("FROM", "JOIN") and depth in queries and previous != "DISTINCT":
+            expect = True
+            if not lists or lists[-1] != depth:
+                lists.append(depth)
+        elif token == "," and lists and lists[-1] == depth:
+            expect = True
+        elif upper in _FROM_END and lists and lists[-1] == depth:
+            lists.pop()
+        previous = upper
+
+    if expect:
+        return None
+    if pending is not None:
+        tables.add(_table_name(pending))
+    # a query reading no table is never invalidated by a write
+    return frozenset(tables) or None
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def _sizeof(value) -> int:
+    size = sys.getsizeof(value)
+    if isinstance(value, (list, tuple)):
+        for row in value:
+            size += sys.getsizeof(row)
+            if isinstance(row, tuple):
+                size += sum(sys.getsizeof(item) for item in row)
+    return size
+
+
+class ResultCache:
+    """
+    This class caches query results on the client, keyed on the SQL text and the parameters.
+    Entries expire after a TTL, the least recently used entries are evicted past a memory bound,
+    and every entry reading a table is invalidated when a write against that table goes through an executor
+    using the cache.
+
+    Tables are found by scanning the SQL text: reads through views or functions are not linked to the tables
+    they read, and are only refreshed by the TTL. Queries whose tables cannot be listed from their FROM clauses
+    (CTEs, subqueries or functions in a FROM clause, LATERAL), queries reading no table, locking reads
+    (FOR UPDATE, FOR SHARE, ...) and queries calling well-known volatile functions (nextval, random,
+    clock_timestamp, now, ...) are not cached.
+    """
+
+    def __init__(self, ttl: float = 60.0, max_bytes: int = 64 * 1024 * 1024) -> None:
+        """
+        Constructor that stores the cache settings.
+
+        Parameters:
+        ----------
+        - ttl: The number of seconds an entry is served before it is read again from the database.
+        - max_bytes: The approximate memory bound of the cached results, in bytes.
+        """
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        self._entries = OrderedDict()
+        self._tables = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # bumped by every invalidation, so that a result read before a write is not stored after it
+        self.generation = 0
+
+
+    @staticmethod
+    def key(kind: str, sql: str, params) -> tuple:
+        """
+        Build the cache key of a query.
+
+        Parameters:
+        ----------
+        - kind: The fetch method ("one", "all", ...), so results of different shapes do not collide.
+        - sql: The SQL query.
+        - params: The parameters of the query.
+
+        Returns:
+        -------
+        returns a hashable key.
+        """
+        return kind, sql, _freeze(params)
+
+
+    @staticmethod
+    def read_tables(sql: str) -> frozenset:
+        """
+        Return the names of the tables a query reads from, or None if they cannot be determined.
+        """
+        if not isinstance(sql, str):
+            return None
+        return _read_tables(sql)
+
+
+    @staticmethod
+    def write_tables(sql: str) -> frozenset:
+        """
+        Return the names of the tables a statement writes to, or None if they cannot be determined.
+        """
+        tables = frozenset(_table_name(match) for match in _WRITE_TABLES.findall(sql))
+        return tables or None
+
+
+    def get(self, key: tuple) -> tuple:
+        """
+        Look a result up.
+
+        Parameters:
+        ----------
+        - key: The key built by `key`.
+
+        Returns:
+        -------
+        returns a (found, result) tuple.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return False, None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            result = entry[3]
+
+        return True, (list(result) if isinstance(result, list) else result)
+
+
+    def put(self, key: tuple, result, tables: frozenset, generation: int = None) -> None:
+        """
+        Store a result.
+
+        Parameters:
+        ----------
+        - key: The key built by `key`.
+        - result: The result of the query.
+        - tables: The tables the query reads from.
+        - generation: The value of `generation` read before running the query.
+            The result is not stored if an invalidation happened in between.
+        """
+        size = _sizeof(result)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = (time.monotonic() + self.ttl, size, tables, result)
+            self._bytes += size
+            for table in tables:
+                self._tables.setdefault(table, set()).add(key)
+
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+
+
+    def invalidate(self, tables: frozenset = None) -> None:
+        """
+        Drop the entries reading any of the given tables.
+
+        Parameters:
+        ----------
+        - tables: The names of the written tables. None drops every entry.
+        """
+        with self._lock:
+            self.generation += 1
+            if tables is None:
+                self._entries.clear()
+                self._tables.clear()
+                self._bytes = 0
+                return
+
+            for table in tables:
+                for key in list(self._tables.get(table, ())):
+                    self._remove(key)
+
+
+    def stats(self) -> dict:
+        """
+        Return the cache counters.
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries), "bytes": self._bytes}
+
+
+    def _remove(self, key: tuple) -> None:
+        _, size, tables, _ = self._entries.pop(key)
+        self._bytes -= size
+        for table in tables:
+            keys = self._tables.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tables[table]
@@ -0,0 +1,153 @@
+import itertools
+import keyword
+import threading
+from collections import OrderedDict, namedtuple
+
+
+def _fields(names: tuple) -> tuple:
+    # column names that are not valid attribute names (or are duplicated) are renamed _<position>, like namedtuple(rename=True)
+    fields = []
+    seen = set()
+    for index, name in enumerate(names):
+        if not name.isidentifier() or keyword.iskeyword(name) or name.startswith("_") or name in seen:
+            name = "_%d" % index
+        seen.add(name)
+        fields.append(name)
+    return tuple(fields)
+
+
+def _record_class(fields: tuple) -> type:
+    """
+    Generate a class with one slot per column: a record takes about as much memory as a tuple,
+    but its values are read as attributes.
+    """
+    arguments = ", ".join(fields)
+    body = "\n".join("    self.%s = %s" % (field, field) for field in fields) or "    pass"
+    namespace = {}
+    exec("def __init__(self, %s):\n%s" % (arguments, body), namespace)
+
+    def __iter__(self):
+        return (getattr(self, field) for field in fields)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return tuple(self)[index]
+        return getattr(self, fields[index])
+
+    def __eq__(self, other):
+        if isinstance(other, (tuple, type(self))):
+            return tuple(self) == tuple(other)
+        return NotImplemented
+
+    def __repr__(self):
+        return "Record(%s)" % ", ".join("%s=%r" % (field, getattr(self, field)) for field in fields)
+
+    return type("Record", (), {
+        "__slots__": fields,
+        "__init__": namespace["__init__"],
+        "__iter__": __iter__,
+        "__getitem__": __getitem__,
+        "__len__": lambda self: len(fields),
+        "__eq__": __eq__,
+        "__hash__": lambda self: hash(tuple(self)),
+        "__repr__": __repr__,
+        "_fields": fields,
+        "_asdict": lambda self: dict(zip(fields, self)),
+    })
+
+
+def _tuple(names: tuple):
+    return lambda rows: rows
+
+
+def _dict(names: tuple):
+    return lambda rows: [dict(zip(names, row)) for row in rows]
+
+
+def _namedtuple(names: tuple):
+    cls = namedtuple("Row", names, rename=True)
+    return lambda rows: list(itertools.starmap(cls, rows))
+
+
+def _record(names: tuple):
+    cls = _record_class(_fields(names))
+    return lambda rows: list(itertools.starmap(cls, rows))
+
+
+class RowFactory:
+    """
+    This class turns the row tuples returned by psycopg2 into rows of another shape:
+    "tuple" (unchanged), "dict", "namedtuple" or "record" (a generated class with `__slots__`).
+    A custom kind is a callable taking the tuple of column names and returning the row constructor,
+    which is called with the values of each row as positional arguments.
+
+    The row class of each distinct list of columns is built once and kept in a bounded cache
+    shared by all the factories of the same kind.
+    """
+
+    KINDS = {"tuple": _tuple, "dict": _dict, "namedtuple": _namedtuple, "record": _record}
+
+    cache_size = 256
+    _converters = OrderedDict()
+    _converters_lock = threading.Lock()
+
+    def __init__(self, kind="tuple") -> None:
+        """
+        Constructor that stores the kind of rows to build.
+
+        Parameters:
+        ----------
+        - kind: "tuple", "dict", "namedtuple", "record", or a callable (see the class documentation).
+        """
+        if callable(kind):
+            build = kind
+            self._build = lambda names: (lambda rows: list(itertools.starmap(build(names), rows)))
+        elif kind in self.KINDS:
+            self._build = self.KINDS[kind]
+        else:
+            raise ValueError("row_factory must be one of %s or a callable, not %r" % (", ".join(self.KINDS), kind))
+        self.kind = kind
+
+
+    def rows(self, description, rows: list) -> list:
+        """
+        Convert a list of rows.
+
+        Parameters:
+        ----------
+        - description: The `cursor.description` of the rows.
+        - rows: The row tuples.
+
+        Returns:
+        -------
+        returns a list of rows of the factory kind.
+        """
+        if not rows or description is None:
+            return rows
+        return self._converter(description)(rows)
+
+
+    def row(self, description, row: tuple):
+        """
+        Convert a single row (None is returned unchanged).
+        """
+        if row is None or description is None:
+            return row
+        return self._converter(description)([row])[0]
+
+
+    def _converter(self, description):
+        key = (self.kind, tuple(column.name for column in description))
+        cls = RowFactory
+        with cls._converters_lock:
+            converter = cls._converters.get(key)
+            if converter is not None:
+                cls._converters.move_to_end(key)
+                return converter
+
+        converter = self._build(key[1])
+        with cls._converters_lock:
+            cls._converters[key] = converter
+            while len(cls._converters) > self.cache_size:
+                cls._converters.popitem(last=False)
+        return converter
@@ -1,21 +1,88 @@
+import base64
+import copy
+import itertools
+import json
+import os
+import shutil
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import psycopg2
+import psycopg2.extras
+from psycopg2 import sql
+
+from psycopg2_wrapper.CancelToken import CancelToken
+from psycopg2_wrapper.CopyStream import CopyStream
+from psycopg2_wrapper.ExportWriter import ExportWriter
+from psycopg2_wrapper.MetadataCache import MetadataCache, TableMetadata
 from psycopg2_wrapper.NativeQueryExecutor import NativeQueryExecutor
 from psycopg2_wrapper.DatabaseConnector import DatabaseConnector
 
 
+def _render(composable: sql.Composable) -> str:
+    """
+    Render a statement without a connection: the identifiers are quoted the way libpq's PQescapeIdentifier
+    quotes them (double quotes, embedded double quotes doubled). Literals need the connection encoding
+    and are not supported.
+    """
+    if isinstance(composable, sql.Composed):
+        return "".join([_render(part) for part in composable.seq])
+    if isinstance(composable, sql.Identifier):
+        return ".".join(['"%s"' % string.replace('"', '""') for string in composable.strings])
+    if isinstance(composable, sql.SQL):
+        return composable.string
+    if isinstance(composable, sql.Placeholder):
+        return "%s" if composable.name is None else "%%(%s)s" % composable.name
+    raise TypeError("cannot render %r without a connection" % (composable,))
+
+
+class Page(list):
+    """
+    A page of rows returned by `select_pages`.
+    `token` is an opaque string from which `select_pages(..., resume=token)` continues after this page.
+    """
+
+    def __init__(self, rows: list, token: str) -> None:
+        super().__init__(rows)
+        self.token = token
+
+
 class SimpleQueryExecutor(NativeQueryExecutor):
     """
     This class is responsible for executing SQL queries.
     It extends the NativeQueryExecutor class to execute simple SQL queries.
+
+    The statements are composed with `psycopg2.sql`, so table and column names are quoted identifiers
+    (and therefore case-sensitive), and the rendered SQL text is memoized per statement shape
+    (table, columns, where clause) in a bounded cache shared by all instances.
+
+    The columns, primary key and indexes of the tables are read from the catalog once and kept in a MetadataCache,
+    also shared by all instances by default: `select_pages` pages on the primary key unless told otherwise,
+    and binary COPY picks its encoders from the column types. Call `refresh_metadata` after altering a table
+    outside of `create_table` / `drop_table`.
     """
-    
-    def __init__(self, config: dict) -> None:
+
+    statement_cache_size = 512
+    _statements = {}
+    _statements_lock = threading.Lock()
+    metadata_cache = MetadataCache()
+
+    def __init__(self, config: dict, metadata_cache: MetadataCache = None, **kwargs) -> None:
         """
         Constructor that stores the DatabaseConnector instance.
+        The keyword arguments are passed to NativeQueryExecutor.
+
+        Parameters:
+        ----------
+        - config: The database parameters, see DatabaseConnector.
+        - metadata_cache: The cache of the table metadata. Defaults to the cache shared by all the executors.
         """
-        super().__init__(config)
+        super().__init__(config, **kwargs)
+        if metadata_cache is not None:
+            self.metadata_cache = metadata_cache
 
 
-    def create_table(self, table_name: str, columns: dict) -> None:
+    def create_table(self, table_name: str, columns: dict, timeout: float = None, cancel: CancelToken = None) -> None:
         """
         Create a new table in the database.
 
@@ -23,12 +90,21 @@ class SimpleQueryExecutor(NativeQueryExecutor):
         ----------
         - table_name: The name of the table to create.
         - columns: A dictionary containing the names and data types of the columns.
+        - timeout: The statement timeout of the call, in seconds.
+        - cancel: A CancelToken able to cancel the call.
         """
-        sql = f"CREATE TABLE {table_name} ({','.join([f'{col_name} {data_type}' for col_name, data_type in columns.items()])})"
-        self.execute_and_commit(sql)
+        statement = self._sql(("create", table_name, tuple(columns.items())), lambda: sql.SQL("CREATE TABLE {} ({})").format(
+            self._identifier(table_name),
+            sql.SQL(",").join(sql.SQL("{} {}").format(sql.Identifier(col_name), sql.SQL(data_type))
+                              for col_name, data_type in columns.items())
+        ))
+        self.execute_and_commit(statement, timeout=timeout, cancel=cancel)
+        self.metadata_cache.invalidate(table_name)
 
 
-    def select_data(self, table_name: str, columns: list = None, where: str = None) -> list:
+    def select_data(self, table_name: str, columns: list = None, where: str = None,
+                    stream: bool = False, itersize: int = 2000, row_factory=None, max_memory: int = None,
+                    timeout: float = None, cancel: CancelToken = None) -> list:
         """
         Select data from a table in the database.
 
@@ -37,21 +113,228 @@ class SimpleQueryExecutor(NativeQueryExecutor):
         - table_name: The name of the table to select from.
         - columns: A list of column names to select.
         - where: A WHERE clause to filter the results.
+        - stream: Yield the rows through a server-side cursor instead of loading them all in memory.
+        - itersize: The number of rows fetched per round trip when streaming.
+        - row_factory: The shape of the rows ("tuple", "dict", "namedtuple", "record" or a RowFactory).
+            Defaults to the row factory of the executor.
+        - max_memory: The approximate number of bytes the rows may take in memory before they are spilled
+            to a temporary file, see `execute_and_fetchall`.
+        - timeout: The statement timeout of the call, in seconds.
+        - cancel: A CancelToken able to cancel the call.
 
         Returns:
         -------
-        returns a list of tuples containing the selected data.
+        returns a list of rows containing the selected data (or a SpilledRows sequence past `max_memory`),
+        or a generator of rows if `stream` is True (see `execute_and_stream`).
         """
-        col_names = '*' if columns is None else ','.join(columns)
-        sql = f"SELECT {col_names} FROM {table_name}"
-        
-        if where is not None:
-            sql += f" WHERE {where}"
-        
-        return self.execute_and_fetchall(sql)
+        columns = self._columns(table_name, columns)
+        statement = self._sql(("select", table_name, columns, where), lambda: self._select(table_name, columns, where))
+
+        executor = self._limited(timeout, cancel)
+        if row_factory is not None:
+            executor = copy.copy(executor)
+            executor.row_factory = self._row_factory(row_factory)
+
+        if stream:
+            return executor.execute_and_stream(statement, itersize=itersize)
+        return executor.execute_and_fetchall(statement, max_memory=max_memory)
     
     
-    def insert_data(self, table_name: str, data: dict) -> None:
+    def select_pages(self, table_name: str, columns: list = None, key=None, page_size: int = 1000, where: str = None,
+                     descending: bool = False, resume: str = None, row_factory=None, timeout: float = None,
+                     cancel: CancelToken = None):
+        """
+        Select data from a table page by page, with keyset (seek) pagination: every page is read with
+        `WHERE key > <last key of the previous page> ORDER BY key LIMIT page_size`, so with an index on the key
+        the first page and the hundred thousandth take the same time, unlike OFFSET.
+        Every page runs in its own short transaction on the same pooled connection, which is checked out when
+        the iteration starts and returned when the generator is exhausted or closed.
+
+        Example:
+        -------
+        for page in executor.select_pages('events', ['id', 'payload'], key=('day', 'id'), page_size=5000):
+            process(page)
+            save(page.token)  # select_pages(..., resume=token) continues after this page
+
+        Parameters:
+        ----------
+        - table_name: The name of the table to select from.
+        - columns: A list of column names to select. All the columns if None.
+        - key: The column name, or the tuple of column names, the pages are ordered by. It must be unique
+            (add the primary key to a non-unique key) and should be indexed. Defaults to the primary key.
+        - page_size: The maximum number of rows per page.
+        - where: A WHERE clause to filter the results.
+        - descending: Page from the highest key to the lowest.
+        - resume: The `token` of a page returned by a previous iteration, to continue after it.
+        - row_factory: The shape of the rows, see `select_data`.
+        - timeout: The statement timeout of every page, in seconds.
+        - cancel: A CancelToken able to cancel the iteration.
+
+        Returns:
+        -------
+        returns a generator of pages (lists of rows with a `token` attribute).
+        """
+        if key is None:
+            key = self._metadata(table_name).primary_key
+            if not key:
+                raise ValueError("table %s has no primary key, the key must be given" % table_name)
+        keys = (key,) if isinstance(key, str) else tuple(key)
+        columns = self._columns(table_name, columns)
+        # key columns that are not selected are read too, to know where the next page starts, and cut off
+        extra = () if columns is None else tuple(column for column in keys if column not in columns)
+        selected = None if columns is None else columns + extra
+        shape = ("pages", table_name, selected, keys, where, descending)
+        first = self._sql(shape + (False,), lambda: self._page(table_name, selected, keys, where, descending, False))
+        following = self._sql(shape + (True,), lambda: self._page(table_name, selected, keys, where, descending, True))
+        factory = self.row_factory if row_factory is None else self._row_factory(row_factory)
+        last = None if resume is None else self._decode_token(resume, keys)
+        executor = self._limited(timeout, cancel)
+
+        conn = self._acquire(readonly=True)
+        cursor = self._cursor(conn)
+        try:
+            positions = None
+            while True:
+                statement, params = (first, (page_size,)) if last is None else (following, tuple(last) + (page_size,))
+                event = self._begin(statement, params)
+                try:
+                    with executor._guard(conn):
+                        executor._execute(cursor, statement, params)
+                        if event is not None:
+                            event.lap("execute")
+                        rows = cursor.fetchall()
+                    self._commit(conn)
+                except BaseException as error:
+                    self._end(event, error=error)
+                    raise
+                self._end(event, rows)
+                description = cursor.description
+                if not rows:
+                    break
+
+                if positions is None:
+                    names = [column.name for column in description]
+                    positions = [names.index(column) for column in keys]
+                last = [rows[-1][position] for position in positions]
+                count = len(rows)
+
+                if extra:
+                    description = description[:len(columns)]
+                    rows = [row[:len(columns)] for row in rows]
+                if factory is not None:
+                    rows = factory.rows(description, rows)
+                yield Page(rows, self._encode_token(last, keys))
+
+                if count < page_size:
+                    break
+        finally:
+            self._release(cursor, conn)
+
+
+    def parallel_scan(self, table_name: str, key: str, partitions: int = None, fn=None, workers: int = None,
+                      columns: list = None, where: str = None, output: str = None, format: str = "csv",
+                      header: bool = True, compression: str = None, ordered: bool = True, itersize: int = 10000):
+        """
+        Scan a table in parallel: the key range is split into `partitions` slices, and every slice is read on its
+        own connection in a pool of `workers` processes, either through a user function or into a file.
+        All the slices read the same snapshot of the table (`pg_export_snapshot`), so the scan is consistent
+        even while the table is written to.
+
+        The key range is split evenly between the minimum and the maximum for integer keys, and at the
+        quantiles of a sample of the table (sized from the `pg_class` row estimate) for other keys.
+        The key should be indexed.
+
+        Example:
+        -------
+        def count_errors(rows):  # a module-level function, so that it can be sent to the worker processes
+            return sum(1 for row in rows if row[1] == 'error')
+
+        total = sum(executor.parallel_scan('events', 'id', partitions=16, fn=count_errors, columns=['id', 'level']))
+        executor.parallel_scan('events', 'id', partitions=16, output='events.csv.gz', compression='gzip')
+
+        Parameters:
+        ----------
+        - table_name: The name of the table to scan.
+        - key: The column the table is split on.
+        - partitions: The number of slices. Defaults to `workers`.
+        - fn: A picklable function called in a worker process with an iterator over the rows (tuples) of a slice.
+            Its return value must be picklable too.
+        - workers: The number of processes. Defaults to the number of CPUs.
+        - columns: A list of column names to read. All the columns if None.
+        - where: A WHERE clause to filter the rows.
+        - output: Instead of `fn`, the path the rows are exported to (see `export_query`). A path containing
+            "{partition}" gets one file per slice; otherwise the slices are written to temporary part files and
+            merged into `output` (csv and text formats only).
+        - format, header, compression: The export options, see `export_query`.
+        - ordered: Return the results of `fn`, and merge the output, in key order. Otherwise in completion order,
+            which lets the merge start as soon as any slice is done.
+        - itersize: The number of rows fetched per round trip by `fn` slices.
+
+        Returns:
+        -------
+        returns the list of the results of `fn`, or the number of exported rows.
+        """
+        if (fn is None) == (output is None):
+            raise ValueError("parallel_scan needs either fn or output")
+        workers = workers or os.cpu_count()
+        partitions = partitions or workers
+        output = None if output is None else str(output)
+        merge = output is not None and "{partition}" not in output
+        if merge and format == "binary":
+            raise ValueError("binary exports cannot be merged, use a path containing {partition}")
+
+        columns = self._columns(table_name, columns)
+        conn = self.conn.acquire()
+        cursor = conn.cursor()
+        try:
+            # the exporting transaction stays open until every slice has imported the snapshot
+            cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+            cursor.execute("SELECT pg_export_snapshot()")
+            snapshot = cursor.fetchone()[0]
+
+            bounds = self._split(cursor, table_name, key, where, partitions)
+            slices = [self._slice(table_name, columns, key, where, low, high, ordered).as_string(conn)
+                      for low, high in zip([None] + bounds, bounds + [None])]
+            params = [tuple(bound for bound in (low, high) if bound is not None)
+                      for low, high in zip([None] + bounds, bounds + [None])]
+
+            names = None
+            if merge and header and format == "csv":
+                cursor.execute(self._select(table_name, columns, None) + sql.SQL(" LIMIT 0"))
+                names = [column.name for column in cursor.description]
+
+            if output is None:
+                paths = [None] * len(slices)
+            elif merge:
+                paths = ["%s.part%d" % (output, index) for index in range(len(slices))]
+            else:
+                paths = [output.format(partition=index) for index in range(len(slices))]
+
+            config = {**self.conn.primary_params(), "pool": {"min_size": 1, "max_size": 1}}
+            with ProcessPoolExecutor(max_workers=min(workers, len(slices))) as pool:
+                futures = {
+                    pool.submit(SimpleQueryExecutor._scan_slice, config, snapshot, statement, slice_params, fn, path,
+                                format, header and not merge, compression, itersize): index
+                    for index, (statement, slice_params, path) in enumerate(zip(slices, params, paths))
+                }
+                try:
+                    results = self._gather(futures, ordered, output if merge else None, paths, names, compression)
+                    return results if output is None else sum(results)
+                except BaseException:
+                    for future in futures:
+                        future.cancel()
+                    raise
+                finally:
+                    if merge:
+                        for path in paths:
+                            if os.path.exists(path):
+                                os.remove(path)
+        finally:
+            conn.rollback()
+            self.conn.close(cursor, conn)
+
+
+    def insert_data(self, table_name: str, data: dict, timeout: float = None, cancel: CancelToken = None) -> None:
         """
         Insert data into a table in the database.
 
@@ -59,18 +342,570 @@ class SimpleQueryExecutor(NativeQueryExecutor):
         ----------
         - table_name: The name of the table to insert into.
         - data: A dictionary containing the column names and values to insert.
+        - timeout: The statement timeout of the call, in seconds.
+        - cancel: A CancelToken able to cancel the call.
         """
-        sql = f"INSERT INTO {table_name} ({','.join(data.keys())}) VALUES ({','.join(['%s' for _ in range(len(data))])})"
-        self.execute_and_commit(sql, tuple(data.values()))
+        columns = tuple(data.keys())
+        statement = self._sql(("insert", table_name, columns), lambda: sql.SQL("INSERT INTO {} ({}) VALUES ({})").format(
+            self._identifier(table_name),
+            sql.SQL(",").join(map(sql.Identifier, columns)),
+            sql.SQL(",").join(sql.Placeholder() * len(columns))
+        ))
+        self.execute_and_commit(statement, tuple(data.values()), timeout=timeout, cancel=cancel)
         
 
-    def drop_table(self, table_name: str) -> None:
+    def insert_rows(self, table_name: str, columns: list, rows, format: str = "text", timeout: float = None,
+                    cancel: CancelToken = None) -> int:
+        """
+        Insert many rows into a table in the database with `COPY ... FROM STDIN`.
+        The rows are encoded and sent incrementally, so `rows` can be a generator and is never materialized.
+
+        Parameters:
+        ----------
+        - table_name: The name of the table to insert into.
+        - columns: A list of column names. If None, the keys of the first row are used for dict rows,
+            and every column of the table in order for tuple rows.
+        - rows: An iterable of tuples (values in the order of `columns`) or dictionaries (column name to value).
+        - format: "text", "binary" or "auto". The binary format is faster for numeric-heavy tables,
+            but every value must match the type of its column exactly. "auto" picks binary when every column
+            has a binary encoder (see the table metadata), and text otherwise.
+        - timeout: The statement timeout of the call, in seconds.
+        - cancel: A CancelToken able to cancel the call.
+
+        Returns:
+        -------
+        returns the number of inserted rows.
+        """
+        if format not in ("text", "binary", "auto"):
+            raise ValueError("format must be 'text', 'binary' or 'auto', not %r" % format)
+
+        columns, rows = self._rows(rows, columns)
+        if rows is None:
+            return 0
+        if format == "auto":
+            format = "binary" if CopyStream.binary_supported(self._metadata(table_name).column_types(columns)) else "text"
+
+        statement = self._sql(("copy", table_name, columns, format), lambda: sql.SQL("COPY {}{} FROM STDIN{}").format(
+            self._identifier(table_name),
+            sql.SQL("") if columns is None else sql.SQL(" ({})").format(sql.SQL(",").join(map(sql.Identifier, columns))),
+            sql.SQL(" WITH (FORMAT binary)" if format == "binary" else "")
+        ))
+
+        def copy(cursor):
+            encoding = psycopg2.extensions.encodings[cursor.connection.encoding]
+            if format == "binary":
+                stream = CopyStream.binary(rows, self._column_types(cursor, table_name, columns), encoding)
+            else:
+                stream = CopyStream.text(rows, encoding)
+
+            cursor.copy_expert(statement, stream, size=65536)
+            return stream.rows
+
+        count = self._limited(timeout, cancel)._run(statement, None, commit=True, execute=copy)
+        self._written(statement)
+
+        return count
+
+
+    def export_table(self, table_name: str, columns: list = None, where: str = None, dest=None, format: str = "csv",
+                     header: bool = True, compression: str = None, progress=None, timeout: float = None,
+                     cancel: CancelToken = None) -> int:
+        """
+        Export a table with `COPY ... TO STDOUT`, streaming the rows straight into a file or a pipe
+        (see `export_query` for the options).
+
+        Parameters:
+        ----------
+        - table_name: The name of the table to export.
+        - columns: A list of column names to export. All the columns if None.
+        - where: A WHERE clause to filter the exported rows.
+        - dest: A path, or a file object such as an open file or a pipe.
+        - format: "csv", "text" or "binary".
+        - header: Write the column names on the first line (csv format only).
+        - compression: None, "gzip" or "zstd".
+        - progress: A callable called with the number of bytes and rows written so far.
+        - timeout: The statement timeout of the call, in seconds.
+        - cancel: A CancelToken able to cancel the call.
+
+        Returns:
+        -------
+        returns the number of exported rows.
+        """
+        if dest is None:
+            raise TypeError("export_table() needs a dest")
+
+        columns = None if columns is None else tuple(columns)
+        if where is None:
+            # a plain table COPY skips the query executor
+            statement = self._sql(("export", table_name, columns), lambda: sql.SQL("COPY {}{} TO STDOUT").format(
+                self._identifier(table_name),
+                sql.SQL("") if columns is None else sql.SQL(" ({})").format(sql.SQL(",").join(map(sql.Identifier, columns)))
+            ))
+        else:
+            statement = self._sql(("export", table_name, columns, where), lambda: sql.SQL("COPY ({}) TO STDOUT").format(
+                self._select(table_name, columns, where)
+            ))
+        return self._limited(timeout, cancel)._export(statement, None, dest, format, header, compression, progress)
+
+
+    def upsert_rows(self, table_name: str, rows, conflict_columns: list, update_columns: list = None,
+                    columns: list = None, chunk_size: int = 1000, copy_threshold: int = 10000, timeout: float = None,
+                    cancel: CancelToken = None) -> int:
+        """
+        Insert rows into a table, updating the rows that already exist, with set-based
+        `INSERT ... ON CONFLICT (...) DO UPDATE` statements.
+        The rows are sent as multi-row VALUES lists of `chunk_size` rows; batches of more than `copy_threshold`
+        rows are copied into a temporary table and merged with a single statement. Everything runs in one
+        transaction (or in a savepoint of the enclosing session). A batch must not contain the same
+        conflict key twice.
+
+        Parameters:
+        ----------
+        - table_name: The name of the table.
+        - rows: An iterable of dictionaries (column name to value) or of tuples in the order of `columns`.
+        - conflict_columns: The columns of the unique constraint identifying a row.
+        - update_columns: The columns updated on a conflict. Defaults to every column but the conflict columns;
+            an empty list leaves the existing rows untouched (`DO NOTHING`).
+        - columns: The column names of tuple rows. Defaults to the keys of the first row for dict rows.
+        - chunk_size: The number of rows per statement.
+        - copy_threshold: The number of rows above which the batch goes through a temporary table.
+        - timeout: The statement timeout of the call, in seconds.
+        - cancel: A CancelToken able to cancel the call.
+
+        Returns:
+        -------
+        returns the number of inserted or updated rows.
+        """
+        columns, rows = self._rows(rows, columns)
+        if rows is None:
+            return 0
+        conflict = tuple(conflict_columns)
+        update = tuple(column for column in columns if column not in conflict) if update_columns is None else tuple(update_columns)
+
+        def build(source):
+            statement = sql.SQL("INSERT INTO {} ({}) {} ON CONFLICT ({}) ").format(
+                self._identifier(table_name), sql.SQL(",").join(map(sql.Identifier, columns)), source,
+                sql.SQL(",").join(map(sql.Identifier, conflict)))
+            if not update:
+                return statement + sql.SQL("DO NOTHING")
+            return statement + sql.SQL("DO UPDATE SET ") + sql.SQL(",").join(
+                sql.SQL("{0} = EXCLUDED.{0}").format(sql.Identifier(column)) for column in update)
+
+        return self._bulk(table_name, columns, rows, ("upsert", table_name, columns, conflict, update), build,
+                          chunk_size, copy_threshold, timeout, cancel, subquery=False)
+
+
+    def update_rows(self, table_name: str, rows, key_columns: list, columns: list = None,
+                    chunk_size: int = 1000, copy_threshold: int = 10000, timeout: float = None,
+                    cancel: CancelToken = None) -> int:
+        """
+        Update many rows of a table with set-based `UPDATE ... FROM (VALUES ...)` statements
+        (chunked and run in one transaction, see `upsert_rows`).
+
+        Parameters:
+        ----------
+        - table_name: The name of the table.
+        - rows: An iterable of dictionaries or of tuples in the order of `columns`, holding the key columns
+            and the new values of the other columns.
+        - key_columns: The columns identifying the row to update.
+        - columns: The column names of tuple rows. Defaults to the keys of the first row for dict rows.
+        - chunk_size: The number of rows per statement.
+        - copy_threshold: The number of rows above which the batch goes through a temporary table.
+        - timeout: The statement timeout of the call, in seconds.
+        - cancel: A CancelToken able to cancel the call.
+
+        Returns:
+        -------
+        returns the number of updated rows.
+        """
+        columns, rows = self._rows(rows, columns)
+        if rows is None:
+            return 0
+        keys = tuple(key_columns)
+        update = tuple(column for column in columns if column not in keys)
+        if not update:
+            raise ValueError("update_rows needs at least one column besides the key columns")
+
+        def build(source):
+            return sql.SQL("UPDATE {} AS t SET {} FROM {} AS v ({}) WHERE {}").format(
+                self._identifier(table_name),
+                sql.SQL(",").join(sql.SQL("{0} = v.{0}").format(sql.Identifier(column)) for column in update),
+                source, sql.SQL(",").join(map(sql.Identifier, columns)), self._join(keys))
+
+        return self._bulk(table_name, columns, rows, ("update", table_name, columns, keys), build, chunk_size, copy_threshold,
+                          timeout, cancel)
+
+
+    def delete_rows(self, table_name: str, keys, key_columns="id", chunk_size: int = 1000,
+                    copy_threshold: int = 10000, timeout: float = None, cancel: CancelToken = None) -> int:
+        """
+        Delete many rows of a table with set-based `DELETE ... USING (VALUES ...)` statements
+        (chunked and run in one transaction, see `upsert_rows`).
+
+        Parameters:
+        ----------
+        - table_name: The name of the table.
+        - keys: An iterable of keys: single values for a one-column key, tuples in the order of `key_columns`,
+            or dictionaries.
+        - key_columns: The column name, or the list of column names, identifying the rows to delete.
+            Ignored for dict keys.
+        - chunk_size: The number of keys per statement.
+        - copy_threshold: The number of keys above which the batch goes through a temporary table.
+        - timeout: The statement timeout of the call, in seconds.
+        - cancel: A CancelToken able to cancel the call.
+
+        Returns:
+        -------
+        returns the number of deleted rows.
+        """
+        columns = (key_columns,) if isinstance(key_columns, str) else tuple(key_columns)
+        keys = iter(keys)
+        first = next(keys, None)
+        if first is None:
+            return 0
+        keys = itertools.chain((first,), keys)
+        if not isinstance(first, (tuple, list, dict)):
+            keys = ((key,) for key in keys)
+        columns, rows = self._rows(keys, None if isinstance(first, dict) else columns)
+
+        def build(source):
+            return sql.SQL("DELETE FROM {} AS t USING {} AS v ({}) WHERE {}").format(
+                self._identifier(table_name), source, sql.SQL(",").join(map(sql.Identifier, columns)), self._join(columns))
+
+        return self._bulk(table_name, columns, rows, ("delete", table_name, columns), build, chunk_size, copy_threshold,
+                          timeout, cancel)
+
+
+    def drop_table(self, table_name: str, timeout: float = None, cancel: CancelToken = None) -> None:
         """
         Drop a table from the database.
 
         Parameters:
         ----------
         - table_name: The name of the table to drop.
+        - timeout: The statement timeout of the call, in seconds.
+        - cancel: A CancelToken able to cancel the call.
+        """
+        statement = self._sql(("drop", table_name), lambda: sql.SQL("DROP TABLE IF EXISTS {}").format(self._identifier(table_name)))
+        self.execute_and_commit(statement, timeout=timeout, cancel=cancel)
+        self.metadata_cache.invalidate(table_name)
+
+
+    def table_metadata(self, table_name: str, refresh: bool = False) -> TableMetadata:
+        """
+        Return the metadata of a table: its columns, their types and OIDs, its primary key, its indexes
+        and its estimated number of rows.
+        It is read from the catalog on first use and then served from the metadata cache until the TTL expires.
+
+        Parameters:
+        ----------
+        - table_name: The name of the table.
+        - refresh: Read the metadata again from the catalog.
+
+        Returns:
+        -------
+        returns a TableMetadata instance.
+        """
+        if refresh:
+            self.refresh_metadata(table_name)
+        return self._metadata(table_name)
+
+
+    def refresh_metadata(self, table_name: str = None) -> None:
+        """
+        Forget the cached metadata of a table (of every table if None), after it was altered.
+        """
+        self.metadata_cache.invalidate(table_name)
+
+
+    def _sql(self, shape: tuple, build) -> str:
+        """
+        Return the SQL text of a statement shape, composing and rendering it on the first call only.
+        A hit is a single dictionary lookup, without lock: when the cache is full, the oldest shapes are dropped.
+
+        Parameters:
+        ----------
+        - shape: A hashable description of the statement (kind, table, columns, ...).
+        - build: A callable returning the `psycopg2.sql.Composable` of the statement.
+        """
+        cls = SimpleQueryExecutor
+        text = cls._statements.get(shape)
+        if text is not None:
+            return text
+
+        text = _render(build())
+        with cls._statements_lock:
+            cls._statements[shape] = text
+            while len(cls._statements) > self.statement_cache_size:
+                del cls._statements[next(iter(cls._statements))]
+        return text
+
+
+    @staticmethod
+    def _rows(rows, columns: list) -> tuple:
+        """
+        Return the column names and an iterator of value lists for dict or tuple rows,
+        or (columns, None) when there are no rows.
         """
-        sql = f"DROP TABLE IF EXISTS {table_name}"
-        self.execute_and_commit(sql)
+        rows = iter(rows)
+        first = next(rows, None)
+        if first is None:
+            return columns, None
+        if columns is None and isinstance(first, dict):
+            columns = list(first.keys())
+        if isinstance(first, dict):
+            rows = ([row[column] for column in columns] for row in itertools.chain((first,), rows))
+        else:
+            rows = itertools.chain((first,), rows)
+        return (None if columns is None else tuple(columns)), rows
+
+
+    def _bulk(self, table_name: str, columns: tuple, rows, shape: tuple, build, chunk_size: int, copy_threshold: int,
+              timeout: float = None, cancel: CancelToken = None, subquery: bool = True) -> int:
+        """
+        Run a set-based statement over rows, in one transaction.
+        `build(source)` returns the statement reading the rows from `source`: a VALUES list, or a SELECT of the
+        temporary table the rows are copied into when there are more than `copy_threshold` of them.
+        """
+        if columns is None:
+            raise ValueError("the column names of tuple rows must be given")
+
+        head = list(itertools.islice(rows, copy_threshold + 1))
+        temporary = sql.Identifier("psycopg2_wrapper_bulk")
+        if len(head) <= copy_threshold:
+            source = sql.SQL("VALUES %s")
+            statement = self._sql(shape + ("values",), lambda: build(sql.SQL("({})").format(source) if subquery else source))
+
+            def run(cursor):
+                # the VALUES literals are cast to the column types, or a join on them would compare them as text;
+                # format_type renders the type names as SQL (quoted, schema-qualified outside the search_path)
+                types = self._metadata(table_name, cursor).column_types(columns, sql=True)
+                template = "(%s)" % ",".join("%%s::%s" % name.replace("%", "%%") for name in types)
+                count = 0
+                for start in range(0, len(head), chunk_size):
+                    chunk = head[start:start + chunk_size]
+                    psycopg2.extras.execute_values(cursor, statement, chunk, template=template, page_size=len(chunk))
+                    count += cursor.rowcount
+                return count
+        else:
+            source = sql.SQL("SELECT {} FROM {}").format(sql.SQL(",").join(map(sql.Identifier, columns)), temporary)
+            statement = self._sql(shape + ("copy",), lambda: build(sql.SQL("({})").format(source) if subquery else source))
+            create, copy, analyze, drop = (self._sql(("bulk", table_name, columns, step), make) for step, make in (
+                ("create", lambda: sql.SQL("CREATE TEMPORARY TABLE {} ON COMMIT DROP AS SELECT {} FROM {} WITH NO DATA").format(
+                    temporary, sql.SQL(",").join(map(sql.Identifier, columns)), self._identifier(table_name))),
+                ("copy", lambda: sql.SQL("COPY {} FROM STDIN").format(temporary)),
+                ("analyze", lambda: sql.SQL("ANALYZE {}").format(temporary)),
+                ("drop", lambda: sql.SQL("DROP TABLE {}").format(temporary)),
+            ))
+
+            def run(cursor):
+                cursor.execute(create)
+                encoding = psycopg2.extensions.encodings[cursor.connection.encoding]
+                cursor.copy_expert(copy, CopyStream.text(itertools.chain(head, rows), encoding), size=65536)
+                cursor.execute(analyze)
+                cursor.execute(statement)
+                count = cursor.rowcount
+                cursor.execute(drop)
+                return count
+
+        with self.transaction() as tx:
+            count = tx._limited(timeout, cancel)._run(statement, None, execute=run)
+            tx._written(statement)
+        return count
+
+
+    @staticmethod
+    def _join(keys: tuple) -> sql.Composed:
+        return sql.SQL(" AND ").join(sql.SQL("t.{0} = v.{0}").format(sql.Identifier(key)) for key in keys)
+
+
+    @staticmethod
+    def _identifier(name: str) -> sql.Identifier:
+        # "schema.table" is quoted as "schema"."table"
+        return sql.Identifier(*name.split("."))
+
+
+    def _select(self, table_name: str, columns: tuple, where: str) -> sql.Composed:
+        statement = sql.SQL("SELECT {} FROM {}").format(
+            sql.SQL("*") if columns is None else sql.SQL(",").join(map(sql.Identifier, columns)),
+            self._identifier(table_name)
+        )
+        if where is not None:
+            statement += sql.SQL(" WHERE ") + sql.SQL(where)
+        return statement
+
+
+    def _page(self, table_name: str, columns: tuple, keys: tuple, where: str, descending: bool, after: bool) -> sql.Composed:
+        statement = sql.SQL("SELECT {} FROM {}").format(
+            sql.SQL("*") if columns is None else sql.SQL(",").join(map(sql.Identifier, columns)),
+            self._identifier(table_name)
+        )
+        conditions = []
+        if where is not None:
+            # the statement takes parameters: a literal % of the clause must be doubled
+            conditions.append(sql.SQL("({})").format(sql.SQL(where.replace("%", "%%"))))
+        if after:
+            key = sql.SQL(",").join(map(sql.Identifier, keys))
+            conditions.append(sql.SQL("({}) {} ({})").format(
+                key, sql.SQL("<" if descending else ">"), sql.SQL(",").join(sql.Placeholder() * len(keys))))
+        if conditions:
+            statement += sql.SQL(" WHERE ") + sql.SQL(" AND ").join(conditions)
+
+        order = sql.SQL(" DESC" if descending else "")
+        statement += sql.SQL(" ORDER BY {} LIMIT %s").format(sql.SQL(",").join(sql.Identifier(column) + order for column in keys))
+        return statement
+
+
+    @staticmethod
+    def _encode_token(values: list, keys: tuple) -> str:
+        # values that are not JSON types (dates, decimals, uuids) are stored as their text form,
+        # which PostgreSQL casts back to the type of the key column
+        text = json.dumps({"key": list(keys), "after": values}, default=str, separators=(",", ":"))
+        return base64.urlsafe_b64encode(text.encode()).decode()
+
+
+    @staticmethod
+    def _decode_token(token: str, keys: tuple) -> list:
+        try:
+            data = json.loads(base64.urlsafe_b64decode(token.encode()))
+            values = data["after"]
+            token_keys = tuple(data["key"])
+        except (ValueError, KeyError, TypeError):
+            raise ValueError("invalid select_pages token")
+        if token_keys != keys or len(values) != len(keys):
+            raise ValueError("the select_pages token was made for the key %r, not %r" % (token_keys, keys))
+        return values
+
+
+    def _split(self, cursor, table_name: str, key: str, where: str, partitions: int) -> list:
+        """
+        Return the boundaries splitting the key range of a table into `partitions` slices.
+        """
+        if partitions <= 1:
+            return []
+        condition = sql.SQL("") if where is None else sql.SQL(" WHERE ") + sql.SQL(where.replace("%", "%%"))
+
+        cursor.execute(sql.SQL("SELECT min({0}), max({0}) FROM {1}").format(
+            sql.Identifier(key), self._identifier(table_name)) + condition, ())
+        low, high = cursor.fetchone()
+        if low is None:
+            return []
+        if isinstance(low, int):
+            step = (high - low + 1) / partitions
+            return sorted(set(low + int(step * index) for index in range(1, partitions)) - {low})
+
+        # other types: the quantiles of a sample of about 100000 rows
+        cursor.execute("SELECT reltuples FROM pg_class WHERE oid = %s::regclass",
+                       (self._identifier(table_name).as_string(cursor),))
+        percent = min(100.0, 100.0 * 100000 / max(cursor.fetchone()[0], 1.0))
+        cursor.execute(sql.SQL("SELECT percentile_disc(%s) WITHIN GROUP (ORDER BY {}) FROM {} TABLESAMPLE SYSTEM (%s)").format(
+            sql.Identifier(key), self._identifier(table_name)) + condition,
+            ([index / partitions for index in range(1, partitions)], percent))
+        bounds = cursor.fetchone()[0] or []
+        return sorted(set(bound for bound in bounds if bound is not None and bound > low))
+
+
+    def _slice(self, table_name: str, columns: tuple, key: str, where: str, low, high, ordered: bool) -> sql.Composed:
+        statement = self._select(table_name, columns, None)
+        conditions = []
+        if where is not None:
+            conditions.append(sql.SQL("({})").format(sql.SQL(where.replace("%", "%%"))))
+        if low is not None and high is None:
+            # the last slice also gets the NULL keys, which sort last
+            conditions.append(sql.SQL("({0} >= %s OR {0} IS NULL)").format(sql.Identifier(key)))
+        elif low is not None:
+            conditions.append(sql.SQL("{} >= %s").format(sql.Identifier(key)))
+        if high is not None:
+            conditions.append(sql.SQL("{} < %s").format(sql.Identifier(key)))
+        if conditions:
+            statement += sql.SQL(" WHERE ") + sql.SQL(" AND ").join(conditions)
+        if ordered:
+            statement += sql.SQL(" ORDER BY {}").format(sql.Identifier(key))
+        return statement
+
+
+    @staticmethod
+    def _scan_slice(config: dict, snapshot: str, statement: str, params: tuple, fn, path: str, format: str,
+                    header: bool, compression: str, itersize: int):
+        """
+        Read one slice of `parallel_scan`, in a worker process.
+        """
+        executor = SimpleQueryExecutor(config)
+        try:
+            with executor.session() as session:
+                session.execute_and_commit("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY")
+                session.execute_and_commit("SET TRANSACTION SNAPSHOT %s", (snapshot,))
+                if fn is None:
+                    return session.export_query(statement, params, path, format, header, compression)
+                return fn(session.execute_and_stream(statement, params, itersize))
+        finally:
+            executor.conn.close_pool()
+
+
+    @staticmethod
+    def _gather(futures: dict, ordered: bool, output: str, paths: list, names: list, compression: str):
+        """
+        Collect the results of the `parallel_scan` slices, merging the part files into `output` if given.
+        """
+        results = [None] * len(futures)
+        done = [False] * len(futures)
+        completed = []
+        merged = 0
+        target = None
+        try:
+            if output is not None:
+                target = open(output, "wb")
+                if names is not None:
+                    writer = ExportWriter(target, compression)
+                    writer.write((",".join('"%s"' % name.replace('"', '""') for name in names) + "\n").encode())
+                    writer.close()
+
+            for future in as_completed(futures):
+                index = futures[future]
+                results[index] = future.result()
+                done[index] = True
+                completed.append(index)
+                if target is None:
+                    continue
+                # ordered: append the parts as soon as all the previous ones are merged, otherwise in completion order;
+                # concatenated gzip members and zstd frames are still one valid stream
+                ready = completed[merged:] if not ordered else []
+                while ordered and merged < len(done) and done[merged]:
+                    ready.append(merged)
+                    merged += 1
+                if not ordered:
+                    merged = len(completed)
+                for part in ready:
+                    with open(paths[part], "rb") as file:
+                        shutil.copyfileobj(file, target, 1024 * 1024)
+                    os.remove(paths[part])
+        finally:
+            if target is not None:
+                target.close()
+
+        return results if ordered else [results[index] for index in completed]
+
+
+    def _metadata(self, table_name: str, cursor=None) -> TableMetadata:
+        """
+        Return the cached metadata of a table, reading the catalog with `cursor` (or on a pooled connection) if needed.
+        """
+        params = self.conn.db_params
+        identifier = self._sql(("identifier", table_name), lambda: self._identifier(table_name))
+        if cursor is not None:
+            load = lambda: TableMetadata.load(cursor, table_name, identifier)
+        else:
+            load = lambda: self._run("table metadata", None, execute=lambda cursor: TableMetadata.load(cursor, table_name, identifier))
+        return self.metadata_cache.get((params["host"], params["port"], params["database"], table_name), load)
+
+
+    @staticmethod
+    def _columns(table_name: str, columns: list) -> tuple:
+        # None stays SELECT *: a list read from the metadata cache would go stale when the table is altered
+        if columns is None:
+            return None
+        return tuple(columns)
+
+
+    def _column_types(self, cursor, table_name: str, columns: tuple) -> list:
+        return self._metadata(table_name, cursor).column_types(columns)
@@ -0,0 +1,148 @@
+import mmap
+import pickle
+import struct
+import sys
+import tempfile
+import weakref
+from collections.abc import Sequence
+
+
+_OFFSET = struct.Struct("q")
+
+
+def _close(*files) -> None:
+    for file in files:
+        file.close()
+
+
+def rows_size(rows: list) -> int:
+    """
+    Return the approximate memory used by a list of row tuples, in bytes.
+    """
+    size = sys.getsizeof(rows)
+    for row in rows:
+        size += sys.getsizeof(row)
+        for value in row:
+            size += sys.getsizeof(value)
+    return size
+
+
+class SpilledRows(Sequence):
+    """
+    This class is a read-only sequence of rows stored in a temporary file instead of in memory.
+    Every row is pickled after the previous one in a data file, and its start offset is stored in an index file;
+    both files are memory-mapped once written, so `len()` is free, `rows[i]` reads a single row, and the pages
+    of the mapping can be dropped by the kernel at any time: the memory used does not grow with the result.
+
+    The files are deleted when the object is closed or garbage collected.
+    """
+
+    def __init__(self, description=None, row_factory=None, directory: str = None) -> None:
+        """
+        Constructor that creates the temporary files.
+        Rows are added with `extend` until `seal` maps the files for reading.
+
+        Parameters:
+        ----------
+        - description: The `cursor.description` of the rows, passed to the row factory.
+        - row_factory: The RowFactory applied to every row read, or None for tuples.
+        - directory: The directory of the temporary files. Defaults to the system temporary directory.
+        """
+        self.description = description
+        self.row_factory = row_factory
+        self._data = tempfile.TemporaryFile(dir=directory)
+        self._index = tempfile.TemporaryFile(dir=directory)
+        self._finalizer = weakref.finalize(self, _close, self._data, self._index)
+        self._size = 0
+        self._length = 0
+        self._rows = self._offsets = None
+
+
+    def extend(self, rows: list) -> None:
+        """
+        Append rows (tuples) to the files.
+        """
+        if self._rows is not None:
+            raise RuntimeError("the rows are sealed")
+        dumps = pickle.dumps
+        offsets = bytearray()
+        data = []
+        for row in rows:
+            offsets += _OFFSET.pack(self._size)
+            item = dumps(row, pickle.HIGHEST_PROTOCOL)
+            data.append(item)
+            self._size += len(item)
+        self._data.write(b"".join(data))
+        self._index.write(offsets)
+        self._length += len(rows)
+
+
+    def seal(self) -> "SpilledRows":
+        """
+        Finish writing and map the files for reading.
+        """
+        if self._rows is None:
+            self._data.flush()
+            self._index.flush()
+            if not self._length:
+                # an empty file cannot be mapped
+                self._rows = self._offsets = b""
+                return self
+            self._rows = mmap.mmap(self._data.fileno(), 0, access=mmap.ACCESS_READ)
+            self._offsets = mmap.mmap(self._index.fileno(), 0, access=mmap.ACCESS_READ)
+            self._finalizer.detach()
+            self._finalizer = weakref.finalize(self, _close, self._rows, self._offsets, self._data, self._index)
+        return self
+
+
+    def __len__(self) -> int:
+        return self._length
+
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[position] for position in range(*index.indices(self._length))]
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("row index out of range")
+        if self._rows is None:
+            raise RuntimeError("the rows are not sealed")
+
+        start = _OFFSET.unpack_from(self._offsets, index * _OFFSET.size)[0]
+        end = _OFFSET.unpack_from(self._offsets, (index + 1) * _OFFSET.size)[0] if index + 1 < self._length else self._size
+        row = pickle.loads(self._rows[start:end])
+        if self.row_factory is not None:
+            return self.row_factory.row(self.description, row)
+        return row
+
+
+    def __iter__(self):
+        for index in range(self._length):
+            yield self[index]
+
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (list, tuple, SpilledRows)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+
+    def __repr__(self) -> str:
+        return "SpilledRows(%d rows, %d bytes)" % (self._length, self._size)
+
+
+    def close(self) -> None:
+        """
+        Delete the temporary files. The rows cannot be read anymore.
+        """
+        self._finalizer()
+        self._length = 0
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
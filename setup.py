@@ -14,6 +14,7 @@ setup(
     author_email='idrissbenguezzou@gmail.com',
     packages=find_packages(),
     install_requires=install_requires,
+    extras_require={"numpy": ["numpy"]},
     long_description=long_description,
     long_description_content_type="text/markdown",
     classifiers=[
@@ -0,0 +1,79 @@
+# conftest.py
+
+import pytest
+
+from psycopg2_wrapper.NativeQueryExecutor import NativeQueryExecutor
+from psycopg2_wrapper.SimpleQueryExecutor import SimpleQueryExecutor
+
+from . import DATABASE_PARAMS
+
+
+@pytest.fixture
+def db_params():
+    """
+    Fixture to provide database parameters for tests.
+    Returns:
+        dict: A dictionary containing the database connection parameters.
+    """
+    return DATABASE_PARAMS
+
+@pytest.fixture
+def native_query_executor(db_params):
+    """
+    Fixture to create a NativeQueryExecutor, whose pool is closed after the test.
+
+    Returns:
+        NativeQueryExecutor: An instance of the query executor.
+    """
+    executor = NativeQueryExecutor(db_params)
+    yield executor
+    executor.conn.close_pool()
+
+@pytest.fixture
+def executor_options():
+    """
+    Fixture to provide the keyword arguments of the executor built by `simple_query_executor`.
+    Test modules override it to enable a cache, an instrumentation or a row factory.
+
+    Returns:
+        dict: The keyword arguments passed to SimpleQueryExecutor.
+    """
+    return {}
+
+@pytest.fixture
+def table_columns():
+    """
+    Fixture to provide the columns of the `test_table` created by `simple_query_executor`.
+
+    Returns:
+        dict: A dictionary containing the names and data types of the columns.
+    """
+    return {'id': 'SERIAL PRIMARY KEY', 'name': 'VARCHAR(100)'}
+
+@pytest.fixture
+def table_rows():
+    """
+    Fixture to provide the rows inserted into `test_table` by `simple_query_executor`.
+
+    Returns:
+        list: Dictionaries mapping column names to values.
+    """
+    return []
+
+@pytest.fixture
+def simple_query_executor(db_params, executor_options, table_columns, table_rows):
+    """
+    Fixture to create a SimpleQueryExecutor and a populated `test_table`.
+    The table is dropped and the pool closed after the test.
+
+    Returns:
+        SimpleQueryExecutor: An instance of the query executor.
+    """
+    executor = SimpleQueryExecutor(db_params, **executor_options)
+    executor.create_table('test_table', table_columns)
+    try:
+        executor.insert_rows('test_table', None, table_rows)
+        yield executor
+    finally:
+        executor.drop_table('test_table')
+        executor.conn.close_pool()
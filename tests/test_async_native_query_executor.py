@@ -0,0 +1,146 @@
+# test_async_native_query_executor.py
+
+import asyncio
+
+from psycopg2 import OperationalError, ProgrammingError
+from psycopg2_wrapper.AsyncNativeQueryExecutor import AsyncNativeQueryExecutor
+from psycopg2_wrapper.CircuitBreaker import CircuitOpen
+import pytest
+
+
+def run(executor, coroutine):
+    """
+    Run a coroutine to completion and close the executor pool on the same event loop.
+
+    Args:
+        executor (AsyncNativeQueryExecutor): The executor used by the coroutine.
+        coroutine: The coroutine to run.
+    """
+    async def main():
+        try:
+            return await coroutine
+        finally:
+            await executor.close()
+    return asyncio.run(main())
+
+def test_async_execute_and_fetch(db_params):
+    """
+    Test the asynchronous fetch methods.
+    Ensures that they return the same results as their synchronous counterparts.
+
+    Args:
+        db_params (dict): Database parameters fixture.
+    """
+    executor = AsyncNativeQueryExecutor(db_params)
+
+    async def scenario():
+        one = await executor.execute_and_fetchone("SELECT %s", (1,))
+        many = await executor.execute_and_fetchmany("SELECT 1 UNION SELECT 2 UNION SELECT 3 ORDER BY 1", size=2)
+        everything = await executor.execute_and_fetchall("SELECT 1 UNION SELECT 2 ORDER BY 1")
+        return one, many, everything
+
+    assert run(executor, scenario()) == ((1,), [(1,), (2,)], [(1,), (2,)])
+
+def test_async_execute_and_commit(db_params):
+    """
+    Test the asynchronous write methods.
+    Ensures that `execute_many_and_commit` inserts every row.
+
+    Args:
+        db_params (dict): Database parameters fixture.
+    """
+    executor = AsyncNativeQueryExecutor(db_params)
+
+    async def scenario():
+        await executor.execute_and_commit("CREATE TABLE IF NOT EXISTS test_table (id INT)")
+        await executor.execute_many_and_commit("INSERT INTO test_table (id) VALUES (%s)", [(1,), (2,), (3,)])
+        await executor.execute_many_and_commit("INSERT INTO test_table (id) VALUES (%s)", ((i,) for i in range(4, 9)), page_size=2)
+        result = await executor.execute_and_fetchall("SELECT * FROM test_table ORDER BY id")
+        await executor.execute_and_commit("DROP TABLE IF EXISTS test_table")
+        return result
+
+    assert run(executor, scenario()) == [(i,) for i in range(1, 9)]
+
+def test_async_concurrent_queries(db_params):
+    """
+    Test that concurrent queries run at the same time on a small pool.
+    Ten queries sleeping 0.2 second on 5 connections must take well under 2 seconds.
+
+    Args:
+        db_params (dict): Database parameters fixture.
+    """
+    executor = AsyncNativeQueryExecutor({**db_params, "pool": {"min_size": 1, "max_size": 5}})
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        results = await asyncio.gather(*(executor.execute_and_fetchone("SELECT %s, pg_sleep(0.2)", (i,)) for i in range(10)))
+        return [row[0] for row in results], loop.time() - start, executor._pool.stats()
+
+    ids, elapsed, stats = run(executor, scenario())
+    assert ids == list(range(10))
+    assert elapsed < 1.5
+    assert stats["size"] == 5 and stats["in_use"] == 0
+
+def test_async_invalid_sql(db_params):
+    """
+    Test that a failing query raises and leaves the pool usable.
+
+    Args:
+        db_params (dict): Database parameters fixture.
+    """
+    executor = AsyncNativeQueryExecutor({**db_params, "pool": {"min_size": 1, "max_size": 1}})
+
+    async def scenario():
+        with pytest.raises(ProgrammingError):
+            await executor.execute_and_fetchone("SELCT 1")
+        return await executor.execute_and_fetchone("SELECT 1")
+
+    assert run(executor, scenario()) == (1,)
+
+def test_async_execute_and_stream(db_params):
+    """
+    Test streaming a result through a server-side cursor, and closing the stream early.
+
+    Args:
+        db_params (dict): Database parameters fixture.
+    """
+    executor = AsyncNativeQueryExecutor({**db_params, "pool": {"min_size": 1, "max_size": 1}})
+
+    async def scenario():
+        rows = [row async for row in executor.execute_and_stream("SELECT generate_series(1, %s)", (25,), itersize=10)]
+
+        stream = executor.execute_and_stream("SELECT generate_series(1, 100)", itersize=10)
+        first = await stream.__anext__()
+        await stream.aclose()
+
+        after = await executor.execute_and_fetchone("SELECT 1")
+        return rows, first, after
+
+    rows, first, after = run(executor, scenario())
+    assert rows == [(i,) for i in range(1, 26)]
+    assert first == (1,)
+    assert after == (1,)
+
+def test_async_connect_settings(db_params):
+    """
+    Test that the asynchronous connections get the statement timeout and the circuit breaker of the configuration.
+
+    Args:
+        db_params (dict): Database parameters fixture.
+    """
+    executor = AsyncNativeQueryExecutor({**db_params, 'statement_timeout': 2})
+    assert run(executor, executor.execute_and_fetchone("SHOW statement_timeout")) == ('2s',)
+
+    executor = AsyncNativeQueryExecutor({**db_params, 'port': '1', 'connect_timeout': 1,
+                                         'circuit_breaker': {'failure_threshold': 2, 'reset_timeout': 60}})
+
+    async def scenario():
+        for _ in range(2):
+            with pytest.raises(OperationalError):
+                await executor.connect()
+        with pytest.raises(CircuitOpen):
+            await executor.connect()
+
+    asyncio.run(scenario())
+    assert executor.conn.breaker_stats()['primary']['state'] == 'open'
@@ -0,0 +1,146 @@
+# test_buffered_writer.py
+
+import queue
+import threading
+import time
+
+from psycopg2_wrapper.BufferedWriter import BufferedWriter
+import pytest
+
+
+@pytest.fixture
+def table_columns():
+    """
+    Fixture to provide the columns of the test table, keyed on the written ids.
+
+    Returns:
+        dict: A dictionary containing the names and data types of the columns.
+    """
+    return {'id': 'INT PRIMARY KEY', 'name': 'TEXT'}
+
+@pytest.mark.parametrize('method', ['copy', 'values'])
+def test_writes_from_many_threads(simple_query_executor, method):
+    """
+    Test that the rows written by several threads are inserted in a few batches, and all flushed on close.
+
+    Args:
+        simple_query_executor (SimpleQueryExecutor): Fixture to create a SimpleQueryExecutor.
+        method (str): The insertion method of the writer.
+    """
+    writer = BufferedWriter(simple_query_executor, 'test_table', ['id', 'name'], max_rows=500, max_delay_ms=1000, method=method)
+
+    def produce(offset):
+        for i in range(offset, offset + 1000):
+            writer.write({'id': i, 'name': 'n%d' % i} if i % 2 else (i, 'n%d' % i))
+
+    threads = [threading.Thread(target=produce, args=(offset,)) for offset in range(0, 4000, 1000)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    writer.close()
+
+    assert simple_query_executor.execute_and_fetchone("SELECT count(*), count(DISTINCT id) FROM test_table") == (4000, 4000)
+    assert writer.stats()['rows_written'] == 4000 and writer.stats()['batches'] <= 12
+    with pytest.raises(RuntimeError):
+        writer.write((1, 'closed'))
+
+def test_delay_flush_and_errors(simple_query_executor):
+    """
+    Test the max_delay_ms flush, the explicit flush and the error callback.
+
+    Args:
+        simple_query_executor (SimpleQueryExecutor): Fixture to create a SimpleQueryExecutor.
+    """
+    failed = []
+    with BufferedWriter(simple_query_executor, 'test_table', ['id', 'name'], max_delay_ms=50,
+                        on_error=lambda error, rows: failed.append(rows)) as writer:
+        writer.write((1, 'a'))
+        time.sleep(0.3)
+        assert simple_query_executor.execute_and_fetchone("SELECT count(*) FROM test_table") == (1,)
+
+        writer.write((1, 'duplicate'))
+        writer.write((2, 'b'))
+        assert writer.flush(timeout=5)
+        assert failed == [[(1, 'duplicate'), (2, 'b')]]
+
+        writer.write((3, 'c'))
+    assert simple_query_executor.execute_and_fetchall("SELECT id FROM test_table ORDER BY id") == [(1,), (3,)]
+
+    with pytest.raises(RuntimeError):
+        writer.write((4, 'd'))
+    with pytest.raises(RuntimeError):
+        writer.flush()
+
+def test_backpressure(simple_query_executor):
+    """
+    Test that a write blocks when the queue is full.
+
+    Args:
+        simple_query_executor (SimpleQueryExecutor): Fixture to create a SimpleQueryExecutor.
+    """
+    with simple_query_executor.session() as session:
+        # the table is locked: the writer thread blocks on its first batch
+        session.execute_and_commit("LOCK TABLE test_table")
+        writer = BufferedWriter(simple_query_executor, 'test_table', ['id', 'name'], max_rows=1, max_delay_ms=0, max_queue=2)
+        for i in range(3):
+            writer.write((i, 'x'))
+        with pytest.raises(queue.Full):
+            for i in range(3, 10):
+                writer.write((i, 'x'), timeout=0.1)
+    writer.close()
+    assert writer.stats()['rows_written'] >= 3
+
+def test_flush_timeout_covers_the_whole_call(simple_query_executor):
+    """
+    Test that the timeout of a flush bounds the wait for queue space and the wait for the rows together.
+
+    Args:
+        simple_query_executor (SimpleQueryExecutor): Fixture to create a SimpleQueryExecutor.
+    """
+    simple_query_executor.execute_and_commit(
+        "CREATE FUNCTION test_slow_insert() RETURNS trigger LANGUAGE plpgsql AS $$ BEGIN PERFORM pg_sleep(0.3); RETURN NEW; END $$")
+    try:
+        simple_query_executor.execute_and_commit(
+            "CREATE TRIGGER test_slow_insert BEFORE INSERT ON test_table FOR EACH ROW EXECUTE FUNCTION test_slow_insert()")
+        writer = BufferedWriter(simple_query_executor, 'test_table', ['id', 'name'], max_rows=1, max_delay_ms=0, max_queue=1)
+        writer.write((1, 'x'))
+        time.sleep(0.05)
+        writer.write((2, 'x'))
+
+        # the flush request is queued after about 0.3 s, and the rows before it are inserted after about 0.6 s
+        started = time.monotonic()
+        assert writer.flush(timeout=0.45) is False
+        assert time.monotonic() - started < 0.55
+        writer.close()
+    finally:
+        simple_query_executor.drop_table('test_table')
+        simple_query_executor.execute_and_commit("DROP FUNCTION test_slow_insert()")
+
+def test_writes_racing_with_close(simple_query_executor):
+    """
+    Test that every write accepted while another thread closes the writer is inserted.
+
+    Args:
+        simple_query_executor (SimpleQueryExecutor): Fixture to create a SimpleQueryExecutor.
+    """
+    writer = BufferedWriter(simple_query_executor, 'test_table', ['id', 'name'], max_delay_ms=1)
+    accepted = []
+
+    def produce(offset):
+        for i in range(offset, offset + 1000):
+            try:
+                writer.write((i, 'n'))
+            except RuntimeError:
+                return
+            accepted.append(i)
+
+    threads = [threading.Thread(target=produce, args=(offset,)) for offset in range(0, 4000, 1000)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.01)
+    writer.close()
+    for thread in threads:
+        thread.join()
+
+    assert simple_query_executor.execute_and_fetchone("SELECT count(*) FROM test_table") == (len(accepted),)
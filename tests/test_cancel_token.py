@@ -0,0 +1,165 @@
+# test_cancel_token.py
+
+import asyncio
+import threading
+import time
+
+import psycopg2
+import pytest
+
+from psycopg2_wrapper.CancelToken import CancelToken
+from psycopg2_wrapper.SimpleQueryExecutor import SimpleQueryExecutor
+
+from . import DATABASE_PARAMS
+
+
+@pytest.fixture
+def simple_query_executor():
+    """
+    Fixture to create a SimpleQueryExecutor with a single pooled connection, so that every test
+    checks that the connection of a cancelled call is reused.
+
+    Returns:
+        SimpleQueryExecutor: An instance of the query executor.
+    """
+    executor = SimpleQueryExecutor({**DATABASE_PARAMS, 'pool': {'min_size': 1, 'max_size': 1}})
+    yield executor
+    assert executor.conn.pool.stats()['in_use'] == 0
+    executor.conn.close_pool()
+
+def test_timeout(simple_query_executor):
+    """
+    Test that a statement running past its timeout is cancelled by the server,
+    and that the timeout does not outlive the call.
+
+    Args:
+        simple_query_executor (SimpleQueryExecutor): Fixture with a single pooled connection.
+    """
+    pid = simple_query_executor.execute_and_fetchone("SELECT pg_backend_pid()")[0]
+
+    started = time.monotonic()
+    with pytest.raises(psycopg2.errors.QueryCanceled):
+        simple_query_executor.execute_and_fetchall("SELECT pg_sleep(5)", timeout=0.2)
+    assert time.monotonic() - started < 2
+    with pytest.raises(psycopg2.errors.QueryCanceled):
+        simple_query_executor.select_data('pg_class', where='pg_sleep(5) IS NULL', timeout=0.2)
+    with pytest.raises(ValueError):
+        simple_query_executor.execute_and_commit("SELECT 1", timeout=0)
+
+    assert simple_query_executor.execute_and_fetchone("SHOW statement_timeout", timeout=1.5) == ('1500ms',)
+    assert simple_query_executor.execute_and_fetchone("SHOW statement_timeout") == ('0',)
+    assert simple_query_executor.execute_and_fetchone("SELECT pg_backend_pid()")[0] == pid
+
+def test_timeout_in_session(simple_query_executor):
+    """
+    Test that a timeout inside a session applies to one statement only.
+
+    Args:
+        simple_query_executor (SimpleQueryExecutor): Fixture with a single pooled connection.
+    """
+    with simple_query_executor.session() as session:
+        assert session.execute_and_fetchone("SHOW statement_timeout", timeout=2) == ('2s',)
+        assert session.execute_and_fetchone("SHOW statement_timeout") == ('0',)
+
+def test_cancel_from_thread(simple_query_executor):
+    """
+    Test cancelling a running statement from another thread, and that the token refuses later calls.
+
+    Args:
+        simple_query_executor (SimpleQueryExecutor): Fixture with a single pooled connection.
+    """
+    token = CancelToken()
+    threading.Timer(0.2, token.cancel).start()
+
+    started = time.monotonic()
+    with pytest.raises(psycopg2.errors.QueryCanceled):
+        simple_query_executor.execute_and_fetchone("SELECT pg_sleep(5)", cancel=token)
+    assert time.monotonic() - started < 2
+
+    with pytest.raises(psycopg2.errors.QueryCanceled):
+        simple_query_executor.execute_and_commit("SELECT 1", cancel=token)
+    assert simple_query_executor.execute_and_fetchone("SELECT 1") == (1,)
+
+def test_cancel_before_statement(simple_query_executor):
+    """
+    Test that a cancel landing after the connection is attached, but before the statement is sent, is not lost.
+
+    Args:
+        simple_query_executor (SimpleQueryExecutor): Fixture with a single pooled connection.
+    """
+    def cancelled_on_attach():
+        token = CancelToken()
+        attach = token.attach
+        token.attach = lambda conn: (attach(conn), token.cancel())
+        return token
+
+    with pytest.raises(psycopg2.errors.QueryCanceled):
+        simple_query_executor.execute_and_fetchone("SELECT 1", cancel=cancelled_on_attach())
+    with pytest.raises(psycopg2.errors.QueryCanceled):
+        list(simple_query_executor.execute_and_stream("SELECT 1", cancel=cancelled_on_attach()))
+    with pytest.raises(psycopg2.errors.QueryCanceled):
+        list(simple_query_executor.select_pages('pg_class', ['oid'], key='oid', cancel=cancelled_on_attach()))
+    assert simple_query_executor.execute_and_fetchone("SELECT 1") == (1,)
+
+def test_cancel_stream(simple_query_executor):
+    """
+    Test that cancelling a stream stops it at the next round trip.
+
+    Args:
+        simple_query_executor (SimpleQueryExecutor): Fixture with a single pooled connection.
+    """
+    token = CancelToken()
+    rows = simple_query_executor.execute_and_stream("SELECT generate_series(1, 1000)", itersize=100, cancel=token)
+    assert next(rows) == (1,)
+    token.cancel()
+
+    with pytest.raises(psycopg2.errors.QueryCanceled):
+        list(rows)
+
+def test_cancel_from_asyncio(simple_query_executor):
+    """
+    Test cancelling a statement running in a thread from an asyncio task.
+
+    Args:
+        simple_query_executor (SimpleQueryExecutor): Fixture with a single pooled connection.
+    """
+    async def main():
+        token = CancelToken()
+        loop = asyncio.get_running_loop()
+        query = loop.run_in_executor(None, lambda: simple_query_executor.execute_and_fetchone("SELECT pg_sleep(5)", cancel=token))
+        await asyncio.sleep(0.2)
+        await token.cancel_async()
+        with pytest.raises(psycopg2.errors.QueryCanceled):
+            await query
+
+    asyncio.run(main())
+
+def test_cancel_write_helpers(simple_query_executor):
+    """
+    Test that the table and bulk write helpers take a timeout and a cancel token.
+
+    Args:
+        simple_query_executor (SimpleQueryExecutor): Fixture with a single pooled connection.
+    """
+    token = CancelToken()
+    simple_query_executor.create_table('test_cancel', {'id': 'INT PRIMARY KEY', 'name': 'TEXT'}, timeout=5, cancel=token)
+    try:
+        def rows():
+            for i in range(100000):
+                if i == 1000:
+                    token.cancel()
+                yield (i, 'n%d' % i)
+
+        with pytest.raises(psycopg2.errors.QueryCanceled):
+            simple_query_executor.insert_rows('test_cancel', ['id', 'name'], rows(), cancel=token)
+        for call in (lambda: simple_query_executor.insert_data('test_cancel', {'id': 1}, cancel=token),
+                     lambda: simple_query_executor.upsert_rows('test_cancel', [(1, 'a')], ['id'], columns=['id', 'name'], cancel=token),
+                     lambda: simple_query_executor.update_rows('test_cancel', [(1, 'a')], ['id'], columns=['id', 'name'], cancel=token),
+                     lambda: simple_query_executor.delete_rows('test_cancel', [1], cancel=token)):
+            with pytest.raises(psycopg2.errors.QueryCanceled):
+                call()
+
+        assert simple_query_executor.upsert_rows('test_cancel', [(1, 'a')], ['id'], columns=['id', 'name'], timeout=5) == 1
+        assert simple_query_executor.execute_and_fetchall("SELECT id FROM test_cancel") == [(1,)]
+    finally:
+        simple_query_executor.drop_table('test_cancel', timeout=5)
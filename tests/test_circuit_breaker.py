@@ -0,0 +1,99 @@
+# test_circuit_breaker.py
+
+import time
+
+import psycopg2
+import pytest
+
+from psycopg2_wrapper.CircuitBreaker import CircuitBreaker, CircuitOpen
+from psycopg2_wrapper.DatabaseConnector import DatabaseConnector
+from psycopg2_wrapper.NativeQueryExecutor import NativeQueryExecutor
+
+from . import DATABASE_PARAMS
+
+
+def fail():
+    raise psycopg2.OperationalError("connection refused")
+
+def test_circuit_breaker_states():
+    """
+    Test that the breaker opens after consecutive failures, fails fast while open,
+    lets a single probe through when half-open, and closes when the probe succeeds.
+    """
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.2)
+    calls = []
+    connect = lambda: calls.append(1) or 'conn'
+
+    for _ in range(2):
+        with pytest.raises(psycopg2.OperationalError):
+            breaker.call(fail)
+    assert breaker.state == CircuitBreaker.OPEN
+
+    with pytest.raises(CircuitOpen):
+        breaker.call(connect)
+    with pytest.raises(CircuitOpen):
+        breaker.check()
+    assert calls == []
+
+    time.sleep(0.2)
+    breaker.check()
+    breaker.before()  # the probe
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(CircuitOpen):
+        breaker.before()
+    breaker._record(False, 0.01)
+    assert breaker.state == CircuitBreaker.OPEN
+
+    time.sleep(0.2)
+    assert breaker.call(connect) == 'conn'
+    assert breaker.state == CircuitBreaker.CLOSED
+    stats = breaker.stats()
+    assert stats['opened'] == 2 and stats['rejected'] == 3 and stats['consecutive_failures'] == 0
+    assert stats['connect_count'] == 4
+
+def test_connector_fails_fast():
+    """
+    Test that a connector whose server is down stops connecting once its breaker is open.
+    """
+    connector = DatabaseConnector({**DATABASE_PARAMS, 'port': '1', 'connect_timeout': 1,
+                                   'circuit_breaker': {'failure_threshold': 2, 'reset_timeout': 60}})
+    for _ in range(2):
+        with pytest.raises(psycopg2.OperationalError):
+            connector.connect()
+
+    started = time.monotonic()
+    with pytest.raises(CircuitOpen):
+        connector.acquire()
+    assert time.monotonic() - started < 0.1
+    assert connector.breaker_stats()['primary']['state'] == 'open'
+
+def test_statement_timeout():
+    """
+    Test that the statement timeout of the connector is applied to every pooled connection.
+    """
+    executor = NativeQueryExecutor({**DATABASE_PARAMS, 'statement_timeout': 0.2})
+    with pytest.raises(psycopg2.errors.QueryCanceled):
+        executor.execute_and_fetchone("SELECT pg_sleep(2)")
+    assert executor.execute_and_fetchone("SHOW statement_timeout") == ('200ms',)
+
+def test_read_retried_on_dead_connection():
+    """
+    Test that a read whose pooled connection was terminated is retried on a new connection,
+    and that a write is not.
+    """
+    executor = NativeQueryExecutor({**DATABASE_PARAMS, 'pool': {'min_size': 1, 'max_size': 1}, 'retry_backoff': 0.01})
+    admin = NativeQueryExecutor(DATABASE_PARAMS)
+
+    pid = executor.execute_and_fetchone("SELECT pg_backend_pid()")[0]
+    admin.execute_and_fetchone("SELECT pg_terminate_backend(%s)", (pid,))
+    time.sleep(0.1)
+    assert executor.execute_and_fetchone("SELECT pg_backend_pid()")[0] != pid
+    assert executor.conn.breaker_stats()['retried_reads'] == 1
+
+    pid = executor.execute_and_fetchone("SELECT pg_backend_pid()")[0]
+    admin.execute_and_fetchone("SELECT pg_terminate_backend(%s)", (pid,))
+    time.sleep(0.1)
+    with pytest.raises(psycopg2.OperationalError):
+        executor.execute_and_commit("SELECT 1")
+    assert executor.conn.breaker_stats()['retried_reads'] == 1
+    assert executor.conn.pool.stats()['in_use'] == 0
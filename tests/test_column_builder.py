@@ -0,0 +1,59 @@
+# test_column_builder.py
+
+import array
+
+import pytest
+
+
+QUERY = "SELECT i AS id, i * 0.5::float8 AS score, 'n' || i AS name, i % 2 = 0 AS even FROM generate_series(1, 2500) i"
+
+
+def test_fetch_columns_without_numpy(native_query_executor):
+    """
+    Test that the columns are array.array buffers typed from the OIDs, and lists for other types.
+
+    Args:
+        native_query_executor (NativeQueryExecutor): Fixture to create a NativeQueryExecutor.
+    """
+    columns = native_query_executor.execute_and_fetch_columns(QUERY, chunk_size=1000, use_numpy=False)
+
+    assert list(columns) == ['id', 'score', 'name', 'even']
+    assert isinstance(columns['id'], array.array) and columns['id'].typecode == 'i'
+    assert columns['score'].typecode == 'd' and columns['score'][-1] == 1250.0
+    assert columns['name'][:2] == ['n1', 'n2']
+    assert len(columns['id']) == len(columns['even']) == 2500 and sum(columns['even']) == 1250
+
+def test_fetch_columns_nulls(native_query_executor):
+    """
+    Test that NULLs become NaN in float columns and turn integer columns into object columns.
+
+    Args:
+        native_query_executor (NativeQueryExecutor): Fixture to create a NativeQueryExecutor.
+    """
+    columns = native_query_executor.execute_and_fetch_columns(
+        "SELECT NULLIF(i, 3) AS id, NULLIF(i, 3)::float8 AS score FROM generate_series(1, 4) i",
+        chunk_size=2, use_numpy=False)
+
+    assert columns['id'] == [1, 2, None, 4]
+    assert columns['score'][2] != columns['score'][2] and list(columns['score'][:2]) == [1.0, 2.0]
+
+def test_fetch_columns_numpy(native_query_executor):
+    """
+    Test the NumPy arrays and the streaming variant.
+
+    Args:
+        native_query_executor (NativeQueryExecutor): Fixture to create a NativeQueryExecutor.
+    """
+    numpy = pytest.importorskip('numpy')
+    columns = native_query_executor.execute_and_fetch_columns(QUERY, chunk_size=1000)
+
+    assert columns['id'].dtype == numpy.int32 and columns['id'].sum() == 2500 * 2501 // 2
+    assert columns['score'].dtype == numpy.float64
+    assert columns['even'].dtype == numpy.bool_ and columns['even'].sum() == 1250
+    assert columns['name'].dtype == object and columns['name'][0] == 'n1'
+
+    batches = list(native_query_executor.execute_and_stream_columns(QUERY, chunk_size=1000))
+    assert [len(batch['id']) for batch in batches] == [1000, 1000, 500]
+
+    empty = native_query_executor.execute_and_fetch_columns("SELECT 1::int8 AS x WHERE false")
+    assert empty['x'].dtype == numpy.int64 and len(empty['x']) == 0
@@ -0,0 +1,188 @@
+# test_connection_pool.py
+
+import threading
+import time
+
+from psycopg2.pool import PoolError
+from psycopg2_wrapper.ConnectionPool import ConnectionPool, PoolTimeout
+from psycopg2_wrapper.DatabaseConnector import DatabaseConnector
+from psycopg2_wrapper.NativeQueryExecutor import NativeQueryExecutor
+import pytest
+
+from . import DATABASE_PARAMS
+
+
+@pytest.fixture
+def db_conn():
+    """
+    Fixture to provide a DatabaseConnector used as connection factory.
+    Returns:
+        DatabaseConnector: A connector built from the test database parameters.
+    """
+    return DatabaseConnector(DATABASE_PARAMS)
+
+def test_pool_prewarm(db_conn):
+    """
+    Test that the pool opens `min_size` connections at construction.
+
+    Args:
+        db_conn (DatabaseConnector): Connector fixture.
+    """
+    pool = ConnectionPool(db_conn.connect, min_size=2, max_size=4)
+    assert pool.stats()["size"] == 2
+    assert pool.stats()["idle"] == 2
+    pool.closeall()
+
+def test_pool_reuses_connections(db_conn):
+    """
+    Test that a returned connection is handed out again instead of opening a new one.
+
+    Args:
+        db_conn (DatabaseConnector): Connector fixture.
+    """
+    pool = ConnectionPool(db_conn.connect, min_size=1, max_size=2)
+    conn = pool.getconn()
+    pool.putconn(conn)
+    assert pool.getconn() is conn
+    assert pool.stats()["size"] == 1
+    pool.closeall()
+
+def test_pool_rolls_back_on_return(db_conn):
+    """
+    Test that an open transaction is rolled back when the connection is returned.
+
+    Args:
+        db_conn (DatabaseConnector): Connector fixture.
+    """
+    pool = ConnectionPool(db_conn.connect, min_size=1, max_size=1)
+    conn = pool.getconn()
+    conn.cursor().execute("SELECT 1")
+    pool.putconn(conn)
+    assert conn.info.transaction_status == 0  # TRANSACTION_STATUS_IDLE
+    pool.closeall()
+
+def test_pool_exhausted_timeout(db_conn):
+    """
+    Test that checking out of an exhausted pool fails after the wait timeout.
+
+    Args:
+        db_conn (DatabaseConnector): Connector fixture.
+    """
+    pool = ConnectionPool(db_conn.connect, min_size=0, max_size=1)
+    conn = pool.getconn()
+    with pytest.raises(PoolTimeout):
+        pool.getconn(timeout=0.1)
+    pool.closeall()
+
+def test_pool_waiter_is_woken_up(db_conn):
+    """
+    Test that a thread waiting on an exhausted pool gets the connection once it is returned.
+
+    Args:
+        db_conn (DatabaseConnector): Connector fixture.
+    """
+    pool = ConnectionPool(db_conn.connect, min_size=1, max_size=1)
+    conn = pool.getconn()
+    threading.Timer(0.1, pool.putconn, args=(conn,)).start()
+    assert pool.getconn(timeout=5) is conn
+    pool.closeall()
+
+def test_pool_replaces_broken_connection(db_conn):
+    """
+    Test that a connection closed behind the pool's back is replaced on checkout.
+
+    Args:
+        db_conn (DatabaseConnector): Connector fixture.
+    """
+    pool = ConnectionPool(db_conn.connect, min_size=1, max_size=1)
+    conn = pool.getconn()
+    pool.putconn(conn)
+    conn.close()
+
+    new_conn = pool.getconn()
+    assert new_conn is not conn
+    assert new_conn.closed == 0
+    pool.closeall()
+
+def test_pool_max_lifetime(db_conn):
+    """
+    Test that connections older than `max_lifetime` are recycled.
+
+    Args:
+        db_conn (DatabaseConnector): Connector fixture.
+    """
+    pool = ConnectionPool(db_conn.connect, min_size=0, max_size=1, max_lifetime=0.05)
+    conn = pool.getconn()
+    time.sleep(0.1)
+    pool.putconn(conn)
+    assert conn.closed
+    assert pool.stats()["size"] == 0
+    pool.closeall()
+
+def test_pool_idle_eviction(db_conn):
+    """
+    Test that idle connections above `min_size` are closed after `max_idle`.
+
+    Args:
+        db_conn (DatabaseConnector): Connector fixture.
+    """
+    pool = ConnectionPool(db_conn.connect, min_size=1, max_size=3, max_idle=0.05)
+    first, second = pool.getconn(), pool.getconn()
+    pool.putconn(first)
+    time.sleep(0.1)
+    pool.putconn(second)
+    assert pool.stats()["size"] == 1
+    pool.closeall()
+
+def test_pool_rejects_foreign_connection(db_conn):
+    """
+    Test that returning a connection that does not come from the pool raises a `PoolError`.
+
+    Args:
+        db_conn (DatabaseConnector): Connector fixture.
+    """
+    pool = ConnectionPool(db_conn.connect, min_size=0, max_size=1)
+    conn = db_conn.connect()
+    with pytest.raises(PoolError):
+        pool.putconn(conn)
+    conn.close()
+    pool.closeall()
+
+def test_executor_uses_pool():
+    """
+    Test that the executor methods hand their connection back to the pool.
+    """
+    executor = NativeQueryExecutor({**DATABASE_PARAMS, "pool": {"min_size": 1, "max_size": 1}})
+    for _ in range(5):
+        assert executor.execute_and_fetchone("SELECT 1") == (1,)
+
+    with pytest.raises(Exception):
+        executor.execute_and_fetchone("SELCT 1")
+
+    stats = executor.conn.pool.stats()
+    assert stats["size"] == 1
+    assert stats["in_use"] == 0
+    executor.conn.close_pool()
+
+def test_executor_reclaims_closed_and_dropped_connections():
+    """
+    Test that the connections handed out by `execute` and closed by the caller, or simply dropped,
+    do not exhaust the pool.
+    """
+    executor = NativeQueryExecutor({**DATABASE_PARAMS, "pool": {"min_size": 1, "max_size": 3, "timeout": 1}})
+    for _ in range(5):
+        cursor, conn = executor.execute("SELECT 1")
+        assert cursor.fetchone() == (1,)
+        cursor.close()
+        conn.close()
+
+    for _ in range(5):
+        cursor, _ = executor.execute("SELECT 1")
+        assert cursor.fetchone() == (1,)
+        del cursor, _
+
+    assert executor.execute_and_fetchone("SELECT 1") == (1,)
+    stats = executor.conn.pool.stats()
+    assert stats["in_use"] == 0
+    assert stats["size"] <= 3
+    executor.conn.close_pool()
@@ -1,20 +1,14 @@
 # test_database_connector.py
 
+import time
+
 from psycopg2_wrapper.DatabaseConnector import DatabaseConnector
+from psycopg2_wrapper.NativeQueryExecutor import NativeQueryExecutor
 import pytest
 
 from . import DATABASE_PARAMS
 
 
-@pytest.fixture
-def db_params():
-    """
-    Fixture to provide database parameters for tests.
-    Returns:
-        dict: A dictionary containing the database connection parameters.
-    """
-    return DATABASE_PARAMS
-
 def test_database_connector_init(db_params):
     """
     Test the initialization of the DatabaseConnector class.
@@ -71,3 +65,120 @@ def test_database_connector_close(db_params):
     
     db_conn.close(cursor, conn)
     assert conn.closed == 1
+
+def replica_params(db_params, *replicas, **options):
+    """
+    Build a configuration with read replicas.
+    The replicas of the test suite point to the test server itself, which is enough to check the routing.
+
+    Args:
+        db_params (dict): Database parameters of the primary.
+        replicas (dict): The replica entries.
+        options: Additional configuration entries.
+    """
+    return {**db_params, "replicas": list(replicas), **options}
+
+def test_database_connector_replica_routing(db_params):
+    """
+    Test that read-only checkouts use the replica pool and the other checkouts the primary pool.
+
+    Args:
+        db_params (dict): Database parameters fixture.
+    """
+    db_conn = DatabaseConnector(replica_params(db_params, {"port": db_params["port"]}))
+
+    conn = db_conn.acquire(readonly=True)
+    assert db_conn.replicas[0].pool.owns(conn)
+    assert db_conn._pool is None
+    db_conn.close(None, conn)
+
+    conn = db_conn.acquire()
+    assert db_conn.pool.owns(conn)
+    db_conn.close(None, conn)
+    db_conn.close_pool()
+
+def test_database_connector_replica_ejection(db_params):
+    """
+    Test that an unreachable replica is ejected and the read falls back to another server.
+
+    Args:
+        db_params (dict): Database parameters fixture.
+    """
+    db_conn = DatabaseConnector(replica_params(db_params, {"port": "1"}))
+
+    conn = db_conn.acquire(readonly=True)
+    assert db_conn.pool.owns(conn)
+    assert db_conn.replicas[0].ejected_until > 0
+    db_conn.close(None, conn)
+    db_conn.close_pool()
+
+def test_database_connector_replica_weight(db_params):
+    """
+    Test that replicas are chosen according to their weight.
+
+    Args:
+        db_params (dict): Database parameters fixture.
+    """
+    db_conn = DatabaseConnector(replica_params(
+        db_params, {"port": db_params["port"], "weight": 1}, {"port": db_params["port"], "weight": 0}))
+
+    for _ in range(5):
+        db_conn.close(None, db_conn.acquire(readonly=True))
+    assert db_conn.replicas[1].pool is None
+    db_conn.close_pool()
+
+def test_replica_latency_and_query_errors(db_params):
+    """
+    Test that the latency of a replica is the round trip of its statements, not the time its connections
+    are checked out, and that a replica whose connection fails during a statement is ejected.
+
+    Args:
+        db_params (dict): Database parameters fixture.
+    """
+    executor = NativeQueryExecutor(replica_params(db_params, {"port": db_params["port"]}, retry_backoff=0.01))
+    admin = NativeQueryExecutor(db_params)
+    replica = executor.conn.replicas[0]
+
+    pid = executor.execute_and_fetchone("SELECT pg_backend_pid()")[0]
+    fast = replica.latency
+    assert fast < 0.01
+    conn = executor.conn.acquire(readonly=True)
+    time.sleep(0.3)
+    executor.conn.close(None, conn)
+    assert replica.latency == fast
+    executor.execute_and_fetchone("SELECT pg_sleep(0.2)")
+    assert replica.latency > 0.03
+
+    admin.execute_and_fetchone("SELECT pg_terminate_backend(%s)", (pid,))
+    time.sleep(0.1)
+    executor.execute_and_fetchone("SELECT 1")
+    assert replica.ejected_until > time.monotonic()
+    executor.conn.close_pool()
+
+def test_read_your_writes(db_params):
+    """
+    Test that the reads of a thread stay on the primary after a write with `read_your_writes`.
+
+    Args:
+        db_params (dict): Database parameters fixture.
+    """
+    executor = NativeQueryExecutor(replica_params(db_params, {"port": db_params["port"]}, read_your_writes=60))
+    executor.execute_and_commit("SELECT 1")
+    executor.execute_and_fetchone("SELECT 1")
+
+    assert executor.conn.replicas[0].pool is None
+    executor.conn.close_pool()
+
+def test_execute_parallel_on_replicas(db_params):
+    """
+    Test that parallel reads routed to a replica do not build the primary pool.
+
+    Args:
+        db_params (dict): Database parameters fixture.
+    """
+    executor = NativeQueryExecutor(replica_params(db_params, {"port": db_params["port"]}, pool={"max_size": 2}))
+    results = executor.execute_parallel([("SELECT %s", (i,)) for i in range(4)])
+
+    assert [rows[0][0] for rows in results] == list(range(4))
+    assert executor.conn._pool is None
+    executor.conn.close_pool()
@@ -0,0 +1,103 @@
+# test_export_writer.py
+
+import csv
+import gzip
+import io
+import subprocess
+import sys
+
+from psycopg2_wrapper.SimpleQueryExecutor import SimpleQueryExecutor
+import pytest
+
+from . import DATABASE_PARAMS
+
+
+@pytest.fixture
+def table_columns():
+    """
+    Fixture to provide the columns of the exported test table.
+
+    Returns:
+        dict: A dictionary containing the names and data types of the columns.
+    """
+    return {'id': 'INT', 'name': 'TEXT'}
+
+@pytest.fixture
+def table_rows():
+    """
+    Fixture to provide the exported rows, whose names contain the csv separator.
+
+    Returns:
+        list: Dictionaries mapping column names to values.
+    """
+    return [{'id': i, 'name': 'name, %d' % i} for i in range(1000)]
+
+def test_export_query_csv(simple_query_executor):
+    """
+    Test the export of a query with parameters to a file object, with progress reports.
+
+    Args:
+        simple_query_executor (SimpleQueryExecutor): Fixture to create a SimpleQueryExecutor.
+    """
+    output = io.BytesIO()
+    progress = []
+    rows = simple_query_executor.export_query("SELECT id, name FROM test_table WHERE id < %s ORDER BY id", (10,), output,
+                                              progress=lambda size, count: progress.append((size, count)))
+
+    lines = list(csv.reader(io.StringIO(output.getvalue().decode())))
+    assert rows == 10
+    assert lines[0] == ['id', 'name'] and lines[1] == ['0', 'name, 0'] and len(lines) == 11
+    assert progress[-1] == (len(output.getvalue()), 10)
+
+def test_export_table_gzip_path(simple_query_executor, tmp_path):
+    """
+    Test the export of a filtered table to a gzip compressed file.
+
+    Args:
+        simple_query_executor (SimpleQueryExecutor): Fixture to create a SimpleQueryExecutor.
+        tmp_path: The pytest temporary directory.
+    """
+    path = tmp_path / 'export.tsv.gz'
+    assert simple_query_executor.export_table('test_table', ['name'], 'id >= 990', str(path), format='text', compression='gzip') == 10
+    with gzip.open(path, 'rt') as file:
+        assert file.read().splitlines()[0] == 'name, 990'
+
+def test_export_table_to_pipe(simple_query_executor):
+    """
+    Test the export of a whole table in binary format into the stdin of another process.
+
+    Args:
+        simple_query_executor (SimpleQueryExecutor): Fixture to create a SimpleQueryExecutor.
+    """
+    process = subprocess.Popen([sys.executable, '-c', 'import sys; print(len(sys.stdin.buffer.read()))'],
+                               stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    assert simple_query_executor.export_table('test_table', dest=process.stdin, format='binary') == 1000
+    size = int(process.communicate()[0])
+    # PGCOPY signature, flags and header extension, trailer, and per row: field count, lengths and values
+    assert size == 19 + 2 + sum(2 + 4 + 4 + 4 + len('name, %d' % i) for i in range(1000))
+
+def test_export_errors(simple_query_executor):
+    """
+    Test the validation of the export options.
+
+    Args:
+        simple_query_executor (SimpleQueryExecutor): Fixture to create a SimpleQueryExecutor.
+    """
+    with pytest.raises(ValueError):
+        simple_query_executor.export_query("SELECT 1", None, io.BytesIO(), format='xml')
+    with pytest.raises(ValueError):
+        simple_query_executor.export_query("SELECT 1", None, io.BytesIO(), compression='bz2')
+
+def test_export_query_client_encoding(monkeypatch):
+    """
+    Test the export of a query with parameters on a connection whose encoding has no Python codec of the same name.
+
+    Args:
+        monkeypatch: The pytest fixture setting the client encoding of the new connections.
+    """
+    monkeypatch.setenv('PGCLIENTENCODING', 'WIN1252')
+    executor = SimpleQueryExecutor(DATABASE_PARAMS)
+    output = io.BytesIO()
+    assert executor.export_query("SELECT %s AS name", ('café',), output, format='text') == 1
+    assert output.getvalue() == 'café\n'.encode('cp1252')
+    executor.conn.close_pool()
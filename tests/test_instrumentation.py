@@ -0,0 +1,148 @@
+# test_instrumentation.py
+
+import logging
+
+from psycopg2_wrapper.Instrumentation import Histogram, Instrumentation
+from psycopg2_wrapper.SimpleQueryExecutor import SimpleQueryExecutor
+import psycopg2
+import pytest
+
+from . import DATABASE_PARAMS
+
+
+@pytest.fixture
+def executor_options():
+    """
+    Fixture to enable the instrumentation of the executor.
+
+    Returns:
+        dict: The keyword arguments passed to SimpleQueryExecutor.
+    """
+    return {'instrumentation': Instrumentation()}
+
+def test_fingerprint():
+    """
+    Test that statements differing only by their values share a fingerprint.
+    """
+    instrumentation = Instrumentation()
+    assert instrumentation.fingerprint("SELECT * FROM t WHERE id = 42 AND name = 'it''s'") == "SELECT * FROM t WHERE id = ? AND name = ?"
+    assert instrumentation.fingerprint("SELECT *\n  FROM t WHERE id IN (1, 2, 3) AND x = %(x)s") == "SELECT * FROM t WHERE id IN (?) AND x = ?"
+    assert instrumentation.fingerprint("SELECT col1 FROM t2 WHERE a = $1") == "SELECT col1 FROM t2 WHERE a = ?"
+
+def test_histogram_percentiles():
+    """
+    Test that the histogram percentiles are within a bucket width of the exact values.
+    """
+    histogram = Histogram()
+    for value in range(1, 1001):
+        histogram.add(value / 1000)
+
+    assert histogram.count == 1000
+    assert histogram.percentile(0.5) == pytest.approx(0.5, rel=0.1)
+    assert histogram.percentile(0.99) == pytest.approx(0.99, rel=0.1)
+    assert histogram.percentile(1.0) == 1.0
+
+def test_executor_metrics(simple_query_executor):
+    """
+    Test that the statements run by the executor are aggregated by fingerprint.
+
+    Args:
+        simple_query_executor (SimpleQueryExecutor): Fixture with instrumentation enabled.
+    """
+    simple_query_executor.insert_data('test_table', {'name': 'A'})
+    simple_query_executor.insert_data('test_table', {'name': 'B'})
+    for i in range(3):
+        simple_query_executor.execute_and_fetchall("SELECT name FROM test_table WHERE id > %s", (i,))
+
+    snapshot = simple_query_executor.instrumentation.snapshot()
+    select = snapshot['SELECT name FROM test_table WHERE id > ?']
+    assert select['calls'] == 3
+    assert select['rows']['sum'] == 2 + 1 + 0
+    assert select['total']['p99'] >= select['total']['p50'] > 0
+    assert snapshot['INSERT INTO "test_table" ("name") VALUES (?)']['calls'] == 2
+
+    text = simple_query_executor.instrumentation.prometheus()
+    assert 'psycopg2_wrapper_query_total_seconds_count{fingerprint="SELECT name FROM test_table WHERE id > ?"} 3' in text
+    assert 'fingerprint="INSERT INTO \\"test_table\\" (\\"name\\") VALUES (?)",quantile="0.99"' in text
+
+def test_metrics_of_parallel_streamed_and_paged_reads(simple_query_executor):
+    """
+    Test that the statements of `execute_parallel`, `execute`, the streams and the pages are measured too.
+
+    Args:
+        simple_query_executor (SimpleQueryExecutor): Fixture with instrumentation enabled.
+    """
+    simple_query_executor.insert_rows('test_table', ['name'], [('n%d' % i,) for i in range(5)])
+    assert simple_query_executor.execute_parallel([("SELECT name FROM test_table WHERE id > %s", (i,)) for i in (1, 2)]) \
+        == [[('n1',), ('n2',), ('n3',), ('n4',)], [('n2',), ('n3',), ('n4',)]]
+    assert len(list(simple_query_executor.execute_and_stream("SELECT id FROM test_table", itersize=2))) == 5
+    cursor, conn = simple_query_executor.execute("SELECT id FROM test_table WHERE id < %s", (3,))
+    simple_query_executor.conn.close(cursor, conn)
+    assert sum(len(page) for page in simple_query_executor.select_pages('test_table', ['name'], page_size=2)) == 5
+
+    snapshot = simple_query_executor.instrumentation.snapshot()
+    parallel = snapshot['SELECT name FROM test_table WHERE id > ?']
+    assert parallel['calls'] == 2
+    assert parallel['rows']['sum'] == 4 + 3
+    assert parallel['bytes']['sum'] == 7 * 2
+    stream = snapshot['SELECT id FROM test_table']
+    assert stream['calls'] == 1
+    assert stream['rows']['sum'] == 5
+    assert snapshot['SELECT id FROM test_table WHERE id < ?']['rows']['sum'] == 2
+    assert sum(stats['calls'] for fingerprint, stats in snapshot.items() if 'LIMIT' in fingerprint) == 3
+
+@pytest.mark.parametrize('executor_options', [{'instrumentation': Instrumentation(), 'row_factory': row_factory}
+                                              for row_factory in ('tuple', 'dict', 'namedtuple', 'record')],
+                         ids=['tuple', 'dict', 'namedtuple', 'record'])
+def test_row_bytes(simple_query_executor):
+    """
+    Test that the bytes metric measures the values of the rows, whatever the row factory.
+
+    Args:
+        simple_query_executor (SimpleQueryExecutor): Fixture with instrumentation and the row factory of the test.
+    """
+    simple_query_executor.execute_and_fetchall("SELECT 'abc' AS a_long_column_name FROM generate_series(1, 2)")
+    simple_query_executor.execute_and_fetchone("SELECT 'abcd' AS another_long_column_name")
+
+    snapshot = simple_query_executor.instrumentation.snapshot()
+    assert snapshot["SELECT ? AS a_long_column_name FROM generate_series(?)"]['bytes']['sum'] == 6
+    assert snapshot["SELECT ? AS another_long_column_name"]['bytes']['sum'] == 4
+    assert snapshot["SELECT ? AS another_long_column_name"]['rows']['sum'] == 1
+
+def test_hooks_and_errors(simple_query_executor):
+    """
+    Test that the hooks see every statement, including the failing ones.
+
+    Args:
+        simple_query_executor (SimpleQueryExecutor): Fixture with instrumentation enabled.
+    """
+    events = []
+    simple_query_executor.instrumentation.add_hook(
+        before=lambda event: event.context.setdefault('span', 'open'),
+        after=events.append
+    )
+
+    with pytest.raises(psycopg2.ProgrammingError):
+        simple_query_executor.execute_and_fetchall("SELECT missing FROM test_table")
+    simple_query_executor.execute_and_fetchone("SELECT 1")
+
+    assert [event.context['span'] for event in events] == ['open', 'open']
+    assert isinstance(events[0].error, psycopg2.ProgrammingError)
+    assert events[1].error is None and events[1].rows == 1
+    assert simple_query_executor.instrumentation.snapshot()['SELECT missing FROM test_table']['errors'] == 1
+
+def test_slow_query_log(simple_query_executor, caplog):
+    """
+    Test that the statements slower than the threshold are logged with their parameters.
+
+    Args:
+        simple_query_executor (SimpleQueryExecutor): Fixture with instrumentation enabled.
+        caplog: The pytest log capture fixture.
+    """
+    simple_query_executor.instrumentation.slow_query_threshold = 0.05
+    with caplog.at_level(logging.WARNING, logger='psycopg2_wrapper'):
+        simple_query_executor.execute_and_fetchone("SELECT pg_sleep(%s)", (0.1,))
+        simple_query_executor.execute_and_fetchone("SELECT 1")
+
+    assert len(caplog.records) == 1
+    assert 'pg_sleep' in caplog.records[0].getMessage() and '(0.1,)' in caplog.records[0].getMessage()
@@ -0,0 +1,69 @@
+# test_listener.py
+
+import asyncio
+import threading
+import time
+
+from psycopg2_wrapper.AsyncNativeQueryExecutor import AsyncNativeQueryExecutor
+
+from . import DATABASE_PARAMS
+
+
+def test_listen_and_notify(native_query_executor):
+    """
+    Test that the notifications sent together are received as one batch, and that a wait times out.
+
+    Args:
+        native_query_executor (NativeQueryExecutor): Fixture to create a NativeQueryExecutor.
+    """
+    with native_query_executor.listen(['Jobs', 'other']) as listener:
+        assert listener.wait(timeout=0.05) == []
+
+        with native_query_executor.session() as session:
+            session.notify('Jobs', '1')
+            session.notify('other', '2')
+        native_query_executor.notify('jobs', 'lowercase channel')
+
+        batch = listener.wait(timeout=5)
+        assert [(n.channel, n.payload) for n in batch] == [('Jobs', '1'), ('other', '2')]
+        assert listener.wait(timeout=0.05) == []
+
+def test_listen_iterator_reconnects(native_query_executor):
+    """
+    Test that the iterator blocks until a notification arrives and listens again after a reconnection.
+
+    Args:
+        native_query_executor (NativeQueryExecutor): Fixture to create a NativeQueryExecutor.
+    """
+    listener = native_query_executor.listen('jobs', batch_delay=0.05)
+    native_query_executor.execute_and_fetchone("SELECT pg_terminate_backend(%s)", (listener.conn.get_backend_pid(),))
+
+    def send():
+        time.sleep(0.2)
+        native_query_executor.notify('jobs', 'a')
+        native_query_executor.notify('jobs', 'b')
+
+    thread = threading.Thread(target=send)
+    thread.start()
+    batch = next(iter(listener))
+    thread.join()
+    listener.close()
+
+    assert [n.payload for n in batch] == ['a', 'b']
+    assert listener.reconnects == 1
+
+def test_async_listen():
+    """
+    Test the asynchronous listener.
+    """
+    async def main():
+        executor = AsyncNativeQueryExecutor(DATABASE_PARAMS)
+        async with executor.listen(['jobs']) as listener:
+            assert await listener.wait(timeout=0.05) == []
+            await executor.notify('jobs', 'x')
+            async for batch in listener:
+                assert [n.payload for n in batch] == ['x']
+                break
+        await executor.close()
+
+    asyncio.run(main())
@@ -0,0 +1,125 @@
+# test_metadata_cache.py
+
+import pytest
+
+from psycopg2_wrapper.MetadataCache import Index, MetadataCache
+from psycopg2_wrapper.SimpleQueryExecutor import SimpleQueryExecutor
+
+from . import DATABASE_PARAMS
+
+
+@pytest.fixture
+def executor_options():
+    """
+    Fixture to give the executor its own metadata cache.
+
+    Returns:
+        dict: The keyword arguments passed to SimpleQueryExecutor.
+    """
+    return {'metadata_cache': MetadataCache(ttl=60)}
+
+@pytest.fixture
+def table_columns():
+    """
+    Fixture to provide the columns of the test table.
+
+    Returns:
+        dict: A dictionary containing the names and data types of the columns.
+    """
+    return {'day': 'INT', 'id': 'BIGINT', 'name': 'TEXT'}
+
+@pytest.fixture
+def table_rows():
+    """
+    Fixture to provide the rows of the test table.
+
+    Returns:
+        list: Dictionaries mapping column names to values.
+    """
+    return [{'day': i % 2, 'id': i, 'name': 'n%d' % i} for i in range(10)]
+
+@pytest.fixture
+def simple_query_executor(simple_query_executor):
+    """
+    Fixture to add a two-column primary key and a unique expression index to the shared test table, and analyze it.
+    The metadata cache of the executor is still empty.
+
+    Returns:
+        SimpleQueryExecutor: An instance of the query executor with its own metadata cache.
+    """
+    simple_query_executor.execute_and_commit("ALTER TABLE test_table ADD PRIMARY KEY (day, id)")
+    simple_query_executor.execute_and_commit("CREATE UNIQUE INDEX test_table_name ON test_table (name, lower(name))")
+    simple_query_executor.execute_and_commit("ANALYZE test_table")
+    return simple_query_executor
+
+def test_table_metadata(simple_query_executor):
+    """
+    Test reading the columns, types, keys, indexes and row estimate of a table from the catalog.
+
+    Args:
+        simple_query_executor (SimpleQueryExecutor): Fixture with an empty metadata cache.
+    """
+    metadata = simple_query_executor.table_metadata('test_table')
+
+    assert metadata.columns == ('day', 'id', 'name')
+    assert metadata.types == ('int4', 'int8', 'text')
+    assert metadata.oids == (23, 20, 25)
+    assert metadata.primary_key == ('day', 'id')
+    assert metadata.indexes == (Index('test_table_name', ('name',), True, False), Index('test_table_pkey', ('day', 'id'), True, True))
+    assert metadata.estimated_rows == 10
+    assert metadata.column_types(['name', 'day']) == ['text', 'int4']
+    with pytest.raises(ValueError):
+        metadata.column_types(['missing'])
+
+    assert simple_query_executor.table_metadata('test_table') is metadata
+    assert simple_query_executor.metadata_cache.stats() == {'tables': 1, 'hits': 1, 'misses': 1}
+
+def test_metadata_used_by_queries(simple_query_executor):
+    """
+    Test that SELECT * always returns the current columns, that pages follow the primary key,
+    and that "auto" COPY picks the binary format.
+
+    Args:
+        simple_query_executor (SimpleQueryExecutor): Fixture with an empty metadata cache.
+    """
+    assert simple_query_executor.select_data('test_table', where='id < 2') == [(0, 0, 'n0'), (1, 1, 'n1')]
+
+    # an ALTER TABLE run behind the metadata cache is seen at once
+    simple_query_executor.execute_and_commit("ALTER TABLE test_table ADD COLUMN score FLOAT8, ADD COLUMN dropped INT")
+    assert simple_query_executor.select_data('test_table', where='id < 1') == [(0, 0, 'n0', None, None)]
+    simple_query_executor.execute_and_commit("ALTER TABLE test_table DROP COLUMN dropped")
+    assert simple_query_executor.select_data('test_table', where='id < 1') == [(0, 0, 'n0', None)]
+
+    pages = list(simple_query_executor.select_pages('test_table', ['name'], page_size=4))
+    assert [row for page in pages for row in page] == [('n%d' % i,) for i in (0, 2, 4, 6, 8, 1, 3, 5, 7, 9)]
+
+    assert simple_query_executor.insert_rows('test_table', ['day', 'id', 'name', 'score'], [(2, 10, 'n10', 1.5)], format='auto') == 1
+    assert simple_query_executor.select_data('test_table', ['score'], where='id = 10') == [(1.5,)]
+
+def test_metadata_cache_expiry_and_invalidation(simple_query_executor):
+    """
+    Test that the metadata is read again after the TTL, after `table_metadata(refresh=True)`,
+    and after the table is dropped and created again by an executor sharing the cache.
+
+    Args:
+        simple_query_executor (SimpleQueryExecutor): Fixture with an empty metadata cache.
+    """
+    cache = simple_query_executor.metadata_cache
+    first = simple_query_executor.table_metadata('test_table')
+    assert simple_query_executor.table_metadata('test_table', refresh=True) is not first
+
+    cache.ttl = 0
+    assert simple_query_executor.table_metadata('test_table') is not simple_query_executor.table_metadata('test_table')
+    cache.ttl = 60
+
+    other = SimpleQueryExecutor(DATABASE_PARAMS, metadata_cache=cache)
+    assert other.table_metadata('test_table') is simple_query_executor.table_metadata('test_table')
+    other.drop_table('test_table')
+    other.create_table('test_table', {'id': 'INT', 'label': 'TEXT'})
+    other.conn.close_pool()
+    metadata = simple_query_executor.table_metadata('test_table')
+    assert metadata.columns == ('id', 'label')
+    assert metadata.primary_key == ()
+
+    with pytest.raises(ValueError):
+        next(simple_query_executor.select_pages('test_table'))
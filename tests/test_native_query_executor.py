@@ -1,32 +1,11 @@
 # test_native_query_executor.py
 
-from psycopg2 import ProgrammingError
-from psycopg2_wrapper.NativeQueryExecutor import NativeQueryExecutor
-import pytest
-
-from . import DATABASE_PARAMS
-
-@pytest.fixture
-def db_params():
-    """
-    Fixture to provide database parameters for tests.
-    Returns:
-        dict: A dictionary containing the database connection parameters.
-    """
-    return DATABASE_PARAMS
-
-@pytest.fixture
-def native_query_executor(db_params):
-    """
-    Fixture to create an instance of NativeQueryExecutor for testing.
-    
-    Args:
-        db_params (dict): Database connection parameters.
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-    Returns:
-        NativeQueryExecutor: An instance of the query executor for interacting with the database.
-    """
-    return NativeQueryExecutor(db_params)
+from psycopg2 import InterfaceError, ProgrammingError
+from psycopg2.extensions import QueryCanceledError
+import pytest
 
 def test_execute(native_query_executor):
     """
@@ -117,4 +96,181 @@ def test_execute_many_and_commit(native_query_executor):
     result = native_query_executor.execute_and_fetchall("SELECT * FROM test_table")
     assert result == [(1,), (2,), (3,)]
     
-    native_query_executor.execute_and_commit("DROP TABLE IF EXISTS test_table")
\ No newline at end of file
+    native_query_executor.execute_and_commit("DROP TABLE IF EXISTS test_table")
+
+def test_session_commits_once_on_exit(native_query_executor):
+    """
+    Test running several statements in a session.
+    Ensures that the statements share one connection and are only visible after the session exits.
+
+    Args:
+        native_query_executor (NativeQueryExecutor): Fixture for executing queries.
+    """
+    native_query_executor.execute_and_commit("CREATE TABLE IF NOT EXISTS test_table (id INT)")
+
+    with native_query_executor.session() as session:
+        session.execute_and_commit("INSERT INTO test_table (id) VALUES (%s)", (1,))
+        session.execute_many_and_commit("INSERT INTO test_table (id) VALUES (%s)", [(2,), (3,)])
+
+        assert session.execute_and_fetchone("SELECT count(*) FROM test_table") == (3,)
+        assert native_query_executor.execute_and_fetchone("SELECT count(*) FROM test_table") == (0,)
+
+    result = native_query_executor.execute_and_fetchall("SELECT * FROM test_table ORDER BY id")
+    assert result == [(1,), (2,), (3,)]
+
+    native_query_executor.execute_and_commit("DROP TABLE IF EXISTS test_table")
+
+def test_session_rolls_back_on_error(native_query_executor):
+    """
+    Test that an error inside a session rolls back every statement of the session.
+
+    Args:
+        native_query_executor (NativeQueryExecutor): Fixture for executing queries.
+    """
+    native_query_executor.execute_and_commit("CREATE TABLE IF NOT EXISTS test_table (id INT)")
+
+    with pytest.raises(ProgrammingError):
+        with native_query_executor.session() as session:
+            session.execute_and_commit("INSERT INTO test_table (id) VALUES (%s)", (1,))
+            session.execute_and_commit("SELCT 1")
+
+    assert native_query_executor.execute_and_fetchone("SELECT count(*) FROM test_table") == (0,)
+    assert native_query_executor.conn.pool.stats()["in_use"] == 0
+
+    native_query_executor.execute_and_commit("DROP TABLE IF EXISTS test_table")
+
+def test_nested_transaction_savepoint(native_query_executor):
+    """
+    Test that a nested transaction only rolls back its own statements.
+
+    Args:
+        native_query_executor (NativeQueryExecutor): Fixture for executing queries.
+    """
+    native_query_executor.execute_and_commit("CREATE TABLE IF NOT EXISTS test_table (id INT)")
+
+    with native_query_executor.transaction() as tx:
+        tx.execute_and_commit("INSERT INTO test_table (id) VALUES (%s)", (1,))
+        with pytest.raises(ProgrammingError):
+            with tx.transaction():
+                tx.execute_and_commit("INSERT INTO test_table (id) VALUES (%s)", (2,))
+                tx.execute_and_commit("SELCT 1")
+        with tx.transaction():
+            tx.execute_and_commit("INSERT INTO test_table (id) VALUES (%s)", (3,))
+
+    result = native_query_executor.execute_and_fetchall("SELECT * FROM test_table ORDER BY id")
+    assert result == [(1,), (3,)]
+
+    native_query_executor.execute_and_commit("DROP TABLE IF EXISTS test_table")
+
+def test_session_closed_after_exit(native_query_executor):
+    """
+    Test that a bound executor cannot be used once its session is over.
+
+    Args:
+        native_query_executor (NativeQueryExecutor): Fixture for executing queries.
+    """
+    with native_query_executor.session() as session:
+        pass
+
+    with pytest.raises(InterfaceError):
+        session.execute_and_fetchone("SELECT 1")
+
+def test_execute_and_stream(native_query_executor):
+    """
+    Test streaming a result through a server-side cursor.
+    Ensures that every row is yielded and the connection goes back to the pool, even when the generator is closed early.
+
+    Args:
+        native_query_executor (NativeQueryExecutor): Fixture for executing queries.
+    """
+    rows = list(native_query_executor.execute_and_stream("SELECT generate_series(1, %s)", (25,), itersize=10))
+    assert rows == [(i,) for i in range(1, 26)]
+
+    stream = native_query_executor.execute_and_stream("SELECT generate_series(1, 100)", itersize=10)
+    assert next(stream) == (1,)
+    stream.close()
+
+    assert native_query_executor.conn.pool.stats()["in_use"] == 0
+
+@pytest.mark.parametrize("mode", ["executemany", "batch", "values"])
+def test_execute_many_and_commit_modes(native_query_executor, mode):
+    """
+    Test every batching mode of `execute_many_and_commit` with several pages.
+
+    Args:
+        native_query_executor (NativeQueryExecutor): Fixture for executing queries.
+        mode (str): The batching mode under test.
+    """
+    sql = "INSERT INTO test_table (id) VALUES %s" if mode == "values" else "INSERT INTO test_table (id) VALUES (%s)"
+    params = [(i,) for i in range(25)]
+
+    native_query_executor.execute_and_commit("CREATE TABLE IF NOT EXISTS test_table (id INT)")
+    native_query_executor.execute_many_and_commit(sql, params, mode=mode, page_size=10)
+
+    result = native_query_executor.execute_and_fetchall("SELECT * FROM test_table ORDER BY id")
+    assert result == params
+
+    native_query_executor.execute_and_commit("DROP TABLE IF EXISTS test_table")
+
+def test_execute_many_and_commit_returning(native_query_executor):
+    """
+    Test that the RETURNING rows of every page are returned in "values" mode.
+
+    Args:
+        native_query_executor (NativeQueryExecutor): Fixture for executing queries.
+    """
+    native_query_executor.execute_and_commit("CREATE TABLE IF NOT EXISTS test_table (id SERIAL, name TEXT)")
+
+    result = native_query_executor.execute_many_and_commit(
+        "INSERT INTO test_table (name) VALUES %s RETURNING id", [(str(i),) for i in range(25)],
+        mode="values", page_size=10, fetch=True)
+    assert result == [(i,) for i in range(1, 26)]
+
+    native_query_executor.execute_and_commit("DROP TABLE IF EXISTS test_table")
+
+def test_execute_parallel(native_query_executor):
+    """
+    Test running independent queries at the same time.
+    Ensures that the results come back in input order and faster than sequentially.
+
+    Args:
+        native_query_executor (NativeQueryExecutor): Fixture for executing queries.
+    """
+    queries = [("SELECT %s, pg_sleep(0.2)", (i,)) for i in range(8)]
+    start = time.monotonic()
+    results = native_query_executor.execute_parallel(queries, max_workers=8)
+
+    assert time.monotonic() - start < 1.0
+    assert [rows[0][0] for rows in results] == list(range(8))
+
+def test_execute_parallel_errors_and_deadline(native_query_executor):
+    """
+    Test the per-query error capture and the cancellation of the queries still running at the deadline.
+
+    Args:
+        native_query_executor (NativeQueryExecutor): Fixture for executing queries.
+    """
+    queries = [("SELECT 1", None), ("SELCT 1", None), ("SELECT pg_sleep(10)", None)]
+    results = native_query_executor.execute_parallel(queries, timeout=0.5, return_exceptions=True)
+
+    assert results[0] == [(1,)]
+    assert isinstance(results[1], ProgrammingError)
+    assert isinstance(results[2], QueryCanceledError)
+
+    with pytest.raises(ProgrammingError):
+        native_query_executor.execute_parallel(queries[:2])
+
+    assert native_query_executor.conn.pool.stats()["in_use"] == 0
+
+def test_executor_thread_safety(native_query_executor):
+    """
+    Test sharing one executor between threads.
+
+    Args:
+        native_query_executor (NativeQueryExecutor): Fixture for executing queries.
+    """
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        results = list(pool.map(lambda i: native_query_executor.execute_and_fetchone("SELECT %s", (i,)), range(200)))
+
+    assert results == [(i,) for i in range(200)]
+    assert native_query_executor.conn.pool.stats()["in_use"] == 0
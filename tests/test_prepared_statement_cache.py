@@ -0,0 +1,120 @@
+# test_prepared_statement_cache.py
+
+import datetime
+from decimal import Decimal
+
+from psycopg2_wrapper.NativeQueryExecutor import NativeQueryExecutor
+from psycopg2_wrapper.PreparedStatementCache import PreparedStatementCache
+import pytest
+
+from . import DATABASE_PARAMS
+
+
+@pytest.fixture
+def native_query_executor():
+    """
+    Fixture to create a NativeQueryExecutor with a small prepared statement cache and a single pooled connection.
+
+    Returns:
+        NativeQueryExecutor: An instance of the query executor with prepared statements enabled.
+    """
+    executor = NativeQueryExecutor({**DATABASE_PARAMS, "pool": {"min_size": 1, "max_size": 1}}, prepared_statements=2)
+    yield executor
+    executor.conn.close_pool()
+
+def prepared_names(executor):
+    """
+    Return the names of the statements prepared on the (single) pooled connection.
+
+    Args:
+        executor (NativeQueryExecutor): The executor under test.
+    """
+    rows = executor.execute_and_fetchall("SELECT name FROM pg_prepared_statements ORDER BY name")
+    return [row[0] for row in rows]
+
+def test_convert_placeholders():
+    """
+    Test the conversion of psycopg2 placeholders to positional parameters.
+    """
+    assert PreparedStatementCache._convert("SELECT %s, %s, '100%%'", (1, 2)) == ("SELECT $1, $2, '100%'", None)
+    assert PreparedStatementCache._convert("SELECT %(a)s, %(b)s, %(a)s", {"a": 1, "b": 2}) == ("SELECT $1, $2, $1", ["a", "b"])
+    assert PreparedStatementCache._convert("SELECT '100%'", None) == ("SELECT '100%'", None)
+
+def test_prepared_hit_and_miss(native_query_executor):
+    """
+    Test that a statement is prepared once and then executed from the cache.
+
+    Args:
+        native_query_executor (NativeQueryExecutor): Fixture with prepared statements enabled.
+    """
+    for i in range(3):
+        assert native_query_executor.execute_and_fetchone("SELECT %s::int + 1", (i,)) == (i + 1,)
+    assert native_query_executor.execute_and_fetchone("SELECT %(x)s::int * %(x)s::int", {"x": 3}) == (9,)
+
+    stats = native_query_executor.prepared_statements.stats()
+    assert stats["misses"] == 2 and stats["hits"] == 2
+
+def test_prepared_lru_eviction(native_query_executor):
+    """
+    Test that the least recently used statement is deallocated when the cache is full.
+
+    Args:
+        native_query_executor (NativeQueryExecutor): Fixture with prepared statements enabled.
+    """
+    for sql in ("SELECT %s::int", "SELECT %s::int + 1", "SELECT %s::int + 2"):
+        native_query_executor.execute_and_fetchone(sql, (1,))
+
+    # the pg_prepared_statements query itself takes a slot in the cache
+    assert len(prepared_names(native_query_executor)) == 2
+    assert native_query_executor.prepared_statements.stats()["evictions"] == 2
+
+def test_prepared_statement_in_transaction(native_query_executor):
+    """
+    Test that statements that cannot be prepared fall back to a plain execution without aborting the session.
+
+    Args:
+        native_query_executor (NativeQueryExecutor): Fixture with prepared statements enabled.
+    """
+    native_query_executor.execute_and_commit("CREATE TABLE IF NOT EXISTS test_table (id INT)")
+
+    with native_query_executor.session() as session:
+        session.execute_and_commit("INSERT INTO test_table (id) VALUES (%s)", (1,))
+        # the server cannot determine the type of a string parameter without context
+        assert session.execute_and_fetchone("SELECT %s", ('x',)) == ('x',)
+        session.execute_and_commit("INSERT INTO test_table (id) VALUES (%s)", (2,))
+
+    result = native_query_executor.execute_and_fetchall("SELECT * FROM test_table ORDER BY id")
+    assert result == [(1,), (2,)]
+
+    native_query_executor.execute_and_commit("DROP TABLE IF EXISTS test_table")
+
+def test_prepared_parameter_types(native_query_executor):
+    """
+    Test that prepared statements return the values a plain execution returns, whatever the parameter types.
+
+    Args:
+        native_query_executor (NativeQueryExecutor): Fixture with prepared statements enabled.
+    """
+    for value in (1, True, 2**40, 1.5, Decimal('2.5'), datetime.date(2024, 1, 2), None, 'x', 1, True):
+        assert native_query_executor.execute_and_fetchone("SELECT %s", (value,)) == (value,)
+    assert native_query_executor.execute_and_fetchone("SELECT %(a)s, %(b)s", {"a": 1, "b": False}) == (1, False)
+    assert native_query_executor.execute_and_fetchone("SELECT %s", ([1, 2],)) == ([1, 2],)
+    assert native_query_executor.execute_and_fetchone("SELECT now()::date = %s", ('2024-01-02',)) == (False,)
+    assert native_query_executor.prepared_statements.stats()["hits"] == 2
+
+def test_prepared_after_alter_table(native_query_executor):
+    """
+    Test that a prepared SELECT * is prepared again when its table changes instead of failing.
+
+    Args:
+        native_query_executor (NativeQueryExecutor): Fixture with prepared statements enabled.
+    """
+    native_query_executor.execute_and_commit("CREATE TABLE IF NOT EXISTS test_table (id INT)")
+    native_query_executor.execute_and_commit("INSERT INTO test_table (id) VALUES (%s)", (1,))
+    try:
+        assert native_query_executor.execute_and_fetchall("SELECT * FROM test_table WHERE id = %s", (1,)) == [(1,)]
+        native_query_executor.execute_and_commit("ALTER TABLE test_table ADD COLUMN name TEXT")
+        assert native_query_executor.execute_and_fetchall("SELECT * FROM test_table WHERE id = %s", (1,)) == [(1, None)]
+        assert native_query_executor.execute_and_fetchall("SELECT * FROM test_table WHERE id = %s", (1,)) == [(1, None)]
+    finally:
+        native_query_executor.execute_and_commit("DROP TABLE IF EXISTS test_table")
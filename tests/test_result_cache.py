@@ -0,0 +1,126 @@
+# test_result_cache.py
+
+import time
+
+from psycopg2_wrapper.ResultCache import ResultCache
+from psycopg2_wrapper.SimpleQueryExecutor import SimpleQueryExecutor
+import pytest
+
+from . import DATABASE_PARAMS
+
+
+@pytest.fixture
+def executor_options():
+    """
+    Fixture to enable the result cache of the executor.
+
+    Returns:
+        dict: The keyword arguments passed to SimpleQueryExecutor.
+    """
+    return {'result_cache': ResultCache(ttl=60)}
+
+@pytest.fixture
+def table_rows():
+    """
+    Fixture to provide the rows of the test table.
+
+    Returns:
+        list: Dictionaries mapping column names to values.
+    """
+    return [{'name': 'A'}]
+
+def test_table_extraction():
+    """
+    Test the detection of the tables read and written by a statement.
+    """
+    assert ResultCache.read_tables('SELECT * FROM a JOIN public."B" b ON true WHERE x IN (SELECT y FROM c)') == {'a', 'B', 'c'}
+    assert ResultCache.read_tables('SELECT * FROM a, b AS x (i, j), ONLY c JOIN d ON d.i = c.i, e WHERE f = 1') == {'a', 'b', 'c', 'd', 'e'}
+    assert ResultCache.read_tables("SELECT 'FROM x', extract(year FROM created) /* FROM y */ FROM a ORDER BY 1, 2") == {'a'}
+    assert ResultCache.read_tables('SELECT * FROM (SELECT * FROM a) s, b') is None
+    assert ResultCache.read_tables('WITH s AS (SELECT * FROM a) SELECT * FROM s') is None
+    assert ResultCache.read_tables('SELECT * FROM generate_series(1, 3), a') is None
+    assert ResultCache.read_tables('SELECT 1') is None
+    assert ResultCache.read_tables('SELECT id FROM jobs LIMIT 1 FOR UPDATE SKIP LOCKED') is None
+    assert ResultCache.read_tables('SELECT id FROM jobs FOR NO KEY UPDATE') is None
+    assert ResultCache.read_tables('SELECT substring(name FOR 2) FROM jobs') == {'jobs'}
+    assert ResultCache.read_tables('SELECT id, random() FROM jobs') is None
+    assert ResultCache.write_tables('INSERT INTO Users (id) SELECT id FROM other') == {'users'}
+    assert ResultCache.write_tables('DROP TABLE IF EXISTS test_table') == {'test_table'}
+    assert ResultCache.write_tables('SELECT do_something()') is None
+
+def test_result_cache_hit(simple_query_executor):
+    """
+    Test that a repeated read is served from the cache without touching the database.
+
+    Args:
+        simple_query_executor (SimpleQueryExecutor): Fixture with the result cache enabled.
+    """
+    first = simple_query_executor.select_data('test_table', ['name'])
+    # a write behind the executor's back is not seen until the entry expires
+    other = SimpleQueryExecutor(DATABASE_PARAMS)
+    other.insert_data('test_table', {'name': 'B'})
+    other.conn.close_pool()
+
+    assert simple_query_executor.select_data('test_table', ['name']) == first == [('A',)]
+    assert simple_query_executor.result_cache.stats()['hits'] == 1
+
+def test_result_cache_invalidated_by_write(simple_query_executor):
+    """
+    Test that a write through the executor invalidates the entries reading the written table.
+
+    Args:
+        simple_query_executor (SimpleQueryExecutor): Fixture with the result cache enabled.
+    """
+    assert simple_query_executor.select_data('test_table', ['name']) == [('A',)]
+    simple_query_executor.insert_data('test_table', {'name': 'B'})
+    assert simple_query_executor.select_data('test_table', ['name']) == [('A',), ('B',)]
+
+    with simple_query_executor.session() as session:
+        session.insert_data('test_table', {'name': 'C'})
+    assert len(simple_query_executor.select_data('test_table', ['name'])) == 3
+
+def test_result_cache_skips_volatile_and_locking_reads(simple_query_executor):
+    """
+    Test that reads of volatile functions and locking reads always go to the database.
+
+    Args:
+        simple_query_executor (SimpleQueryExecutor): Fixture with the result cache enabled.
+    """
+    simple_query_executor.execute_and_commit("CREATE SEQUENCE s_rc")
+    try:
+        assert [simple_query_executor.execute_and_fetchone("SELECT nextval('s_rc')") for _ in range(3)] == [(1,), (2,), (3,)]
+    finally:
+        simple_query_executor.execute_and_commit("DROP SEQUENCE s_rc")
+
+    timestamps = {simple_query_executor.execute_and_fetchone("SELECT clock_timestamp()") for _ in range(3)}
+    assert len(timestamps) == 3
+    locked = "SELECT name FROM test_table LIMIT 1 FOR UPDATE SKIP LOCKED"
+    assert simple_query_executor.execute_and_fetchall(locked) == [('A',)]
+    assert simple_query_executor.execute_and_fetchall(locked) == [('A',)]
+    assert simple_query_executor.result_cache.stats() == {'hits': 0, 'misses': 0, 'entries': 0, 'bytes': 0}
+
+def test_result_cache_ttl():
+    """
+    Test that entries expire after the TTL.
+    """
+    cache = ResultCache(ttl=0.05)
+    key = ResultCache.key('all', 'SELECT 1', None)
+    cache.put(key, [(1,)], frozenset())
+    assert cache.get(key) == (True, [(1,)])
+    time.sleep(0.1)
+    assert cache.get(key) == (False, None)
+
+def test_result_cache_memory_bound():
+    """
+    Test that the least recently used entries are evicted past the memory bound.
+    """
+    cache = ResultCache(max_bytes=2000)
+    rows = [(i,) for i in range(10)]
+    for i in range(10):
+        cache.put(ResultCache.key('all', 'SELECT %s', (i,)), list(rows), frozenset())
+
+    stats = cache.stats()
+    assert 0 < stats['entries'] < 10
+    assert stats['bytes'] <= 2000
+    assert cache.get(ResultCache.key('all', 'SELECT %s', (9,)))[0]
+    assert not cache.get(ResultCache.key('all', 'SELECT %s', (0,)))[0]
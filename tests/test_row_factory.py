@@ -0,0 +1,87 @@
+# test_row_factory.py
+
+from psycopg2_wrapper.ResultCache import ResultCache
+from psycopg2_wrapper.RowFactory import RowFactory
+from psycopg2_wrapper.SimpleQueryExecutor import SimpleQueryExecutor
+import pytest
+
+from . import DATABASE_PARAMS
+
+
+@pytest.fixture
+def executor_options():
+    """
+    Fixture to make the executor return records.
+
+    Returns:
+        dict: The keyword arguments passed to SimpleQueryExecutor.
+    """
+    return {'row_factory': 'record'}
+
+@pytest.fixture
+def table_rows():
+    """
+    Fixture to provide the rows of the test table.
+
+    Returns:
+        list: Dictionaries mapping column names to values.
+    """
+    return [{'name': 'A'}, {'name': 'B'}]
+
+def test_records(simple_query_executor):
+    """
+    Test that the fetch methods return slotted records, whose class is built once per column list.
+
+    Args:
+        simple_query_executor (SimpleQueryExecutor): Fixture with the "record" row factory.
+    """
+    rows = simple_query_executor.execute_and_fetchall("SELECT id, name FROM test_table ORDER BY id")
+    assert [(row.id, row.name) for row in rows] == [(1, 'A'), (2, 'B')]
+    assert rows[0] == (1, 'A') and rows[0][1] == 'A' and tuple(rows[1]) == (2, 'B')
+    assert not hasattr(rows[0], '__dict__')
+
+    row = simple_query_executor.execute_and_fetchone("SELECT id, name FROM test_table WHERE id = %s", (2,))
+    assert type(row) is type(rows[0])
+    assert simple_query_executor.execute_and_fetchone("SELECT id FROM test_table WHERE id = 0") is None
+    assert [row.name for row in simple_query_executor.execute_and_stream("SELECT name FROM test_table ORDER BY id")] == ['A', 'B']
+
+def test_select_data_row_factory(simple_query_executor):
+    """
+    Test the row factory override of select_data.
+
+    Args:
+        simple_query_executor (SimpleQueryExecutor): Fixture with the "record" row factory.
+    """
+    assert simple_query_executor.select_data('test_table', ['id', 'name'], row_factory='dict')[0] == {'id': 1, 'name': 'A'}
+    assert simple_query_executor.select_data('test_table', ['id', 'name'], row_factory='tuple')[0] == (1, 'A')
+    assert simple_query_executor.select_data('test_table', ['name'], row_factory='namedtuple')[1].name == 'B'
+    assert simple_query_executor.select_data('test_table', ['name'])[1].name == 'B'
+
+def test_row_factory_and_result_cache():
+    """
+    Test that executors with different row factories sharing a result cache do not mix their rows.
+    """
+    cache = ResultCache()
+    tuples = SimpleQueryExecutor(DATABASE_PARAMS, result_cache=cache)
+    dicts = SimpleQueryExecutor(DATABASE_PARAMS, result_cache=cache, row_factory='dict')
+
+    assert tuples.execute_and_fetchall("SELECT 1 AS one") == [(1,)]
+    assert dicts.execute_and_fetchall("SELECT 1 AS one") == [{'one': 1}]
+    tuples.conn.close_pool()
+    dicts.conn.close_pool()
+
+def test_custom_row_factory_and_renamed_columns():
+    """
+    Test a custom row constructor and the renaming of the columns that are not valid attribute names.
+    """
+    executor = SimpleQueryExecutor(DATABASE_PARAMS, row_factory=RowFactory(lambda names: lambda *values: names))
+    assert executor.execute_and_fetchone("SELECT 1 AS a, 2 AS b") == ('a', 'b')
+    executor.conn.close_pool()
+
+    executor = SimpleQueryExecutor(DATABASE_PARAMS, row_factory='record')
+    row = executor.execute_and_fetchone('SELECT 1 AS a, 2 AS a, 3 AS "class", 4 AS "x y"')
+    assert row._fields == ('a', '_1', '_2', '_3') and row._asdict()['_3'] == 4
+    executor.conn.close_pool()
+
+    with pytest.raises(ValueError):
+        RowFactory('list')
@@ -1,11 +1,23 @@
 # test_simple_query_executor.py
 
+import datetime
+import gzip
+from decimal import Decimal
+
+import psycopg2
 import pytest
-from psycopg2_wrapper.SimpleQueryExecutor import SimpleQueryExecutor
+from psycopg2 import sql
+from psycopg2_wrapper.SimpleQueryExecutor import SimpleQueryExecutor, _render
 
 from . import DATABASE_PARAMS
 
 
+def collect_rows(rows):
+    """
+    The parallel_scan function of the tests: it runs in the worker processes, so it is defined at module level.
+    """
+    return list(rows)
+
 @pytest.fixture
 def db_params():
     """
@@ -87,4 +99,272 @@ def test_drop_table(simple_query_executor):
     simple_query_executor.drop_table('test_table')
     
     result = simple_query_executor.execute_and_fetchone("SELECT to_regclass('public.test_table')")
-    assert result[0] is None
\ No newline at end of file
+    assert result[0] is None
+
+def test_insert_data_in_session(simple_query_executor):
+    """
+    Test inserting several rows in one session.
+    Ensures that `insert_data` runs on the session connection and is committed once on exit.
+
+    Args:
+        simple_query_executor (SimpleQueryExecutor): Fixture for executing simple queries.
+    """
+    simple_query_executor.create_table('test_table', {'id': 'SERIAL PRIMARY KEY', 'name': 'VARCHAR(100)'})
+
+    with simple_query_executor.session() as session:
+        for name in ('A', 'B', 'C'):
+            session.insert_data('test_table', {'name': name})
+
+    result = simple_query_executor.select_data('test_table', ['name'])
+    assert sorted(result) == [('A',), ('B',), ('C',)]
+
+    simple_query_executor.drop_table('test_table')
+
+def test_select_data_stream(simple_query_executor):
+    """
+    Test selecting data in streaming mode.
+    Ensures that `select_data` with `stream=True` yields the same rows as the default mode.
+
+    Args:
+        simple_query_executor (SimpleQueryExecutor): Fixture for executing simple queries.
+    """
+    simple_query_executor.create_table('test_table', {'id': 'SERIAL PRIMARY KEY', 'name': 'VARCHAR(100)'})
+    for name in ('A', 'B', 'C'):
+        simple_query_executor.insert_data('test_table', {'name': name})
+
+    result = simple_query_executor.select_data('test_table', ['name'], stream=True, itersize=2)
+    assert sorted(result) == [('A',), ('B',), ('C',)]
+
+    simple_query_executor.drop_table('test_table')
+
+def test_insert_rows(simple_query_executor):
+    """
+    Test bulk inserting rows with COPY.
+    Ensures that tuples, dicts and generators are accepted and that NULLs and special characters round-trip.
+
+    Args:
+        simple_query_executor (SimpleQueryExecutor): Fixture for executing simple queries.
+    """
+    simple_query_executor.create_table('test_table', {'id': 'INT', 'name': 'TEXT'})
+
+    names = ['plain', 'tab\there', 'new\nline', 'back\\slash', None, '\\N']
+    count = simple_query_executor.insert_rows('test_table', ['id', 'name'], ((i, name) for i, name in enumerate(names)))
+    assert count == len(names)
+
+    count = simple_query_executor.insert_rows('test_table', None, [{'id': 100, 'name': 'dict'}])
+    assert count == 1
+
+    result = simple_query_executor.execute_and_fetchall("SELECT id, name FROM test_table ORDER BY id")
+    assert result == list(enumerate(names)) + [(100, 'dict')]
+
+    simple_query_executor.drop_table('test_table')
+
+def test_insert_rows_binary(simple_query_executor):
+    """
+    Test bulk inserting rows with binary COPY.
+    Ensures that the values of the supported types round-trip.
+
+    Args:
+        simple_query_executor (SimpleQueryExecutor): Fixture for executing simple queries.
+    """
+    simple_query_executor.create_table('test_table', {
+        'id': 'BIGINT', 'ratio': 'DOUBLE PRECISION', 'amount': 'NUMERIC(12, 4)',
+        'flag': 'BOOLEAN', 'label': 'VARCHAR(20)', 'created': 'TIMESTAMP'
+    })
+
+    rows = [
+        (1, 0.5, Decimal('12345.6789'), True, 'été', datetime.datetime(2024, 5, 1, 12, 30, 15, 250)),
+        (2, -1.25, Decimal('-0.0001'), False, None, datetime.datetime(1999, 12, 31, 23, 59, 59)),
+        (3, None, Decimal('0'), None, 'x', None),
+    ]
+    count = simple_query_executor.insert_rows(
+        'test_table', ['id', 'ratio', 'amount', 'flag', 'label', 'created'], iter(rows), format='binary')
+    assert count == 3
+
+    result = simple_query_executor.execute_and_fetchall("SELECT * FROM test_table ORDER BY id")
+    assert result == rows
+
+    simple_query_executor.drop_table('test_table')
+
+def test_quoted_identifiers(simple_query_executor):
+    """
+    Test that table and column names are quoted.
+    Ensures that reserved words and mixed-case names can be used as column names.
+
+    Args:
+        simple_query_executor (SimpleQueryExecutor): Fixture for executing simple queries.
+    """
+    simple_query_executor.create_table('test_table', {'order': 'INT', 'UserName': 'TEXT'})
+    simple_query_executor.insert_data('test_table', {'order': 1, 'UserName': 'Test'})
+
+    result = simple_query_executor.select_data('test_table', ['order', 'UserName'])
+    assert result == [(1, 'Test')]
+
+    simple_query_executor.drop_table('public.test_table')
+    result = simple_query_executor.execute_and_fetchone("SELECT to_regclass('public.test_table')")
+    assert result[0] is None
+
+def test_statement_cache(simple_query_executor):
+    """
+    Test that the SQL text of a statement shape is built once and reused.
+
+    Args:
+        simple_query_executor (SimpleQueryExecutor): Fixture for executing simple queries.
+    """
+    build = lambda: simple_query_executor._select('test_table', ('id',), 'id > 1')
+    first = simple_query_executor._sql(('test', 'shape'), build)
+    second = simple_query_executor._sql(('test', 'shape'), lambda: pytest.fail("statement rebuilt"))
+
+    assert first is second
+    assert first == 'SELECT "id" FROM "test_table" WHERE id > 1'
+    # rendering does not check a connection out of the pool
+    assert simple_query_executor.conn._pool is None
+
+    composed = sql.SQL("SELECT {}, %s, {} FROM {}").format(
+        sql.Identifier('we"ird col'), sql.Placeholder('name'), sql.Identifier('schema', 'Table'))
+    conn = simple_query_executor.conn.connect()
+    assert _render(composed) == composed.as_string(conn)
+    conn.close()
+
+def test_select_pages(simple_query_executor):
+    """
+    Test keyset pagination over a composite key, in both directions, with a filter and a resume token.
+    Ensures that the pages cover every row once and that the key columns are not added to the rows.
+
+    Args:
+        simple_query_executor (SimpleQueryExecutor): Fixture for executing simple queries.
+    """
+    simple_query_executor.execute_and_commit("CREATE TABLE test_table (day INT, id INT, name TEXT, PRIMARY KEY (day, id))")
+    simple_query_executor.insert_rows('test_table', ['day', 'id', 'name'], ((i % 3, i, 'n%d' % i) for i in range(25)))
+    expected = sorted(((i % 3, i), 'n%d' % i) for i in range(25))
+
+    pages = list(simple_query_executor.select_pages('test_table', ['name'], key=('day', 'id'), page_size=10))
+    assert [len(page) for page in pages] == [10, 10, 5]
+    assert [row for page in pages for row in page] == [(name,) for _, name in expected]
+
+    descending = simple_query_executor.select_pages('test_table', None, key=('day', 'id'), page_size=10, descending=True)
+    assert [row[2] for page in descending for row in page] == [name for _, name in reversed(expected)]
+
+    resumed = simple_query_executor.select_pages('test_table', ['name'], key=('day', 'id'), page_size=10, resume=pages[0].token)
+    assert [row for page in resumed for row in page] == [(name,) for _, name in expected[10:]]
+
+    filtered = simple_query_executor.select_pages('test_table', ['id'], key='id', page_size=4, where="name LIKE 'n1%'")
+    assert [list(page) for page in filtered] == [[(1,), (10,), (11,), (12,)], [(13,), (14,), (15,), (16,)], [(17,), (18,), (19,)]]
+
+    with pytest.raises(ValueError):
+        next(simple_query_executor.select_pages('test_table', ['name'], key='id', resume=pages[0].token))
+
+    simple_query_executor.drop_table('test_table')
+    assert simple_query_executor.conn.pool.stats()['in_use'] == 0
+
+@pytest.mark.parametrize('copy_threshold', [10000, 5])
+def test_bulk_rows(simple_query_executor, copy_threshold):
+    """
+    Test upsert_rows, update_rows and delete_rows, through VALUES lists and through a temporary table.
+    Ensures that the affected row counts are returned and that a failing batch changes nothing.
+
+    Args:
+        simple_query_executor (SimpleQueryExecutor): Fixture for executing simple queries.
+        copy_threshold (int): The batch size above which the rows are copied into a temporary table.
+    """
+    simple_query_executor.create_table('test_table', {'id': 'INT PRIMARY KEY', 'name': 'VARCHAR(100)', 'score': 'NUMERIC'})
+    options = {'chunk_size': 4, 'copy_threshold': copy_threshold}
+    select = lambda: simple_query_executor.execute_and_fetchall("SELECT id, name, score FROM test_table ORDER BY id")
+
+    assert simple_query_executor.upsert_rows('test_table', [{'id': i, 'name': 'n%d' % i, 'score': i} for i in range(10)], ['id'], **options) == 10
+    assert simple_query_executor.upsert_rows('test_table', [(i, 'new') for i in range(8, 12)], ['id'], columns=['id', 'name'], **options) == 4
+    assert select()[8:] == [(8, 'new', 8), (9, 'new', 9), (10, 'new', None), (11, 'new', None)]
+    assert simple_query_executor.upsert_rows('test_table', [{'id': i, 'name': 'x'} for i in range(10, 14)], ['id'], [], **options) == 2
+
+    assert simple_query_executor.update_rows('test_table', [{'id': i, 'score': -i} for i in range(0, 20, 2)], ['id'], **options) == 7
+    assert [row[2] for row in select()][:4] == [0, 1, -2, 3]
+
+    assert simple_query_executor.delete_rows('test_table', range(0, 100, 3), **options) == 5
+    assert simple_query_executor.delete_rows('test_table', [{'id': 1}, {'id': 2}], **options) == 2
+    assert [row[0] for row in select()] == [4, 5, 7, 8, 10, 11, 13]
+
+    with pytest.raises(psycopg2.DataError):
+        simple_query_executor.update_rows('test_table', [{'id': 4, 'name': 'y'}] + [{'id': 5, 'name': 'z' * 200}] * 6, ['id'], **options)
+    assert select()[0] == (4, 'n4', -4)
+
+    simple_query_executor.drop_table('test_table')
+
+def test_bulk_rows_cast_types(simple_query_executor):
+    """
+    Test update_rows through a VALUES list on columns whose types are arrays or live outside the search_path.
+
+    Args:
+        simple_query_executor (SimpleQueryExecutor): Fixture for executing simple queries.
+    """
+    simple_query_executor.execute_and_commit("CREATE SCHEMA IF NOT EXISTS test_types")
+    simple_query_executor.execute_and_commit("CREATE TYPE test_types.mood AS ENUM ('sad', 'happy')")
+    try:
+        simple_query_executor.create_table('test_table', {'id': 'INT PRIMARY KEY', 'tags': 'INT[]', 'mood': 'test_types.mood'})
+        simple_query_executor.insert_rows('test_table', ['id', 'tags', 'mood'], [(1, [1], 'sad'), (2, [2], 'sad')])
+        assert simple_query_executor.update_rows('test_table', [(1, [1, 2], 'happy'), (2, [], 'happy')], ['id'],
+                                                 columns=['id', 'tags', 'mood']) == 2
+        assert simple_query_executor.execute_and_fetchall("SELECT id, tags, mood::text FROM test_table ORDER BY id") == \
+            [(1, [1, 2], 'happy'), (2, [], 'happy')]
+    finally:
+        simple_query_executor.drop_table('test_table')
+        simple_query_executor.execute_and_commit("DROP SCHEMA test_types CASCADE")
+
+@pytest.mark.parametrize('key', ['id', 'name'])
+def test_parallel_scan(simple_query_executor, tmp_path, key):
+    """
+    Test scanning a table in slices across worker processes, through a function and into files.
+    Ensures that every row is read once, in key order when requested, from one snapshot of the table.
+
+    Args:
+        simple_query_executor (SimpleQueryExecutor): Fixture for executing simple queries.
+        tmp_path (Path): A temporary directory for the exported files.
+        key (str): The column the table is split on (an integer or a text column).
+    """
+    simple_query_executor.create_table('test_table', {'id': 'INT PRIMARY KEY', 'name': 'TEXT'})
+    simple_query_executor.insert_rows('test_table', ['id', 'name'], ((i, 'n%04d' % i) for i in range(1000)))
+    simple_query_executor.execute_and_commit("ANALYZE test_table")
+
+    results = simple_query_executor.parallel_scan('test_table', key, partitions=4, fn=collect_rows, workers=2)
+    assert len(results) == 4
+    assert [row for part in results for row in part] == [(i, 'n%04d' % i) for i in range(1000)]
+
+    unordered = simple_query_executor.parallel_scan('test_table', key, partitions=3, fn=collect_rows, workers=2,
+                                                    columns=['id'], where="name LIKE 'n%5'", ordered=False)
+    assert sorted(row for part in unordered for row in part) == [(i,) for i in range(5, 1000, 10)]
+
+    output = tmp_path / 'test_table.csv.gz'
+    assert simple_query_executor.parallel_scan('test_table', key, partitions=4, workers=2, output=output, compression='gzip') == 1000
+    with gzip.open(output, 'rt') as file:
+        assert file.read() == '"id","name"\n' + ''.join('%d,n%04d\n' % (i, i) for i in range(1000))
+    assert [path.name for path in tmp_path.iterdir()] == ['test_table.csv.gz']
+
+    assert simple_query_executor.parallel_scan('test_table', key, partitions=4, workers=2, output=str(tmp_path / 'part{partition}.csv'),
+                                               header=False) == 1000
+    assert sum(len(open(tmp_path / ('part%d.csv' % i)).readlines()) for i in range(4)) == 1000
+
+    with pytest.raises(ValueError):
+        simple_query_executor.parallel_scan('test_table', key, fn=collect_rows, output=output)
+
+    simple_query_executor.drop_table('test_table')
+    assert simple_query_executor.conn.pool.stats()['in_use'] == 0
+
+def test_parallel_scan_null_keys(tmp_path):
+    """
+    Test that the rows with a NULL key are read by a parallel scan, and that the worker connections
+    get the settings of the executor (here its statement timeout).
+
+    Args:
+        tmp_path (Path): A temporary directory for the exported file.
+    """
+    executor = SimpleQueryExecutor({**DATABASE_PARAMS, 'statement_timeout': 5})
+    executor.create_table('test_table', {'id': 'INT', 'name': 'TEXT'})
+    executor.insert_rows('test_table', ['id', 'name'], [(i, None if i % 100 == 0 else 'n%04d' % i) for i in range(1000)])
+    try:
+        for key in ('id', 'name'):
+            results = executor.parallel_scan('test_table', key, partitions=4, fn=collect_rows, workers=2,
+                                             where="current_setting('statement_timeout') = '5s'")
+            assert sorted(row[0] for part in results for row in part) == list(range(1000))
+        executor.execute_and_commit("UPDATE test_table SET id = NULL WHERE id % 100 = 0")
+        assert executor.parallel_scan('test_table', 'id', partitions=4, workers=2, output=tmp_path / 'test_table.csv') == 1000
+    finally:
+        executor.drop_table('test_table')
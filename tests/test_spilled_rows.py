@@ -0,0 +1,110 @@
+# test_spilled_rows.py
+
+import datetime
+import time
+import tracemalloc
+from decimal import Decimal
+
+import pytest
+
+from psycopg2_wrapper.NativeQueryExecutor import NativeQueryExecutor
+from psycopg2_wrapper.ResultCache import ResultCache
+from psycopg2_wrapper.SpilledRows import SpilledRows
+
+from . import DATABASE_PARAMS
+
+
+def test_spilled_rows():
+    """
+    Test writing rows to a SpilledRows file and reading them back by index, slice and iteration.
+    """
+    rows = [(i, 'n%d' % i, None, Decimal('1.5'), datetime.date(2024, 1, 1 + i % 28)) for i in range(1000)]
+    spilled = SpilledRows()
+    spilled.extend(rows[:10])
+    spilled.extend(rows[10:])
+    spilled.extend([])
+    spilled.seal()
+
+    assert len(spilled) == 1000
+    assert spilled[0] == rows[0] and spilled[-1] == rows[-1] and spilled[500] == rows[500]
+    assert spilled[10:20:3] == rows[10:20:3]
+    assert list(spilled) == rows and spilled == rows
+    assert rows[42] in spilled
+    with pytest.raises(IndexError):
+        spilled[1000]
+    with pytest.raises(RuntimeError):
+        spilled.extend(rows)
+
+    spilled.close()
+    assert len(spilled) == 0
+
+    with SpilledRows() as empty:
+        assert list(empty.seal()) == []
+
+def test_fetchall_max_memory(native_query_executor):
+    """
+    Test that a result over `max_memory` is spilled to disk, and that a result under it is a plain list.
+
+    Args:
+        native_query_executor (NativeQueryExecutor): Fixture for executing native queries.
+    """
+    sql = "SELECT i, md5(i::text) FROM generate_series(1, %s) i"
+    expected = native_query_executor.execute_and_fetchall(sql, (20000,))
+
+    small = native_query_executor.execute_and_fetchall(sql, (100,), max_memory=1024 * 1024)
+    assert type(small) is list and small == expected[:100]
+
+    spilled = native_query_executor.execute_and_fetchall(sql, (20000,), max_memory=64 * 1024)
+    assert isinstance(spilled, SpilledRows)
+    assert len(spilled) == 20000 and spilled[12345] == expected[12345] and spilled == expected
+
+    native_query_executor.row_factory = native_query_executor._row_factory('dict')
+    assert native_query_executor.execute_and_fetchall(sql, (20000,), max_memory=64 * 1024)[-1] == {'i': 20000, 'md5': expected[-1][1]}
+    assert native_query_executor.conn.pool.stats()['in_use'] == 0
+
+def test_fetchall_max_memory_bounds_memory(native_query_executor):
+    """
+    Test that the memory allocated while fetching a spilled result stays far below the size of the result.
+
+    Args:
+        native_query_executor (NativeQueryExecutor): Fixture for executing native queries.
+    """
+    sql = "SELECT i, repeat('x', 100) FROM generate_series(1, 200000) i"
+    tracemalloc.start()
+    try:
+        rows = native_query_executor.execute_and_fetchall(sql, max_memory=1024 * 1024)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    assert len(rows) == 200000 and rows[-1] == (200000, 'x' * 100)
+    assert peak < 8 * 1024 * 1024
+
+def test_fetchall_max_memory_like_fetchall():
+    """
+    Test that under the cap a capped fetch behaves like a plain one: statements a cursor cannot run,
+    the result cache and the read retries.
+    """
+    executor = NativeQueryExecutor({**DATABASE_PARAMS, 'pool': {'min_size': 1, 'max_size': 1}, 'retry_backoff': 0.01},
+                                   result_cache=ResultCache())
+    admin = NativeQueryExecutor(DATABASE_PARAMS)
+    try:
+        assert executor.execute_and_fetchall("SHOW statement_timeout", max_memory=1024) == [('0',)]
+        executor.execute_and_commit("CREATE TEMPORARY TABLE capped (id INT)")
+        assert executor.execute_and_fetchall("INSERT INTO capped VALUES (1), (2) RETURNING id", max_memory=1024) == [(1,), (2,)]
+
+        sql = "SELECT i FROM spilled_source WHERE i < %s"
+        executor.execute_and_commit("CREATE TABLE spilled_source AS SELECT generate_series(1, 10) i")
+        assert executor.execute_and_fetchall(sql, (4,), max_memory=1024) == [(1,), (2,), (3,)]
+        assert executor.execute_and_fetchall(sql, (4,), max_memory=1024) == [(1,), (2,), (3,)]
+        assert executor.result_cache.stats()['hits'] == 1
+
+        pid = executor.execute_and_fetchone("SELECT pg_backend_pid()")[0]
+        admin.execute_and_fetchone("SELECT pg_terminate_backend(%s)", (pid,))
+        time.sleep(0.1)
+        assert executor.execute_and_fetchall(sql, (3,), max_memory=1024) == [(1,), (2,)]
+        assert executor.conn.breaker_stats()['retried_reads'] == 1
+    finally:
+        executor.execute_and_commit("DROP TABLE IF EXISTS spilled_source")
+        executor.conn.close_pool()
+        admin.conn.close_pool()